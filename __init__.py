@@ -0,0 +1,10 @@
+# LFR-MPF-Simulation/__init__.py
+
+"""
+Lane-free roundabout simulation with the LFR-MPF models.
+
+Submodules are imported on demand: importing the package (or running the
+`lfr-mpf` command) loads no plotting, IPython or pandas code.
+"""
+
+__version__ = "0.1.0"
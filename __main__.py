@@ -0,0 +1,6 @@
+# LFR-MPF-Simulation/__main__.py
+
+import sys
+from .cli import main
+
+sys.exit(main())
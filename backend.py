@@ -0,0 +1,449 @@
+# LFR-MPF-Simulation/backend.py
+
+import importlib
+import importlib.util
+import os
+import math
+import numpy as np
+from .config import *
+from .utils import WINDOW_STRIDE, window_keys
+from .models import reaction_lag
+
+BACKENDS = ('numpy', 'numba', 'python')
+
+# Positions in the parameter vector handed to the kernels. Config values are
+# passed at call time rather than read as globals, because compiled code
+# would freeze them (and sweep overrides change them between runs).
+(P_DT, P_OUTER, P_INNER, P_DESIRED_SPEED, P_MAX_ACC, P_COMFORT_DEC, P_MIN_GAP, P_HEADWAY,
+ P_ENTRY_WINDOW, P_YIELD_WINDOW, P_TURN_WINDOW, P_EXIT_WINDOW, P_ACCEL_TIME) = range(13)
+
+NO_VEHICLE = -1
+YIELD = -2
+# Radial band width of the neighbour-search keys (the angular_window_pairs default).
+_BAND_WIDTH = 5.0
+
+
+def numba_available():
+    """True if numba is installed (checked without importing it, which is slow)."""
+    return importlib.util.find_spec('numba') is not None
+
+
+def select_backend(name=None):
+    """
+    Resolves a backend name: 'numpy' (the vectorized Fleet code), 'numba'
+    (JIT-compiled loop kernels) or 'python' (the same loop kernels,
+    uncompiled; slow, for checking them). None reads the LFR_MPF_BACKEND
+    environment variable and defaults to numpy, the only backend whose
+    results match the object engines bit for bit (the loop kernels agree
+    to rounding, see check_backend); numba is opt-in, by name or with
+    'auto', which picks it when installed and falls back to numpy.
+    """
+    if name is None:
+        name = os.environ.get('LFR_MPF_BACKEND', 'numpy')
+    if name == 'auto':
+        return 'numba' if numba_available() else 'numpy'
+    if name not in BACKENDS:
+        raise ValueError(f"unknown backend {name!r}, expected one of {BACKENDS} or 'auto'")
+    if name == 'numba' and not numba_available():
+        raise ImportError("the numba backend needs numba to be installed")
+    return name
+
+
+# Names of the scalar helpers the loop kernels call. numba is only imported
+# when the numba kernels are first built (see kernels()), which replaces
+# these module globals with their compiled versions.
+_HELPERS = []
+prange = range
+
+
+def _jit(function):
+    """Registers a kernel helper to be compiled in nopython mode with the numba kernels."""
+    _HELPERS.append(function.__name__)
+    return function
+
+
+def _compile_helpers(numba):
+    """Swaps the helpers (and prange) for numba-compiled versions, once."""
+    module = globals()
+    if module['prange'] is range:
+        for name in _HELPERS:
+            module[name] = numba.njit(cache=True, error_model='numpy')(module[name])
+        module['prange'] = numba.prange
+
+
+# --- Scalar helpers (mirror models.py and the Vehicle methods) ---
+
+@_jit
+def _gap(start_angle, end_angle):
+    return (end_angle - start_angle + 2 * np.pi) % (2 * np.pi)
+
+@_jit
+def _idm_acceleration(v, v_lead, gap, sy, p):
+    alphalongfun = min(1.0, math.exp(-(abs(sy) - 4.846) / 0.6))
+    delta_v = v - v_lead
+    s_star = p[P_MIN_GAP] + max(0.0, p[P_HEADWAY] * v + v * delta_v / (2 * math.sqrt(p[P_MAX_ACC] * p[P_COMFORT_DEC])))
+    interaction_term = -alphalongfun * p[P_MAX_ACC] * (s_star / gap) ** 2
+    return p[P_MAX_ACC] * (1 - (v / p[P_DESIRED_SPEED]) ** 4) + max(-12.0, interaction_term)
+
+@_jit
+def _idm_exit_approach(v, v_lead, gap, sy, p):
+    if v < 1:
+        return 0.1
+    alphalongfun = min(1.0, math.exp(-(abs(sy) - 2) / 0.6))
+    delta_v = v - v_lead
+    s_star = max(0.0, p[P_HEADWAY] * v + v * delta_v / (2 * math.sqrt(p[P_MAX_ACC] * p[P_COMFORT_DEC])))
+    interaction_term = -alphalongfun * p[P_MAX_ACC] * (s_star / gap) ** 2
+    return p[P_MAX_ACC] * (1 - (v / p[P_DESIRED_SPEED]) ** 4) + max(-4.0, interaction_term)
+
+@_jit
+def _idm_entry_acceleration(v, v_lead, gap, p):
+    delta_v = v - v_lead
+    s_star = 1 + max(0.0, 0.5 * v + v * delta_v / (4 * math.sqrt(3 * p[P_COMFORT_DEC])))
+    interaction_term = -3 * (s_star / gap) ** 2
+    return 5 * (1 - (v / 15) ** 4) + max(-18.0, interaction_term)
+
+@_jit
+def _idm_interaction_deceleration(v, v_lead, gap, sy, p):
+    alphalongfun = min(1.0, math.exp(-(abs(sy) - 4.846) / 0.6))
+    delta_v = v - v_lead
+    s_star = p[P_MIN_GAP] + max(0.0, p[P_HEADWAY] * v + v * delta_v / (2 * math.sqrt(p[P_MAX_ACC] * p[P_COMFORT_DEC])))
+    return -(p[P_MAX_ACC] * (s_star / gap) ** 2) * alphalongfun
+
+@_jit
+def _iam_radial_acceleration(a, ego_width, ego_speed_y, ego_position_y, ego_speed_x, front_speed_y, front_position_y, p):
+    # A, B, C, D = 1, 0.6, 0.7, 0.5 as in Vehicle._calculate_following_acceleration.
+    dy = front_position_y - ego_position_y
+    sign_dy = np.sign(dy)
+    overlap = abs(dy) < ego_width
+    alpha = sign_dy * (abs(dy) / ego_width if overlap else math.exp(-(abs(dy) - ego_width) / 0.6))
+    v0LatInt = alpha * (a - p[P_MAX_ACC] * (1 - (ego_speed_x / p[P_DESIRED_SPEED]) ** 4))
+    mult_dv_factor = 1.0 if overlap else max(0.0, 1.0 - 0.7 * sign_dy * (front_speed_y - ego_speed_y))
+    accLatInt = v0LatInt / 0.5 * mult_dv_factor
+    return max(-2.0, min(2.0, accLatInt - ego_speed_y / 0.5))
+
+@_jit
+def _target_force(radius, angle, entry_angle, decide, length, width, gammar, d_cita_in, target_x_out, gate_in, gate_out, p):
+    position_x_local = radius * _gap(entry_angle, angle)
+    if decide > 0:
+        target_y = p[P_INNER] + length + 3
+        target_x = min(p[P_INNER] + length, radius) * d_cita_in
+        x_weight = math.exp(-(gammar - 1) * (abs(position_x_local - target_x) / (target_x + 1e-6)))
+        gate = gate_in
+    else:
+        target_y = p[P_OUTER] - width / 2
+        target_x = target_x_out
+        x_weight = math.exp(-gammar * (abs(position_x_local - target_x) / (target_x + 1e-6)))
+        gate = gate_out
+    y_weight = 1 - math.exp(-abs(target_y - radius))
+    result = y_weight * np.sign(target_y - radius) * x_weight * gate * 4
+    return max(-4.0, min(4.0, result))
+
+@_jit
+def _boundary_force(radius, tangential_speed, width_right, width_left, p):
+    sy_right = radius - 5 - (width_right + 3)
+    sy_left = width_left - radius - 5
+    alpha_left = math.exp(-sy_left / 0.2) if sy_left > 0 else 1 - sy_left / 0.2
+    alpha_right = math.exp(-sy_right / 0.2) if sy_right > 0 else 1 - sy_right / 0.2
+    acc0 = 6 * (min(alpha_right, 6.0) - min(alpha_left, 6.0))
+    acc = acc0 * (0.2 + 0.8 * tangential_speed / p[P_DESIRED_SPEED])
+    return max(-6.0, min(6.0, acc))
+
+
+# --- Loop kernels over the compacted active vehicles ---
+
+@_jit
+def _window_bounds(keys, band, start, span):
+    """
+    Range of window_keys positions holding the vehicles of radial band
+    `band` with angle in [start, start + span], widened by the same slack
+    as utils.angular_window_pairs so the range is a superset.
+    """
+    low = band * WINDOW_STRIDE + start - 1e-9
+    return np.searchsorted(keys, low, side='left'), np.searchsorted(keys, low + span + 2e-9, side='right')
+
+@_jit
+def _arc_window(radius, radial_window):
+    inner = max(radius - radial_window, 0.0)
+    return 2 * np.pi if inner == 0 else min(2 * np.pi, 100 / inner * (1 + 1e-9))
+
+@_jit
+def _better(key, o, best_key, best):
+    # Ties go to the lowest position, which a scan in position order would keep.
+    return best < 0 or key < best_key or (key == best_key and o < best)
+
+def _neighbors_loop(angle, radius, speed, length, exit_angle, p, keys, members, band, band_width, leader, follower):
+    """
+    Leader/follower positions with the selection rules of the utils.py
+    finders. Candidates are only read from the window_keys ranges of the
+    radial bands and arc each finder can accept (see
+    utils.angular_window_pairs), so a step costs O(N log N + N k) for k
+    vehicles per window rather than O(N^2).
+    """
+    n = angle.size
+    outer = p[P_OUTER]
+    two_pi = 2 * np.pi
+    for e in prange(n):
+        leader[e] = NO_VEHICLE
+        follower[e] = NO_VEHICLE
+        a0 = angle[e] % two_pi
+        if radius[e] > outer:
+            # Approach lane (same angle) or entry band, within pi/18 ahead.
+            best, best_key = -1, np.inf
+            span = np.pi / 18 + 1e-9
+            for b in range(int(math.floor((outer - 5) / band_width)), band[e] + 1):
+                lo, hi = _window_bounds(keys, b, a0, span)
+                for k in range(lo, hi):
+                    o = members[k]
+                    if o == e or not radius[o] < radius[e]:
+                        continue
+                    in_lane = angle[e] == angle[o] and radius[o] > outer
+                    at_entry = _gap(angle[e], angle[o]) < np.pi / 18 and outer - 5 < radius[o] < outer
+                    if (in_lane or at_entry) and _better(radius[e] - radius[o], o, best_key, best):
+                        best, best_key = o, radius[e] - radius[o]
+            leader[e] = best
+        else:
+            angle_to_exit = _gap(angle[e], exit_angle[e])
+            best, best_key = -1, np.inf
+            span = min(angle_to_exit, _arc_window(radius[e], 5.0), two_pi) + 1e-9
+            reach = int(math.ceil(5.0 / band_width))
+            for b in range(band[e] - reach, band[e] + reach + 1):
+                lo, hi = _window_bounds(keys, b, a0, span)
+                for k in range(lo, hi):
+                    o = members[k]
+                    if o == e or radius[o] > outer:
+                        continue
+                    gap = _gap(angle[e], angle[o])
+                    arc = min(radius[e], radius[o]) * gap
+                    if 0 < gap < angle_to_exit and 0 < arc <= 100 and abs(radius[e] - radius[o]) < 5:
+                        key = _idm_interaction_deceleration(speed[e], speed[o], arc - length[e], radius[e] - radius[o], p)
+                        if _better(key, o, best_key, best):
+                            best, best_key = o, key
+            if best >= 0 and best_key > -2 and angle_to_exit < p[P_YIELD_WINDOW]:
+                leader[e] = YIELD
+            else:
+                leader[e] = best
+
+            best, best_key = -1, np.inf
+            span = min(np.pi, _arc_window(radius[e], length[e])) + 1e-9
+            reach = int(math.ceil(length[e] / band_width))
+            for b in range(band[e] - reach, band[e] + reach + 1):
+                lo, hi = _window_bounds(keys, b, (a0 - span) % two_pi, span)
+                for k in range(lo, hi):
+                    o = members[k]
+                    if o == e:
+                        continue
+                    gap = _gap(angle[o], angle[e])
+                    arc = min(radius[e], radius[o]) * gap
+                    if 0 < gap < np.pi and 0 < arc <= 100 and abs(radius[e] - radius[o]) < length[e]:
+                        key = _idm_interaction_deceleration(speed[o], speed[e], arc - length[e], radius[o] - radius[e], p)
+                        if _better(key, o, best_key, best):
+                            best, best_key = o, key
+            follower[e] = best
+
+
+def _step_loop(radius, angle, vt, vr, ta, ra, pt, pr, T, out, decide, width, length, gammar, desired_speed,
+               entry_angle, exit_angle, d_cita_in, target_x_out, gate_in, gate_out, leader, follower, p,
+               new_radius, new_angle, new_vt, new_vr, new_ta, new_ra, new_pt, new_pr, new_T, new_out, phase):
+    """
+    One step of Vehicle.update for every vehicle. Reads only the pre-step
+    arrays and writes the new_* arrays, so vehicles can run in parallel.
+    pt/pr hold the pending accelerations (vehicles x reaction_lag steps).
+    phase is set to 0 (approaching), 1 (in the roundabout) or 2 (exiting).
+    """
+    dt, outer, inner = p[P_DT], p[P_OUTER], p[P_INNER]
+    effective_accel_time = p[P_ACCEL_TIME]
+    lag = pt.shape[1]
+    for e in prange(radius.size):
+        r, a, v_t, v_r, a_t, a_r = radius[e], angle[e], vt[e], vr[e], ta[e], ra[e]
+        new_T[e], new_out[e] = T[e], out[e]
+        new_pt[e], new_pr[e] = pt[e], pr[e]
+        lead, back = leader[e], follower[e]
+
+        if r >= outer:
+            phase[e] = 0
+            if decide[e] > 0:
+                if lead >= 0:
+                    acc = _idm_entry_acceleration(abs(v_r), abs(vr[lead]), r - radius[lead] - length[e], p)
+                else:
+                    acc = 5 * (1 - (abs(v_r) / 20) ** 4)
+                a_r, a_t, v_t = -acc, 0.0, 0.0
+                v_r = min(0.0, v_r + a_r * dt)
+                r += v_r * dt
+            else:
+                r, v_r = outer - width[e] / 2, 0.0
+
+        elif out[e] and decide[e] < 0:
+            phase[e] = 2
+            a = exit_angle[e]
+            a_r = 4 / 3
+            v_r += a_r * dt
+            r += v_r * dt
+
+        else:
+            phase[e] = 1
+            proximity_to_inner = (outer - r) / (outer - inner)
+            local_desired_speed = desired_speed[e] + 5 * proximity_to_inner
+            new_T[e] = p[P_HEADWAY] - 0.2 * proximity_to_inner
+            if _gap(entry_angle[e], a) < p[P_ENTRY_WINDOW]:
+                effective_inner = outer - 15
+            elif _gap(a, exit_angle[e]) < p[P_YIELD_WINDOW]:
+                effective_inner = outer - 10
+            else:
+                effective_inner = inner
+            target = _target_force(r, a, entry_angle[e], decide[e], length[e], width[e], gammar[e],
+                                   d_cita_in[e], target_x_out[e], gate_in[e], gate_out[e], p)
+            boundary = _boundary_force(r, v_t, outer, effective_inner, p)
+
+            if lead == YIELD:
+                gap_to_exit = r * abs(_gap(a, (exit_angle[e] + np.pi / 36) % (2 * np.pi)))
+                sy1 = outer - r
+                a_t = _idm_exit_approach(v_t, 0.0, gap_to_exit, sy1, p)
+                gap1 = r * abs(_gap(a, (exit_angle[e] - np.pi / 36) % (2 * np.pi)))
+                a_r = (v_t / gap1 * sy1 - v_r) / dt + target + boundary
+            else:
+                if lead >= 0:
+                    gap = min(r, radius[lead]) * abs(_gap(a, angle[lead])) - length[e]
+                    a_t = _idm_acceleration(v_t, vt[lead], gap, r - radius[lead], p)
+                else:
+                    a_t = p[P_MAX_ACC] * (1 - (v_t / local_desired_speed) ** 4)
+                if back >= 0:
+                    gap = min(r, radius[back]) * abs(_gap(angle[back], a)) - length[e]
+                    influence = 0.6 * _idm_acceleration(vt[back], v_t, gap, radius[back] - r, p)
+                    a_t -= max(-2.0, influence)
+                gate = 1.0 if a_t >= 0 else 0.0
+                if lead >= 0:
+                    a_r = _iam_radial_acceleration(a_t, length[e], v_r, r, v_t, vr[lead], radius[lead], p) + target * gate + boundary
+                else:
+                    a_r = target * gate + boundary
+
+            # Kinematics with the reaction delay: the oldest pending accelerations act.
+            acting_t, acting_r = a_t, a_r
+            if lag:
+                acting_t, acting_r = pt[e, 0], pr[e, 0]
+                new_pt[e, :lag - 1], new_pr[e, :lag - 1] = pt[e, 1:], pr[e, 1:]
+                new_pt[e, lag - 1], new_pr[e, lag - 1] = a_t, a_r
+            radial_displacement = v_r * dt + 0.5 * acting_r * (effective_accel_time ** 2)
+            tangential_displacement = v_t * dt + 0.5 * acting_t * (effective_accel_time ** 2)
+            next_radius = r + radial_displacement
+            effective_radius = max(r, next_radius) if next_radius > 0 else r
+            a = (a + tangential_displacement / effective_radius) % (2 * np.pi)
+            r = max(inner + width[e] / 2, min(r + radial_displacement, outer - width[e] / 2))
+            v_t = max(0.0, v_t + acting_t * effective_accel_time)
+            v_r = v_r + acting_r * effective_accel_time
+
+            # Movement angle limit.
+            if v_t > 1e-6:
+                angle_between = math.atan(v_r / v_t)
+            else:
+                angle_between = np.pi / 2 if v_r > 0 else -np.pi / 2
+            max_allowed_angle = math.radians(75) if _gap(a, exit_angle[e]) < p[P_TURN_WINDOW] else math.radians(50)
+            if abs(angle_between) >= max_allowed_angle:
+                v_r = np.sign(v_r) * (v_t * math.tan(max_allowed_angle))
+
+            # Exit check.
+            if _gap(a, exit_angle[e]) < p[P_EXIT_WINDOW] and decide[e] < 0 and r > outer - 20:
+                a, v_r, r, v_t, a_t, a_r = exit_angle[e], 10.0, outer + 0.1, 0.0, 0.0, 4 / 3
+                new_out[e] = True
+
+        new_radius[e], new_angle[e], new_vt[e], new_vr[e], new_ta[e], new_ra[e] = r, a, v_t, v_r, a_t, a_r
+
+
+_kernels = {}
+
+def kernels(name, parallel=False):
+    """The (neighbors, step) loop kernels of a backend; numba is imported and compiles them on first use."""
+    key = (name, parallel)
+    if key not in _kernels:
+        if name == 'numba':
+            numba = importlib.import_module('numba')
+            _compile_helpers(numba)
+            compile_ = numba.njit(cache=True, error_model='numpy', parallel=parallel)
+            _kernels[key] = (compile_(_neighbors_loop), compile_(_step_loop))
+        elif name == 'python':
+            _kernels[key] = (_neighbors_loop, _step_loop)
+        else:
+            raise ValueError(f"backend {name!r} has no loop kernels")
+    return _kernels[key]
+
+
+def kernel_parameters(routes):
+    """The parameter vector for the kernels from the current config and a routes.RouteTable."""
+    return np.array([DT, OUTER_RADIUS, INNER_RADIUS, DESIRED_SPEED, MAX_ACCELERATION, COMFORTABLE_DECELERATION,
+                     MIN_SAFE_DISTANCE, TIME_HEADWAY, routes.entry_window, routes.yield_window,
+                     routes.turn_window, routes.exit_window, reaction_lag()[1]], dtype=float)
+
+
+def fleet_step(fleet, ids, name, parallel=False):
+    """
+    Advances the active vehicles ids of a fleet.Fleet with the loop kernels
+    (after its decision update). The state is gathered into contiguous
+    arrays, stepped, and scattered back. Returns the ids of the vehicles
+    that were exiting this step.
+    """
+    neighbors, step = kernels(name, parallel)
+    p = kernel_parameters(fleet.routes)
+    route = (fleet.entry_idx[ids], fleet.exit_idx[ids])
+    radius, angle = fleet.radius[ids], fleet.angle[ids]
+    vt, vr = fleet.tangential_speed[ids], fleet.radial_speed[ids]
+    length, exit_angle = fleet.length[ids], fleet.exit_angle[ids]
+
+    n = ids.size
+    leader = np.empty(n, dtype=np.int64)
+    follower = np.empty(n, dtype=np.int64)
+    band = np.floor(radius / _BAND_WIDTH).astype(np.int64)
+    keys, members = window_keys(angle % (2 * np.pi), band)
+    neighbors(angle, radius, vt, length, exit_angle, p, keys, members, band, _BAND_WIDTH, leader, follower)
+
+    new = {field: np.empty(n) for field in ('radius', 'angle', 'tangential_speed', 'radial_speed', 'tangential_acc', 'radial_acc', 'T')}
+    pending_t, pending_r = fleet.pending_tangential_acc[ids], fleet.pending_radial_acc[ids]
+    new['pending_tangential_acc'], new['pending_radial_acc'] = np.empty_like(pending_t), np.empty_like(pending_r)
+    new_out = np.empty(n, dtype=bool)
+    phase = np.empty(n, dtype=np.int64)
+    step(radius, angle, vt, vr, fleet.tangential_acc[ids], fleet.radial_acc[ids], pending_t, pending_r, fleet.T[ids], fleet.out[ids],
+         fleet.decide[ids], fleet.width[ids], length, fleet.gammar[ids], fleet.desired_speed[ids],
+         fleet.entry_angle[ids], exit_angle, fleet.routes.d_cita_in[route], fleet.routes.target_x_out[route],
+         fleet.routes.gate_in[route].astype(float), fleet.routes.gate_out[route].astype(float), leader, follower, p,
+         new['radius'], new['angle'], new['tangential_speed'], new['radial_speed'], new['tangential_acc'],
+         new['radial_acc'], new['pending_tangential_acc'], new['pending_radial_acc'], new['T'], new_out, phase)
+    for field, values in new.items():
+        getattr(fleet, field)[ids] = values
+    fleet.out[ids] = new_out
+    fleet.yielding[ids] = leader == YIELD
+    return ids[phase == 2]
+
+
+def check_backend(name='auto', num_vehicles=120, num_steps=400, spawn_every=5, seed=0, parallel=False, rtol=1e-9, atol=1e-9):
+    """
+    Results check: steps a Fleet on the numpy backend and one on the given
+    backend from the same spawns and compares their state after every step.
+    Returns a dict with the backend, the number of steps compared, the
+    largest absolute difference and whether all states agreed within
+    rtol/atol (discrete state such as decide and paused must match exactly).
+    """
+    from .fleet import Fleet
+
+    name = select_backend(name)
+    reference, candidate = Fleet(num_vehicles, backend='numpy'), Fleet(num_vehicles, backend=name, parallel=parallel)
+    rng = np.random.default_rng(seed)
+    fields = ('radius', 'angle', 'tangential_speed', 'radial_speed', 'tangential_acc', 'radial_acc',
+              'pending_tangential_acc', 'pending_radial_acc', 'T')
+    max_difference, ok = 0.0, True
+    for t_step in range(num_steps):
+        if t_step % spawn_every == 0 and reference.paused.any():
+            entry_idx = rng.integers(0, len(ENTRY_ANGLES))
+            exit_idx = (entry_idx + rng.integers(1, len(EXIT_ANGLES))) % len(EXIT_ANGLES)
+            i = np.argmax(reference.paused)
+            reference.activate(i, entry_idx, exit_idx)
+            candidate.activate(i, entry_idx, exit_idx)
+        reference.step()
+        candidate.step()
+        ok &= all(np.array_equal(getattr(reference, f), getattr(candidate, f)) for f in ('paused', 'out', 'decide'))
+        for f in fields:
+            a, b = getattr(reference, f), getattr(candidate, f)
+            with np.errstate(invalid='ignore'):
+                difference = np.abs(a - b)
+            max_difference = max(max_difference, float(np.nanmax(difference, initial=0)))
+            ok &= bool(np.allclose(a, b, rtol=rtol, atol=atol, equal_nan=True))
+        if not ok:
+            break
+    return {'backend': name, 'steps': t_step + 1, 'max_difference': max_difference, 'ok': bool(ok)}
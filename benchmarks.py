@@ -0,0 +1,271 @@
+# LFR-MPF-Simulation/benchmarks.py
+
+import json
+import platform
+import time
+import numpy as np
+from .config import *
+from . import models
+
+# Benchmarks use their own seeds so runs on different machines and commits are comparable.
+SEED = 20240601
+
+
+def _time(function, repeat=3, number=1):
+    """Best and mean wall time (s) of `number` calls of function over `repeat` rounds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        times.append((time.perf_counter() - start) / number)
+    return min(times), sum(times) / len(times)
+
+
+def synthetic_pool(num_vehicles, seed=SEED, approaching=0.1):
+    """
+    A vehicle.VehiclePool with num_vehicles active vehicles: a share on
+    the approach lanes, the rest spread over the ring with random radius,
+    angle, speed and phase.
+    """
+    from .vehicle import VehiclePool
+
+    rng = np.random.default_rng(seed)
+    pool = VehiclePool(num_vehicles)
+    for _ in range(num_vehicles):
+        entry_idx = rng.integers(0, len(ENTRY_ANGLES))
+        exit_idx = (entry_idx + rng.integers(1, len(EXIT_ANGLES))) % len(EXIT_ANGLES)
+        vehicle = pool.spawn(entry_idx, exit_idx)
+        if rng.random() < approaching:
+            vehicle.radius = OUTER_RADIUS + 1 + 29 * rng.random()
+        else:
+            vehicle.radius = INNER_RADIUS + 1 + (OUTER_RADIUS - INNER_RADIUS - 2) * rng.random()
+            vehicle.angle = 2 * np.pi * rng.random()
+            vehicle.tangential_speed = DESIRED_SPEED * rng.random()
+            vehicle.radial_speed = rng.normal(0, 1)
+            vehicle.decide = vehicle.entry_idx + 1 if rng.random() < 0.5 else -(vehicle.exit_idx + 1)
+        pool.update_phase(vehicle)
+    return pool
+
+
+def synthetic_fleet(num_vehicles, seed=SEED, approaching=0.1):
+    """The synthetic_pool scenario as a fleet.Fleet."""
+    from .fleet import Fleet
+
+    pool = synthetic_pool(num_vehicles, seed, approaching)
+    fleet = Fleet(num_vehicles, backend='numpy')
+    for v in pool.vehicles:
+        fleet.activate(v.idx, v.entry_idx, v.exit_idx)
+        for name in ('radius', 'angle', 'tangential_speed', 'radial_speed', 'decide'):
+            getattr(fleet, name)[v.idx] = getattr(v, name)
+    return fleet
+
+
+def bench_step(counts=(100, 500, 1000, 5000), steps=5, seed=SEED):
+    """Steps per second and vehicle updates per second of the run_simulation and Fleet step loops."""
+    from .main import _step_vehicles
+
+    results = []
+    for n in counts:
+        pool = synthetic_pool(n, seed)
+        start = time.perf_counter()
+        for _ in range(steps):
+            _step_vehicles(pool)
+        elapsed = time.perf_counter() - start
+        row = {'engine': 'vehicle', 'vehicles': n, 'steps': steps,
+               'steps_per_s': steps / elapsed, 'vehicle_updates_per_s': n * steps / elapsed}
+        results.append(row)
+
+        fleet = synthetic_fleet(n, seed)
+        start = time.perf_counter()
+        for _ in range(steps):
+            fleet.step()
+        elapsed = time.perf_counter() - start
+        results.append({'engine': 'fleet', 'vehicles': n, 'steps': steps,
+                        'steps_per_s': steps / elapsed, 'vehicle_updates_per_s': n * steps / elapsed})
+    return results
+
+
+def bench_finders(occupancies=(50, 200, 800), queries=200, seed=SEED):
+    """Mean time per call (s) of each utils.py finder, by full scan and through a PolarIndex, against ring occupancy."""
+    from .utils import PolarIndex, find_approaching_leader, find_leader_in_roundabout, find_follower_in_roundabout
+
+    results = []
+    rng = np.random.default_rng(seed)
+    for n in occupancies:
+        vehicles = synthetic_pool(n, seed).active_vehicles()
+        index = PolarIndex(vehicles)
+        outside = [v for v in vehicles if v.radius > OUTER_RADIUS]
+        inside = [v for v in vehicles if v.radius <= OUTER_RADIUS]
+        for name, finder, egos in (('find_approaching_leader', find_approaching_leader, outside),
+                                   ('find_leader_in_roundabout', find_leader_in_roundabout, inside),
+                                   ('find_follower_in_roundabout', find_follower_in_roundabout, inside)):
+            if not egos:
+                continue
+            sample = [egos[i] for i in rng.integers(0, len(egos), queries)]
+            for mode, use_index in (('scan', None), ('index', index)):
+                best, _ = _time(lambda: [finder(v, vehicles, use_index) for v in sample], repeat=3)
+                results.append({'finder': name, 'mode': mode, 'vehicles': n, 'seconds_per_call': best / queries})
+    return results
+
+
+def bench_models(n=100000, scalar_calls=20000, seed=SEED):
+    """Calls per second of the scalar models.py functions and elements per second of their batched kernels."""
+    rng = np.random.default_rng(seed)
+    v, v_lead = rng.uniform(0, 20, n), rng.uniform(0, 20, n)
+    gap, sy = rng.uniform(5, 100, n), rng.normal(0, 3, n)
+    kernels = (
+        ('idm_acceleration', lambda i: models.idm_acceleration(v[i], v_lead[i], gap[i], sy[i]),
+         lambda: models.idm_acceleration_batch(v, v_lead, gap, sy)),
+        ('idm_exit_approach', lambda i: models.idm_exit_approach(v[i], v_lead[i], gap[i], sy[i]),
+         lambda: models.idm_exit_approach_batch(v, v_lead, gap, sy)),
+        ('idm_entry_acceleration', lambda i: models.idm_entry_acceleration(v[i], v_lead[i], gap[i]),
+         lambda: models.idm_entry_acceleration_batch(v, v_lead, gap)),
+        ('idm_interaction_deceleration', lambda i: models.idm_interaction_deceleration(v[i], v_lead[i], gap[i], sy[i]),
+         lambda: models.idm_interaction_deceleration_batch(v, v_lead, gap, sy)),
+    )
+    results = []
+    calls = min(scalar_calls, n)
+    for name, scalar, batch in kernels:
+        best_scalar, _ = _time(lambda: [scalar(i) for i in range(calls)], repeat=3)
+        best_batch, _ = _time(batch, repeat=3)
+        results.append({'kernel': name, 'scalar_calls_per_s': calls / best_scalar, 'batch_elements_per_s': n / best_batch})
+    return results
+
+
+def bench_recording(num_vehicles=1000, steps=200, seed=SEED):
+    """Recording cost per step and trajectory memory per vehicle-step, in memory and streamed to disk."""
+    import tempfile
+    from .trajectory import TrajectoryRecorder, TrajectoryWriter
+
+    pool = synthetic_pool(num_vehicles, seed)
+    vehicles = pool.active_vehicles()
+    fleet = synthetic_fleet(num_vehicles, seed)
+    results = []
+    recorder = TrajectoryRecorder(num_vehicles, steps)
+    best, _ = _time(lambda: recorder.record_vehicles(vehicles), repeat=1, number=steps)
+    results.append({'recorder': 'TrajectoryRecorder.record_vehicles', 'vehicles': num_vehicles, 'seconds_per_step': best,
+                    'bytes_per_vehicle_step': recorder.nbytes() / (steps * num_vehicles)})
+    recorder = TrajectoryRecorder(num_vehicles, steps)
+    best, _ = _time(lambda: recorder.record_fleet(fleet), repeat=1, number=steps)
+    results.append({'recorder': 'TrajectoryRecorder.record_fleet', 'vehicles': num_vehicles, 'seconds_per_step': best,
+                    'bytes_per_vehicle_step': recorder.nbytes() / (steps * num_vehicles)})
+    recorder = TrajectoryRecorder(num_vehicles, steps, quantize=True)
+    best, _ = _time(lambda: recorder.record_fleet(fleet), repeat=1, number=steps)
+    results.append({'recorder': 'TrajectoryRecorder.record_fleet (quantized)', 'vehicles': num_vehicles, 'seconds_per_step': best,
+                    'bytes_per_vehicle_step': recorder.nbytes() / (steps * num_vehicles)})
+    with tempfile.TemporaryDirectory() as path:
+        writer = TrajectoryWriter(path, num_vehicles, steps)
+        start = time.perf_counter()
+        for _ in range(steps):
+            writer.record_fleet(fleet)
+        stored = writer.close()
+        elapsed = time.perf_counter() - start
+        on_disk = stored.nbytes()
+        results.append({'recorder': 'TrajectoryWriter.record_fleet', 'vehicles': num_vehicles, 'seconds_per_step': elapsed / steps,
+                        'bytes_per_vehicle_step': on_disk / (steps * num_vehicles),
+                        'resident_bytes': writer.nbytes()})
+        del stored
+    return results
+
+
+def synthetic_pairs(num_pairs, seed=SEED):
+    """Vehicle-pair samples in the ACT column layout, as a dict of arrays."""
+    rng = np.random.default_rng(seed)
+    samples = {}
+    for suffix in ('_i', '_j'):
+        heading = rng.uniform(0, 2 * np.pi, num_pairs)
+        samples['x' + suffix] = rng.uniform(-20, 20, num_pairs)
+        samples['y' + suffix] = rng.uniform(-20, 20, num_pairs)
+        samples['vx' + suffix] = rng.normal(0, 8, num_pairs)
+        samples['vy' + suffix] = rng.normal(0, 8, num_pairs)
+        samples['hx' + suffix] = np.cos(heading)
+        samples['hy' + suffix] = np.sin(heading)
+        samples['length' + suffix] = np.full(num_pairs, float(VEHICLE_LENGTH))
+        samples['width' + suffix] = np.full(num_pairs, float(VEHICLE_WIDTH))
+    return samples
+
+
+def bench_ttc(pair_counts=(1000, 10000, 100000), seed=SEED):
+    """Pairs per second of ACT.TTC / ACT.CurrentD (pandas) and ACT.TTC_np / ACT.CurrentD_np against pair count."""
+    import warnings
+    from . import ACT
+
+    results = []
+    try:
+        import pandas as pd
+    except ImportError:
+        pd = None
+    for n in pair_counts:
+        samples = synthetic_pairs(n, seed)
+        paths = [('TTC_np', lambda: ACT.TTC_np(samples)), ('CurrentD_np', lambda: ACT.CurrentD_np(samples))]
+        if pd is not None:
+            frame = pd.DataFrame(samples)
+            paths += [('TTC', lambda: ACT.TTC(frame.copy(), 'values')), ('CurrentD', lambda: ACT.CurrentD(frame.copy(), 'values'))]
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            for name, function in paths:
+                best, _ = _time(function, repeat=3)
+                results.append({'function': name, 'pairs': n, 'pairs_per_s': n / best})
+    return results
+
+
+SUITES = {
+    'step': bench_step,
+    'finders': bench_finders,
+    'models': bench_models,
+    'recording': bench_recording,
+    'ttc': bench_ttc,
+}
+
+QUICK = {
+    'step': {'counts': (100, 500), 'steps': 2},
+    'finders': {'occupancies': (50, 200), 'queries': 50},
+    'models': {'n': 10000, 'scalar_calls': 2000},
+    'recording': {'num_vehicles': 200, 'steps': 50},
+    'ttc': {'pair_counts': (1000, 10000)},
+}
+
+
+def run_benchmarks(suites=None, path=None, quick=False):
+    """
+    Runs the named benchmark suites (all by default) and returns the results
+    with the machine and library versions. If path is given, the results
+    are also written there as JSON. quick runs reduced sizes.
+    """
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'seed': SEED,
+        'quick': quick,
+        'results': {},
+    }
+    for name in suites or SUITES:
+        options = QUICK.get(name, {}) if quick else {}
+        start = time.perf_counter()
+        report['results'][name] = SUITES[name](**options)
+        report.setdefault('durations', {})[name] = time.perf_counter() - start
+    if path is not None:
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=1)
+    return report
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the LFR-MPF benchmark suite.")
+    parser.add_argument('suites', nargs='*', help=f"suites to run, from {', '.join(SUITES)} (default: all)")
+    parser.add_argument('--out', default='benchmarks.json', help="JSON output path")
+    parser.add_argument('--quick', action='store_true', help="reduced sizes for a smoke run")
+    args = parser.parse_args()
+    unknown = set(args.suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+    report = run_benchmarks(args.suites or None, args.out, args.quick)
+    for name, seconds in report['durations'].items():
+        print(f"{name}: {seconds:.1f}s")
+    print(f"Results written to {args.out}")
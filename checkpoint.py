@@ -0,0 +1,132 @@
+# LFR-MPF-Simulation/checkpoint.py
+
+import json
+import numpy as np
+from .config import *
+from .vehicle import VehiclePool
+from .routes import route_table
+
+
+class Checkpoint:
+    """
+    The complete state of a run_simulation run at the start of a step:
+    every Vehicle field, the spawn bookkeeping (last_spawn_time,
+    spawned_count), the RNG state, the step and its time, the seed and the
+    config values of the run, plus the coasting plans of a
+    multirate.MultiRateStepper if one was used. Resuming from it with the
+    same config continues the run bit for bit.
+
+    Saved as a compressed .npz: one array per Vehicle field plus a JSON
+    string with the scalar state.
+    """
+    FLOAT_FIELDS = ('angle', 'radius', 'entry_angle', 'exit_angle', 'tangential_speed', 'radial_speed',
+                    'tangential_acc', 'radial_acc', 'width', 'length', 'gammar', 'max_angle', 'T', 'desired_speed')
+    INT_FIELDS = ('entry_idx', 'exit_idx', 'decide')
+    BOOL_FIELDS = ('paused', 'out')
+    # Tuples of pending accelerations, saved as (vehicles, reaction_lag steps) arrays.
+    PENDING_FIELDS = ('pending_tangential_acc', 'pending_radial_acc')
+
+    def __init__(self, vehicles, state):
+        self.vehicles = vehicles
+        self.state = state
+
+    @property
+    def step(self):
+        return self.state['step']
+
+    @property
+    def time(self):
+        return self.state['time']
+
+    @classmethod
+    def capture(cls, pool, rng, step, last_spawn_time, spawned_count, seed, multirate=None):
+        """Checkpoint of a run_simulation loop at the start of step."""
+        from .trajectory import run_header
+        vehicles = {}
+        for fields, dtype in ((cls.FLOAT_FIELDS, np.float64), (cls.INT_FIELDS, np.int64), (cls.BOOL_FIELDS, bool),
+                              (cls.PENDING_FIELDS, np.float64)):
+            for name in fields:
+                vehicles[name] = np.array([getattr(vehicle, name) for vehicle in pool.vehicles], dtype=dtype)
+        state = {
+            'step': step,
+            'time': step * DT,
+            'seed': seed,
+            'last_spawn_time': last_spawn_time,
+            'spawned_count': spawned_count,
+            'rng': rng.bit_generator.state,
+            'config': run_header(seed),
+            'coasting': None,
+        }
+        del state['config']['seed']
+        if multirate is not None:
+            state['coasting'] = {str(idx): plan for idx, plan in multirate.coasting.items()}
+        return cls(vehicles, state)
+
+    def save(self, path):
+        """Writes the checkpoint to path (np.savez_compressed adds .npz if missing)."""
+        np.savez_compressed(path, state=np.array(json.dumps(self.state)), **self.vehicles)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            state = json.loads(str(data['state']))
+            vehicles = {name: data[name] for name in data.files if name != 'state'}
+        return cls(vehicles, state)
+
+    def pool(self, num_vehicles=None):
+        """
+        A VehiclePool in the checkpointed state. A larger num_vehicles
+        adds paused vehicles to the pool; a smaller one is an error.
+        """
+        saved = len(self.vehicles['paused'])
+        num_vehicles = saved if num_vehicles is None else num_vehicles
+        if num_vehicles < saved:
+            raise ValueError(f"checkpoint holds {saved} vehicles, cannot resume with {num_vehicles}")
+        pool = VehiclePool(num_vehicles)
+        # tolist() gives Python scalars, so the restored vehicles compute exactly as the originals.
+        for name, values in self.vehicles.items():
+            for vehicle, value in zip(pool.vehicles, values.tolist()):
+                setattr(vehicle, name, tuple(value) if name in self.PENDING_FIELDS else value)
+        table = route_table()
+        for vehicle in pool.vehicles[:saved]:
+            if vehicle.entry_idx >= 0:
+                vehicle.route = table.route(vehicle.entry_idx, vehicle.exit_idx)
+        # Sorted id lists are valid heaps, so spawning pops the same ids as in the original run.
+        pool.free = [vehicle.idx for vehicle in pool.vehicles if vehicle.paused]
+        pool.active = [vehicle.idx for vehicle in pool.vehicles if not vehicle.paused]
+        for idx in pool.active:
+            pool.update_phase(pool.vehicles[idx])
+        return pool
+
+    def rng(self):
+        """The random generator in the checkpointed state."""
+        rng = np.random.default_rng()
+        rng.bit_generator.state = self.state['rng']
+        return rng
+
+    def restore_multirate(self, multirate):
+        """Restores the coasting plans of a multirate.MultiRateStepper."""
+        multirate.coasting = {}
+        for idx, plan in (self.state['coasting'] or {}).items():
+            multirate.coasting[int(idx)] = dict(plan, start=tuple(plan['start']), end=tuple(plan['end']))
+
+
+def load_checkpoint(path):
+    """Reads a checkpoint written by Checkpoint.save or run_simulation(checkpoints=...)."""
+    return Checkpoint.load(path)
+
+
+def apply_checkpoint_config(checkpoint, **params):
+    """
+    Restores the config values of a checkpointed run, then applies params
+    on top (see sweep.apply_overrides), e.g. a different FLOW_RATE for a
+    what-if variant resumed from a warm checkpoint.
+    """
+    from .sweep import apply_overrides
+    values = dict(checkpoint.state['config'], **params)
+    if 'OUTER_RADIUS' in params:
+        # Re-derive the angles from the new geometry unless they are overridden too.
+        for name in ('ENTRY_ANGLES', 'EXIT_ANGLES'):
+            if name not in params:
+                values.pop(name, None)
+    apply_overrides(**values)
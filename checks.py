@@ -0,0 +1,299 @@
+# LFR-MPF-Simulation/checks.py
+
+import time
+import numpy as np
+from .config import *
+from . import models
+from .benchmarks import SEED, synthetic_pool
+
+# Seeded equivalence checks between the reference code paths and their fast
+# counterparts, which are meant to agree bit for bit. Run them after changing
+# either side: python -m <package>.checks [names] [--quick]
+
+_STATE = ('active', 'radius', 'angle', 'tangential_speed', 'radial_speed', 'entry_idx', 'exit_idx', 'trips')
+
+
+def check_engines(seeds=(1, 2), num_vehicles=120, total_time=60.0, flow_rate=0.4):
+    """
+    Runs run_fleet_simulation(backend='numpy') and
+    run_simulation(synchronous=True) from the same seeds and compares the
+    recorded trajectories exactly. The config values in effect are
+    restored afterwards.
+    """
+    from . import config
+    from .sweep import apply_overrides, _DEFAULTS
+    from .main import run_simulation, run_fleet_simulation
+
+    saved = {name: getattr(config, name) for name in _DEFAULTS}
+    results = []
+    try:
+        apply_overrides(NUM_VEHICLES=num_vehicles, TOTAL_TIME=total_time, FLOW_RATE=flow_rate)
+        for seed in seeds:
+            fleet = run_fleet_simulation(seed=seed, backend='numpy', progress_every=None)
+            objects = run_simulation(seed=seed, synchronous=True, progress_every=None)
+            mismatched = [name for name in _STATE
+                          if not np.array_equal(np.asarray(getattr(fleet, name)), np.asarray(getattr(objects, name)), equal_nan=True)]
+            results.append({'seed': seed, 'vehicle_steps': int(np.asarray(fleet.active).sum()),
+                            'mismatched': mismatched, 'ok': not mismatched})
+    finally:
+        apply_overrides(**saved)
+    return results
+
+
+def check_ensemble(replications=3, seed=11, num_vehicles=60, total_time=30.0, flow_rate=1.0):
+    """
+    Runs ensemble.run_ensemble and run_fleet_simulation(backend='numpy')
+    for each replication seed and compares the trajectories exactly.
+    """
+    from . import config
+    from .sweep import apply_overrides, _DEFAULTS
+    from .main import run_fleet_simulation
+    from .ensemble import run_ensemble, replication_seeds
+
+    saved = {name: getattr(config, name) for name in _DEFAULTS}
+    results = []
+    try:
+        apply_overrides(NUM_VEHICLES=num_vehicles, TOTAL_TIME=total_time, FLOW_RATE=flow_rate)
+        seeds = replication_seeds(seed, replications)
+        for seed, replica in zip(seeds, run_ensemble(seeds, progress_every=None)):
+            single = run_fleet_simulation(seed=seed, backend='numpy', progress_every=None)
+            mismatched = [name for name in _STATE
+                          if not np.array_equal(np.asarray(getattr(replica, name)), np.asarray(getattr(single, name)), equal_nan=True)]
+            results.append({'seed': seed, 'mismatched': mismatched, 'ok': not mismatched})
+    finally:
+        apply_overrides(**saved)
+    return results
+
+
+def check_trips(seeds=(3, 4), total_time=None):
+    """
+    Runs run_fleet_simulation with the default config (total_time
+    overrides TOTAL_TIME) and checks that sweep.summarize counts completed
+    trips, no more than were spawned, with a finite mean travel time, and
+    that a MetricsAccumulator fed the same run agrees with it.
+    """
+    from . import config
+    from .sweep import apply_overrides, summarize, _DEFAULTS
+    from .main import run_fleet_simulation
+    from .metrics import MetricsAccumulator
+
+    saved = {name: getattr(config, name) for name in _DEFAULTS}
+    results = []
+    try:
+        apply_overrides(**({} if total_time is None else {'TOTAL_TIME': total_time}))
+        for seed in seeds:
+            metrics = MetricsAccumulator()
+            summary = summarize(run_fleet_simulation(seed=seed, metrics=metrics, progress_every=None))
+            totals = metrics.totals()
+            ok = (0 < summary['trips'] <= summary['spawned'] and np.isfinite(summary['mean_travel_time'])
+                  and all(np.isclose(totals[name], summary[name]) for name in ('spawned', 'trips', 'mean_travel_time')))
+            results.append(dict(summary, seed=seed, metrics_trips=totals['trips'], ok=bool(ok)))
+    finally:
+        apply_overrides(**saved)
+    return results
+
+
+def check_safety_pairs(seeds=(3,), every=7, max_fraction=1 / 3):
+    """
+    Replays rows of a default-config run_fleet_simulation through
+    SafetyMonitor.candidate_pairs and compares the pairs with a screen of
+    all pairs under the same rule. Also requires the angular window to
+    have paired up at most max_fraction of all N(N-1)/2 pairs.
+    """
+    from . import config
+    from .sweep import apply_overrides, _DEFAULTS
+    from .main import run_fleet_simulation
+    from .safety import SafetyMonitor
+    from .trajectory import polar_to_cartesian
+
+    saved = {name: getattr(config, name) for name in _DEFAULTS}
+    results = []
+    try:
+        apply_overrides()
+        for seed in seeds:
+            trajectory = run_fleet_simulation(seed=seed, progress_every=None)
+            monitor = SafetyMonitor()
+            active = np.asarray(trajectory.active)
+            all_pairs = window = 0
+            mismatched = []
+            for t in range(1, trajectory.num_recorded, every):
+                ids = np.flatnonzero(active[t])
+                n = ids.size
+                if n < 2:
+                    continue
+                state = [np.asarray(getattr(trajectory, name)[t, ids])
+                         for name in ('radius', 'angle', 'tangential_speed', 'radial_speed')]
+                length, width = np.full(n, VEHICLE_LENGTH), np.full(n, VEHICLE_WIDTH)
+                circle = np.hypot(length, width) / 2
+                a, b = monitor.candidate_pairs(*state, length, width)
+                i, j = np.triu_indices(n, 1)
+                x, y, vx, vy, _, _ = polar_to_cartesian(*state)
+                gap = np.hypot(x[i] - x[j], y[i] - y[j]) - circle[i] - circle[j]
+                closing = np.hypot(vx[i] - vx[j], vy[i] - vy[j]) * monitor.horizon
+                near = gap <= np.minimum(closing, monitor.max_range)
+                if set(zip(a.tolist(), b.tolist())) != set(zip(i[near].tolist(), j[near].tolist())):
+                    mismatched.append(t)
+                all_pairs += i.size
+                window += monitor.window_pairs(*state, circle).shape[1]
+            fraction = window / max(all_pairs, 1)
+            results.append({'seed': seed, 'pairs': all_pairs, 'window_fraction': fraction, 'mismatched': mismatched,
+                            'ok': not mismatched and fraction <= max_fraction})
+    finally:
+        apply_overrides(**saved)
+    return results
+
+
+def check_trajectory_writer(num_vehicles=50, num_steps=300, chunk_steps=32, seed=SEED):
+    """
+    Records the same rows, each with a random subset of the vehicles
+    active, into a TrajectoryRecorder and through a TrajectoryWriter with
+    several flushes, and compares every field exactly, inactive slots
+    included.
+    """
+    import tempfile
+    from .trajectory import TrajectoryRecorder, TrajectoryWriter
+
+    rng = np.random.default_rng(seed)
+    rows = []
+    for _ in range(num_steps):
+        ids = np.flatnonzero(rng.random(num_vehicles) < 0.5)
+        rows.append((ids, *rng.uniform(0, 50, (4, ids.size)), *rng.integers(0, 12, (2, ids.size)), rng.random(ids.size) < 0.1))
+    results = []
+    for quantize in (False, True):
+        recorder = TrajectoryRecorder(num_vehicles, num_steps, quantize=quantize)
+        with tempfile.TemporaryDirectory() as path:
+            writer = TrajectoryWriter(path, num_vehicles, num_steps, chunk_steps, quantize=quantize)
+            for row in rows:
+                recorder.record(*row)
+                writer.record(*row)
+            stored = writer.close()
+            mismatched = [name for name in _STATE
+                          if not np.array_equal(np.asarray(getattr(stored, name)), np.asarray(getattr(recorder, name)))]
+            del stored
+        results.append({'quantize': quantize, 'flushes': -(-num_steps // chunk_steps), 'mismatched': mismatched, 'ok': not mismatched})
+    return results
+
+
+def check_finders(occupancies=(50, 200, 800), seed=SEED):
+    """
+    Calls each utils.py finder for every vehicle of a synthetic pool, by
+    full scan and through a PolarIndex, and compares the vehicles found.
+    """
+    from .utils import PolarIndex, find_approaching_leader, find_leader_in_roundabout, find_follower_in_roundabout
+
+    results = []
+    for n in occupancies:
+        vehicles = synthetic_pool(n, seed).active_vehicles()
+        index = PolarIndex(vehicles)
+        for finder in (find_approaching_leader, find_leader_in_roundabout, find_follower_in_roundabout):
+            egos = [v for v in vehicles if (v.radius > OUTER_RADIUS) == (finder is find_approaching_leader)]
+            mismatched = [v.idx for v in egos if finder(v, vehicles) is not finder(v, vehicles, index)]
+            results.append({'finder': finder.__name__, 'vehicles': n, 'queries': len(egos),
+                            'mismatched': mismatched, 'ok': not mismatched})
+    return results
+
+
+def check_models(n=20000, seed=SEED):
+    """
+    Evaluates every models.py function element by element and through its
+    batched kernel on random inputs (including the v < 1, overlap and
+    clipping branches) and compares the results exactly.
+    """
+    rng = np.random.default_rng(seed)
+    v, v_lead = rng.uniform(0, 20, n), rng.uniform(0, 20, n)
+    gap, sy = rng.uniform(0.5, 100, n), rng.normal(0, 4, n)
+    a, width = rng.uniform(-6, 4, n), rng.uniform(1.5, 5, n)
+    speed_y, position_y = rng.normal(0, 1, n), rng.uniform(INNER_RADIUS, OUTER_RADIUS, n)
+    front_speed_y, front_position_y = rng.normal(0, 1, n), position_y + rng.normal(0, 4, n)
+    A, B, C, D = 1, 0.6, 0.7, 0.5
+
+    def iam(i):
+        return models.iam_radial_acceleration(
+            a[i], A, B, C, D,
+            {'width': width[i], 'speed_y': speed_y[i], 'position_y': position_y[i], 'speed_x': v[i]},
+            {'width': width[i], 'speed_y': front_speed_y[i], 'position_y': front_position_y[i]})
+
+    kernels = (
+        ('idm_acceleration', lambda i: models.idm_acceleration(v[i], v_lead[i], gap[i], sy[i]),
+         lambda: models.idm_acceleration_batch(v, v_lead, gap, sy)),
+        ('idm_exit_approach', lambda i: models.idm_exit_approach(v[i], v_lead[i], gap[i], sy[i]),
+         lambda: models.idm_exit_approach_batch(v, v_lead, gap, sy)),
+        ('idm_entry_acceleration', lambda i: models.idm_entry_acceleration(v[i], v_lead[i], gap[i]),
+         lambda: models.idm_entry_acceleration_batch(v, v_lead, gap)),
+        ('idm_interaction_deceleration', lambda i: models.idm_interaction_deceleration(v[i], v_lead[i], gap[i], sy[i]),
+         lambda: models.idm_interaction_deceleration_batch(v, v_lead, gap, sy)),
+        ('iam_radial_acceleration', iam,
+         lambda: models.iam_radial_acceleration_batch(a, A, B, C, D, width, speed_y, position_y, v, front_speed_y, front_position_y)),
+    )
+    results = []
+    for name, scalar, batch in kernels:
+        expected = np.array([scalar(i) for i in range(n)], dtype=float)
+        mismatched = np.flatnonzero(expected != batch())
+        results.append({'kernel': name, 'elements': n, 'mismatched': mismatched.tolist(), 'ok': not mismatched.size})
+    return results
+
+
+def check_backends(num_steps=400):
+    """backend.check_backend for every available backend other than the numpy reference."""
+    from .backend import BACKENDS, numba_available, check_backend
+
+    names = [name for name in BACKENDS if name != 'numpy' and (name != 'numba' or numba_available())]
+    return [check_backend(name, num_steps=num_steps) for name in names]
+
+
+CHECKS = {
+    'engines': check_engines,
+    'ensemble': check_ensemble,
+    'trajectory': check_trajectory_writer,
+    'trips': check_trips,
+    'safety': check_safety_pairs,
+    'finders': check_finders,
+    'models': check_models,
+    'backends': check_backends,
+}
+
+QUICK = {
+    'engines': {'seeds': (1,), 'num_vehicles': 60, 'total_time': 15.0},
+    'ensemble': {'replications': 2, 'total_time': 15.0},
+    'trajectory': {'num_steps': 100},
+    'trips': {'seeds': (3,)},
+    'safety': {'every': 29},
+    'finders': {'occupancies': (50, 200)},
+    'models': {'n': 2000},
+    'backends': {'num_steps': 100},
+}
+
+
+def run_checks(names=None, quick=False):
+    """
+    Runs the named checks (all by default) and returns {name: rows}, every
+    row with an 'ok' flag, and whether all of them passed. quick runs
+    reduced sizes.
+    """
+    report, ok = {}, True
+    for name in names or CHECKS:
+        options = QUICK.get(name, {}) if quick else {}
+        start = time.perf_counter()
+        report[name] = rows = CHECKS[name](**options)
+        passed = all(row['ok'] for row in rows)
+        ok &= passed
+        print(f"{name}: {'ok' if passed else 'FAILED'} ({len(rows)} cases, {time.perf_counter() - start:.1f}s)")
+        for row in rows:
+            if not row['ok']:
+                print(f"  {row}")
+    return report, ok
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Run the LFR-MPF equivalence checks.")
+    parser.add_argument('checks', nargs='*', help=f"checks to run, from {', '.join(CHECKS)} (default: all)")
+    parser.add_argument('--quick', action='store_true', help="reduced sizes for a smoke run")
+    args = parser.parse_args()
+    unknown = set(args.checks) - set(CHECKS)
+    if unknown:
+        parser.error(f"unknown checks: {', '.join(sorted(unknown))}")
+    _, ok = run_checks(args.checks or None, args.quick)
+    sys.exit(0 if ok else 1)
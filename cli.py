@@ -0,0 +1,172 @@
+# LFR-MPF-Simulation/cli.py
+
+import argparse
+import json
+import math
+import sys
+
+# Only the standard library is imported here; every subcommand imports the
+# modules it needs, so `run` never loads matplotlib, IPython or pandas.
+
+
+def _config_value(text):
+    """NAME=VALUE with VALUE parsed as JSON (numbers, lists), else kept as a string."""
+    name, sep, value = text.partition('=')
+    if not sep:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got {text!r}")
+    try:
+        return name, json.loads(value)
+    except json.JSONDecodeError:
+        return name, value
+
+
+def _overrides(args):
+    """Config overrides (see sweep.apply_overrides) from the common run options."""
+    from . import config
+
+    params = dict(args.set or [])
+    if args.flow_rate is not None:
+        params['FLOW_RATE'] = args.flow_rate
+    if args.vehicles is not None:
+        params['NUM_VEHICLES'] = args.vehicles
+    if args.time is not None:
+        params['TOTAL_TIME'] = args.time
+    elif args.steps is not None:
+        params['TOTAL_TIME'] = args.steps * params.get('DT', config.DT)
+    return params
+
+
+def _json_safe(value):
+    """value with non-finite floats (nan when no trip finished, inf) replaced by None, so it is valid JSON."""
+    if isinstance(value, dict):
+        return {key: _json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(item) for item in value]
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def _dumps(value, **options):
+    return json.dumps(_json_safe(value), allow_nan=False, **options)
+
+
+def _write_json(value, path):
+    if path == '-':
+        sys.stdout.write(_dumps(value, indent=1) + '\n')
+    else:
+        with open(path, 'w') as f:
+            f.write(_dumps(value, indent=1))
+
+
+def run(args):
+    """Runs one simulation; the trajectory goes to --out, the metrics to stdout or --metrics."""
+    from .sweep import apply_overrides
+    from .metrics import MetricsAccumulator
+
+    apply_overrides(**_overrides(args))
+    metrics = MetricsAccumulator()
+    options = dict(seed=args.seed, out=args.out, chunk_steps=args.chunk_steps, quantize=args.quantize,
+                   metrics=metrics, record=args.out is not None, progress_every=args.progress or None)
+    if args.engine == 'fleet':
+        from .main import run_fleet_simulation
+        run_fleet_simulation(backend=args.backend, **options)
+    else:
+        from .main import run_simulation
+        run_simulation(synchronous=args.engine == 'synchronous', **options)
+
+    totals = metrics.totals()
+    if args.metrics is not None:
+        _write_json({'totals': totals, 'by_route': metrics.by_route(), 'by_entry': metrics.by_entry(),
+                     'by_exit': metrics.by_exit(), 'by_sector': metrics.by_sector()}, args.metrics)
+    if args.metrics != '-':
+        print(_dumps(totals))
+    return 0
+
+
+def plot(args):
+    """Draws aggregate plots (or a video) of a trajectory directory written with run --out."""
+    from .sweep import apply_overrides, _DEFAULTS
+    from .trajectory import open_trajectory
+
+    trajectory = open_trajectory(args.trajectory)
+    # Plot with the geometry the run used, recorded in its header.
+    apply_overrides(**{name: value for name, value in trajectory.header.items() if name in _DEFAULTS})
+    from . import visualization
+
+    if args.kind == 'space-time':
+        visualization.plot_space_time(trajectory, time_bin=args.time_bin, path=args.output)
+    elif args.kind == 'radial':
+        visualization.plot_radial_profile(trajectory, path=args.output)
+    elif args.kind == 'fundamental':
+        visualization.plot_fundamental_diagram(trajectory, sectors=args.sectors, interval=args.interval, path=args.output)
+    else:
+        visualization.render_video(trajectory, args.output)
+    print(args.output)
+    return 0
+
+
+def sweep(args):
+    """Runs a FLOW_RATE sweep with constant-memory metrics and writes the rows as CSV."""
+    from .sweep import parameter_grid, run_sweep
+
+    params = _overrides(args)
+    params.pop('FLOW_RATE', None)
+    points = parameter_grid(FLOW_RATE=args.flow_rates, **{name: [value] for name, value in params.items()})
+    table = run_sweep(points, replications=args.replications, base_seed=args.seed, processes=args.processes,
+                      engine=args.engine, metrics={})
+    table.to_csv(args.output if args.output != '-' else sys.stdout, index=False)
+    return 0
+
+
+def _add_run_options(parser):
+    parser.add_argument('--steps', type=int, help="number of time steps (sets TOTAL_TIME = steps * DT)")
+    parser.add_argument('--time', type=float, help="simulated time in seconds (overrides --steps)")
+    parser.add_argument('--flow-rate', type=float, help="seconds between spawns (FLOW_RATE)")
+    parser.add_argument('--vehicles', type=int, help="vehicle pool size (NUM_VEHICLES)")
+    parser.add_argument('--set', type=_config_value, action='append', metavar='NAME=VALUE',
+                        help="any other config override, e.g. --set OUTER_RADIUS=70 (repeatable)")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='lfr-mpf', description="Lane-free roundabout simulation (LFR-MPF).")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="run one simulation headless")
+    _add_run_options(run_parser)
+    run_parser.add_argument('--seed', type=int, help="random seed (default: fresh entropy)")
+    run_parser.add_argument('--out', help="directory to stream the trajectory to (default: not recorded)")
+    run_parser.add_argument('--chunk-steps', type=int, default=256, help="trajectory rows per disk write")
+    run_parser.add_argument('--quantize', action='store_true', help="store the trajectory as int32")
+    run_parser.add_argument('--engine', choices=('objects', 'synchronous', 'fleet'), default='fleet',
+                            help="object loop (sequential or synchronous updates) or the Fleet engine")
+    run_parser.add_argument('--backend', help="Fleet backend: numpy (default), numba, python or auto")
+    run_parser.add_argument('--metrics', metavar='PATH', help="write the full metrics as JSON ('-' for stdout)")
+    run_parser.add_argument('--progress', type=float, default=5.0, metavar='SECONDS',
+                            help="seconds between progress lines (0: none)")
+    run_parser.set_defaults(handler=run)
+
+    plot_parser = commands.add_parser('plot', help="plot a trajectory written by run --out")
+    plot_parser.add_argument('trajectory', help="trajectory directory")
+    plot_parser.add_argument('--kind', choices=('space-time', 'radial', 'fundamental', 'video'), default='space-time')
+    plot_parser.add_argument('--output', required=True, help="image (or .mp4/.gif video) path")
+    plot_parser.add_argument('--time-bin', type=float, default=1.0, help="space-time bin width in seconds")
+    plot_parser.add_argument('--sectors', type=int, default=12, help="fundamental diagram sectors")
+    plot_parser.add_argument('--interval', type=float, default=30.0, help="fundamental diagram interval in seconds")
+    plot_parser.set_defaults(handler=plot)
+
+    sweep_parser = commands.add_parser('sweep', help="sweep FLOW_RATE across a process pool")
+    _add_run_options(sweep_parser)
+    sweep_parser.add_argument('--flow-rates', type=float, nargs='+', required=True, help="FLOW_RATE values")
+    sweep_parser.add_argument('--replications', type=int, default=1)
+    sweep_parser.add_argument('--seed', type=int, default=0, help="base seed of the replication seeds")
+    sweep_parser.add_argument('--processes', type=int, help="worker processes (default: one per CPU)")
+    sweep_parser.add_argument('--engine', choices=('objects', 'fleet'), default='fleet')
+    sweep_parser.add_argument('--output', default='-', help="CSV path ('-' for stdout)")
+    sweep_parser.set_defaults(handler=sweep)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
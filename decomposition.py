@@ -0,0 +1,179 @@
+# LFR-MPF-Simulation/decomposition.py
+
+import multiprocessing
+import os
+import threading
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from .config import *
+from .fleet import Fleet
+
+
+def halo_angle(width=None):
+    """
+    Angular reach of the neighbour search (see Fleet.find_neighbors):
+    100 m of arc at the innermost radius a vehicle of the given width
+    (default: the current VEHICLE_WIDTH) can occupy, or the entry band
+    seen by approaching vehicles, plus a small margin.
+    """
+    width = VEHICLE_WIDTH if width is None else width
+    return min(np.pi, max(100 / (INNER_RADIUS + width / 2), np.pi / 18)) + 1e-3
+
+
+class SharedFleet:
+    """
+    A Fleet whose arrays live in one shared-memory block, so worker
+    processes can attach to the same state by name. The creating process
+    owns the block and unlinks it on close().
+    """
+
+    def __init__(self, num_vehicles, backend=None, name=None):
+        self.fleet = Fleet(num_vehicles, backend)
+        self.fields = [field for field, value in vars(self.fleet).items() if isinstance(value, np.ndarray)]
+        offsets, size = [], 0
+        for field in self.fields:
+            offsets.append(size)
+            size += -(-getattr(self.fleet, field).nbytes // 8) * 8
+        self.owner = name is None
+        self.shm = SharedMemory(name=name, create=self.owner, size=max(size, 1))
+        for field, offset in zip(self.fields, offsets):
+            initial = getattr(self.fleet, field)
+            view = np.ndarray(initial.shape, initial.dtype, buffer=self.shm.buf, offset=offset)
+            if self.owner:
+                view[...] = initial
+            setattr(self.fleet, field, view)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        """Detaches from the block; the fleet keeps private copies of the last state."""
+        for field in self.fields:
+            setattr(self.fleet, field, np.array(getattr(self.fleet, field)))
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def sector_rows(angle, active, rank, sectors, halo):
+    """
+    The active vehicles owned by sector rank (angle in its 2*pi/sectors
+    slice) and the ones it must see: those plus halo copies within halo
+    radians on either side.
+    """
+    width = 2 * np.pi / sectors
+    angle = angle % (2 * np.pi)
+    owner = np.minimum((angle // width).astype(np.int64), sectors - 1)
+    offset = (angle - rank * width) % (2 * np.pi)
+    owned = np.flatnonzero(active & (owner == rank))
+    visible = np.flatnonzero(active & ((offset < width + halo) | (offset >= 2 * np.pi - halo)))
+    return owned, visible
+
+
+def _sector_worker(rank, sectors, shm_name, num_vehicles, num_steps, backend, params, start, exchanged, end):
+    """
+    Worker: steps the vehicles of one angular sector. Each step it copies
+    its own and its halo vehicles from shared memory into a private Fleet,
+    steps them there, and after every worker has read the pre-step state
+    writes its own vehicles back. Ownership follows the pre-step angles, so
+    vehicles migrate to the neighbouring sector as they cross a border.
+    """
+    from .sweep import apply_overrides
+    apply_overrides(**params)
+    shared = SharedFleet(num_vehicles, backend, name=shm_name)
+    state, local = shared.fleet, Fleet(num_vehicles, backend)
+    halo = halo_angle(state.width.min())
+    try:
+        for _ in range(num_steps):
+            start.wait()
+            owned, visible = sector_rows(state.angle, ~state.paused, rank, sectors, halo)
+            if owned.size:
+                for field in shared.fields:
+                    getattr(local, field)[visible] = getattr(state, field)[visible]
+                local.step(visible)
+            exchanged.wait()
+            for field in shared.fields:
+                getattr(state, field)[owned] = getattr(local, field)[owned]
+            end.wait()
+    except BaseException:
+        start.abort()
+        exchanged.abort()
+        end.abort()
+        raise
+    finally:
+        shared.close()
+
+
+def run_decomposed_simulation(seed=None, out=None, chunk_steps=256, sectors=None, backend=None, monitor=None,
+                              progress_every=5.0):
+    """
+    Runs the Fleet engine with the ring split into `sectors` angular
+    sectors (default: one per CPU), each stepped by its own worker process
+    on a shared-memory Fleet. The step is synchronous, so the result is
+    identical to run_fleet_simulation with the same seed; it is returned
+    the same way. The halo (see halo_angle) spans 100 m of arc, so sectors
+    only cut the work per worker on rings whose circumference is large
+    against it.
+    """
+    from .instrumentation import Progress
+    from .main import _draw_route, _make_recorder
+    from .trajectory import run_header
+
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    rng = np.random.default_rng(seed)
+    sectors = sectors or os.cpu_count() or 1
+    num_steps = int(TOTAL_TIME / DT)
+    last_spawn_time = -FLOW_RATE
+    spawned_count = 0
+    progress = Progress(progress_every)
+
+    params = run_header(seed)
+    del params['seed']
+    shared = SharedFleet(NUM_VEHICLES, backend)
+    fleet = shared.fleet
+    context = multiprocessing.get_context()
+    start, end = context.Barrier(sectors + 1), context.Barrier(sectors + 1)
+    exchanged = context.Barrier(sectors)
+    workers = [context.Process(target=_sector_worker, daemon=True,
+                               args=(rank, sectors, shared.name, NUM_VEHICLES, num_steps, backend, params, start, exchanged, end))
+               for rank in range(sectors)]
+    try:
+        for worker in workers:
+            worker.start()
+        trajectory = _make_recorder(num_steps, seed, out, chunk_steps)
+        trajectory.record_fleet(fleet)
+        for t_step in range(num_steps):
+            current_time = t_step * DT
+            progress.update(current_time)
+
+            # --- Spawn New Vehicles ---
+            if current_time - last_spawn_time >= FLOW_RATE and spawned_count < NUM_VEHICLES:
+                if fleet.paused.any():
+                    entry_idx, exit_idx = _draw_route(rng)
+                    fleet.activate(np.argmax(fleet.paused), entry_idx, exit_idx)
+                    spawned_count += 1
+                    last_spawn_time = current_time
+
+            # --- Update Vehicles (in the workers) ---
+            try:
+                start.wait()
+                end.wait()
+            except threading.BrokenBarrierError:
+                raise RuntimeError("a sector worker failed; see its traceback above") from None
+            trajectory.record_fleet(fleet)
+            if monitor is not None:
+                monitor.observe_fleet(fleet)
+        for worker in workers:
+            worker.join()
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        shared.close()
+
+    progress.finish()
+
+    return trajectory.close()
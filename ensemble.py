@@ -0,0 +1,84 @@
+# LFR-MPF-Simulation/ensemble.py
+
+import numpy as np
+from .config import *
+from .fleet import Fleet
+from .instrumentation import Progress
+from .trajectory import TRIP_VEHICLE, TrajectoryRecorder, _PolarFields
+
+
+def replication_seeds(seed, replications):
+    """Independent integer seeds for the replications of one ensemble, spawned from seed."""
+    children = np.random.SeedSequence(seed).spawn(replications)
+    return [int(child.generate_state(1, np.uint64)[0]) for child in children]
+
+
+class ReplicaTrajectory(_PolarFields):
+    """The columns of one replication in an ensemble trajectory, read like a TrajectoryRecorder."""
+
+    def __init__(self, trajectory, replica, num_vehicles):
+        self.trajectory = trajectory
+        self.columns = slice(replica * num_vehicles, (replica + 1) * num_vehicles)
+        self.num_vehicles = num_vehicles
+        self.num_recorded = trajectory.num_recorded
+        self.quanta = trajectory.quanta
+
+    def _field(self, name):
+        return self.trajectory._field(name)[:, self.columns]
+
+    def _trips(self):
+        trips = self.trajectory._trips()
+        if trips is None:
+            return None
+        start = self.columns.start
+        trips = trips[(trips[:, TRIP_VEHICLE] >= start) & (trips[:, TRIP_VEHICLE] < self.columns.stop)]
+        trips[:, TRIP_VEHICLE] -= start
+        return trips
+
+
+def run_ensemble(seeds, quantize=False, progress_every=5.0):
+    """
+    Runs one Fleet replication per seed in a single Fleet (see Fleet's
+    replications), so every step evaluates the neighbour search, models
+    and kinematics of all replications in the same NumPy calls. Each
+    replication spawns from its own RNG stream as run_fleet_simulation
+    does, and its trajectory is identical to
+    run_fleet_simulation(seed, backend='numpy'): replications run on the
+    numpy backend whatever the default backend is.
+    Returns one ReplicaTrajectory per seed.
+    """
+    from .main import _draw_route
+
+    seeds = list(seeds)
+    k, n = len(seeds), NUM_VEHICLES
+    rngs = [np.random.default_rng(seed) for seed in seeds]
+    fleet = Fleet(n, backend='numpy', replications=k)
+    num_steps = int(TOTAL_TIME / DT)
+    last_spawn_time = np.full(k, -FLOW_RATE)
+    spawned_count = np.zeros(k, dtype=np.int64)
+    progress = Progress(progress_every)
+
+    trajectory = TrajectoryRecorder(n * k, num_steps + 1, quantize=quantize)
+    trajectory.record_fleet(fleet)
+    for t_step in range(num_steps):
+        current_time = t_step * DT
+        progress.update(current_time)
+
+        # --- Spawn New Vehicles (per replication, from its own stream) ---
+        due = np.flatnonzero((current_time - last_spawn_time >= FLOW_RATE) & (spawned_count < n))
+        if due.size:
+            paused = fleet.paused.reshape(k, n)
+            for r in due[paused[due].any(axis=1)]:
+                entry_idx, exit_idx = _draw_route(rngs[r])
+                fleet.activate(r * n + np.argmax(paused[r]), entry_idx, exit_idx)
+                spawned_count[r] += 1
+                last_spawn_time[r] = current_time
+
+        # --- Update Vehicles ---
+        fleet.step()
+        trajectory.record_fleet(fleet)
+
+    progress.finish()
+
+    trajectory = trajectory.close()
+    return [ReplicaTrajectory(trajectory, r, n) for r in range(k)]
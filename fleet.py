@@ -0,0 +1,408 @@
+# LFR-MPF-Simulation/fleet.py
+
+import numpy as np
+from .config import *
+from .utils import angular_window_pairs, arc_window
+from .routes import route_table
+from .backend import select_backend, fleet_step
+from .models import (idm_acceleration_batch, idm_exit_approach_batch, idm_entry_acceleration_batch,
+                     idm_interaction_deceleration_batch, iam_radial_acceleration_batch, reaction_lag)
+
+NO_VEHICLE = -1
+YIELD = -2
+
+
+def angle_gap(start_angle, end_angle):
+    """Array form of utils.calculate_angle_gap."""
+    return (end_angle - start_angle + 2 * np.pi) % (2 * np.pi)
+
+
+class Fleet:
+    """
+    Structure-of-arrays state for a pool of vehicles.
+
+    Every per-vehicle quantity of vehicle.Vehicle is held in one contiguous
+    array indexed by vehicle id, and step() advances all active vehicles
+    with the same phase logic as Vehicle.update. All vehicles read the
+    state of step t and are committed to step t+1 together.
+
+    backend selects the step implementation (see backend.select_backend):
+    'numpy' runs the vectorized code below, 'numba' the JIT-compiled loop
+    kernels, optionally with parallel=True.
+
+    With replications=K the fleet holds K independent replications of
+    num_vehicles vehicles each (ids r * num_vehicles onwards belong to
+    replication r, see `replica`); vehicles only interact within their
+    replication, so every step advances all K at once (numpy backend only).
+    """
+
+    def __init__(self, num_vehicles, backend=None, parallel=False, replications=1):
+        n = num_vehicles * replications
+        self.num_vehicles = n
+        self.backend = select_backend(backend)
+        if replications > 1 and self.backend != 'numpy':
+            raise ValueError(f"replications need the numpy backend, not {self.backend!r}")
+        self.parallel = parallel
+        self.replications = replications
+        self.replica = np.repeat(np.arange(replications), num_vehicles)
+        self.routes = route_table()
+        self.angle = np.zeros(n)
+        self.radius = np.full(n, 999.0)
+        self.entry_angle = np.zeros(n)
+        self.exit_angle = np.zeros(n)
+        self.entry_idx = np.full(n, -1, dtype=np.int64)
+        self.exit_idx = np.full(n, -1, dtype=np.int64)
+        self.tangential_speed = np.zeros(n)
+        self.radial_speed = np.zeros(n)
+        self.tangential_acc = np.zeros(n)
+        self.radial_acc = np.zeros(n)
+        # Accelerations computed but not yet acting, oldest first (see Vehicle._update_kinematics).
+        self.pending_tangential_acc = np.zeros((n, reaction_lag()[0]))
+        self.pending_radial_acc = np.zeros((n, reaction_lag()[0]))
+        self.width = np.full(n, float(VEHICLE_WIDTH))
+        self.length = np.full(n, float(VEHICLE_LENGTH))
+        self.gammar = np.full(n, 3.0)
+        self.T = np.full(n, float(TIME_HEADWAY))
+        self.desired_speed = np.full(n, float(DESIRED_SPEED))
+        self.paused = np.ones(n, dtype=bool)
+        self.out = np.zeros(n, dtype=bool)
+        self.yielding = np.zeros(n, dtype=bool)
+        self.decide = np.full(n, 100, dtype=np.int64)
+
+    def active_indices(self):
+        """Indices of the vehicles currently in the simulation, in id order."""
+        return np.flatnonzero(~self.paused)
+
+    def activate(self, i, entry_idx, exit_idx):
+        """Activates paused vehicle i, mirroring Vehicle.activate."""
+        self.paused[i] = False
+        self.entry_idx[i] = entry_idx
+        self.exit_idx[i] = exit_idx
+        self.entry_angle[i] = self.routes.entry_angles[entry_idx]
+        self.exit_angle[i] = self.routes.exit_angles[exit_idx]
+        self.angle[i] = self.entry_angle[i]
+        self.radius[i] = OUTER_RADIUS + 30
+        self.tangential_speed[i] = 0
+        self.radial_speed[i] = -10
+        self.pending_tangential_acc[i] = 0
+        self.pending_radial_acc[i] = 0
+        self.decide[i] = entry_idx + 1
+
+    def retire(self, ids):
+        """Resets vehicles to the paused state, mirroring Vehicle._set_paused."""
+        self.paused[ids] = True
+        self.out[ids] = False
+        self.yielding[ids] = False
+        self.radius[ids] = 999
+        self.angle[ids] = 0
+        self.decide[ids] = 999
+
+    def step(self, ids=None):
+        """
+        Advances every active vehicle by one time step. ids restricts the
+        step to a subset of the active vehicles, which then only see each other.
+        """
+        if ids is None:
+            ids = self.active_indices()
+        if ids.size == 0:
+            return
+        self.update_decision(ids)
+        if self.backend != 'numpy':
+            exiting = fleet_step(self, ids, self.backend, self.parallel)
+            done = exiting[self.radius[exiting] > OUTER_RADIUS + 32]
+            if done.size:
+                self.retire(done)
+            return
+        leader, follower = self.find_neighbors(ids)
+        self.yielding[ids] = leader == YIELD
+
+        radius = self.radius[ids]
+        approaching = radius >= OUTER_RADIUS
+        exiting = ~approaching & self.out[ids] & (self.decide[ids] < 0)
+        circulating = ~approaching & ~exiting
+
+        # Every phase reads the pre-step state, so commit only after all ran.
+        a_ids, a_state = ids[approaching], self._approaching(ids[approaching], leader[approaching])
+        r_ids, r_state = ids[circulating], self._in_roundabout(ids[circulating], leader[circulating], follower[circulating])
+        e_ids, e_state = ids[exiting], self._exiting(ids[exiting])
+        for sub_ids, state in ((a_ids, a_state), (r_ids, r_state), (e_ids, e_state)):
+            for name, values in state.items():
+                getattr(self, name)[sub_ids] = values
+
+        done = e_ids[self.radius[e_ids] > OUTER_RADIUS + 32]
+        if done.size:
+            self.retire(done)
+
+    def update_decision(self, ids):
+        """Vectorized Vehicle.update_decision."""
+        ids = ids[(self.decide[ids] >= 0) & (self.radius[ids] <= OUTER_RADIUS)]
+        if ids.size == 0:
+            return
+        angle = self.angle[ids] % (2 * np.pi)
+        self.angle[ids] = angle
+        start = self.entry_angle[ids]
+        end = self.routes.entry_range_end[self.entry_idx[ids], self.exit_idx[ids]]
+        in_range = np.where(start <= end,
+                            (start <= angle) & (angle < end),
+                            (angle >= start) | (angle < end))
+        self.decide[ids] = np.where(in_range, self.entry_idx[ids] + 1, -(self.exit_idx[ids] + 1))
+
+    def find_neighbors(self, ids):
+        """
+        Leader and follower index for every vehicle in ids, matching the
+        selection of the utils.py finders. Entries are NO_VEHICLE when there
+        is none and YIELD where find_leader_in_roundabout yields.
+        """
+        n = ids.size
+        leader = np.full(n, NO_VEHICLE, dtype=np.int64)
+        follower = np.full(n, NO_VEHICLE, dtype=np.int64)
+        angle, radius = self.angle[ids], self.radius[ids]
+        speed, length = self.tangential_speed[ids], self.length[ids]
+        group = self.replica[ids] if self.replications > 1 else None
+
+        outside = radius > OUTER_RADIUS
+        if outside.any():
+            # Only approach-lane and entry-band vehicles can lead an approaching vehicle.
+            cand = np.flatnonzero(radius > OUTER_RADIUS - 5)
+            c_angle, c_radius = angle[cand], radius[cand]
+            ego_outside = outside[cand]
+            span = np.where(ego_outside, np.pi / 18, 0)
+            ego, other = angular_window_pairs(c_angle, c_radius, span, np.where(ego_outside, c_radius - (OUTER_RADIUS - 5), 0),
+                                              group=None if group is None else group[cand])
+            gap = angle_gap(c_angle[ego], c_angle[other])
+            r_ego, r_other = c_radius[ego], c_radius[other]
+            in_lane = (c_angle[ego] == c_angle[other]) & (r_other > OUTER_RADIUS)
+            at_entry = (gap < np.pi / 18) & (OUTER_RADIUS - 5 < r_other) & (r_other < OUTER_RADIUS)
+            keep = ego_outside[ego] & (ego != other) & (r_other < r_ego) & (in_lane | at_entry)
+            ego, other = ego[keep], other[keep]
+            best, _ = _select_min(ego, other, r_ego[keep] - r_other[keep], cand.size)
+            found = best >= 0
+            leader[cand[found]] = ids[cand[best[found]]]
+
+        inside = ~outside
+        if inside.any():
+            with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+                # Leader: ahead within the exit window, 100 m of arc and 5 m radially.
+                angle_to_exit = angle_gap(angle, self.exit_angle[ids])
+                span = np.where(inside, np.minimum(angle_to_exit, arc_window(radius, 5)), 0)
+                ego, other = angular_window_pairs(angle, radius, span, 5, group=group)
+                gap = angle_gap(angle[ego], angle[other])
+                arc = np.minimum(radius[ego], radius[other]) * gap
+                keep = (inside[ego] & (ego != other) & (radius[other] <= OUTER_RADIUS) & (0 < gap) & (gap < angle_to_exit[ego])
+                        & (0 < arc) & (arc <= 100) & (np.abs(radius[ego] - radius[other]) < 5))
+                ego, other, arc = ego[keep], other[keep], arc[keep]
+                key = idm_interaction_deceleration_batch(speed[ego], speed[other], arc - length[ego], radius[ego] - radius[other])
+                best, min_decel = _select_min(ego, other, key, n)
+                found = best >= 0
+                yielding = found & (min_decel > -2) & (angle_to_exit < self.routes.yield_window)
+                leader[found] = ids[best[found]]
+                leader[yielding] = YIELD
+
+                # Follower: behind within half a turn, 100 m of arc and one vehicle length radially.
+                span = np.where(inside, np.minimum(np.pi, arc_window(radius, length)), 0)
+                ego, other = angular_window_pairs(angle, radius, span, length, backward=True, group=group)
+                gap = angle_gap(angle[other], angle[ego])
+                arc = np.minimum(radius[ego], radius[other]) * gap
+                keep = (inside[ego] & (ego != other) & (0 < gap) & (gap < np.pi) & (0 < arc) & (arc <= 100)
+                        & (np.abs(radius[ego] - radius[other]) < length[ego]))
+                ego, other, arc = ego[keep], other[keep], arc[keep]
+                key = idm_interaction_deceleration_batch(speed[other], speed[ego], arc - length[ego], radius[other] - radius[ego])
+                best, _ = _select_min(ego, other, key, n)
+                found = best >= 0
+                follower[found] = ids[best[found]]
+        return leader, follower
+
+    def _approaching(self, ids, leader):
+        """Vectorized Vehicle._handle_approaching."""
+        radius, radial_speed = self.radius[ids].copy(), self.radial_speed[ids].copy()
+        tangential_speed, tangential_acc = self.tangential_speed[ids].copy(), self.tangential_acc[ids].copy()
+        radial_acc = self.radial_acc[ids].copy()
+        entering = self.decide[ids] > 0
+        has_leader = entering & (leader >= 0)
+        free = entering & ~has_leader
+
+        acc = np.zeros(ids.size)
+        v = np.abs(radial_speed)
+        if has_leader.any():
+            lead = leader[has_leader]
+            gap = radius[has_leader] - self.radius[lead] - self.length[ids][has_leader]
+            acc[has_leader] = idm_entry_acceleration_batch(v[has_leader], np.abs(self.radial_speed[lead]), gap)
+        acc[free] = 5 * (1 - np.float_power(v[free] / 20, 4))
+
+        radial_acc[entering] = -acc[entering]
+        tangential_acc[entering] = 0
+        tangential_speed[entering] = 0
+        radial_speed[entering] = np.minimum(0, radial_speed[entering] + radial_acc[entering] * DT)
+        radius[entering] += radial_speed[entering] * DT
+        radius[~entering] = OUTER_RADIUS - self.width[ids][~entering] / 2
+        radial_speed[~entering] = 0
+        return {'radius': radius, 'radial_speed': radial_speed, 'radial_acc': radial_acc,
+                'tangential_speed': tangential_speed, 'tangential_acc': tangential_acc}
+
+    def _exiting(self, ids):
+        """Vectorized Vehicle._handle_exiting (retirement is applied by step)."""
+        radial_acc = np.full(ids.size, 4 / 3)
+        radial_speed = self.radial_speed[ids] + radial_acc * DT
+        radius = self.radius[ids] + radial_speed * DT
+        return {'angle': self.exit_angle[ids], 'radial_acc': radial_acc,
+                'radial_speed': radial_speed, 'radius': radius}
+
+    def _in_roundabout(self, ids, leader, follower):
+        """Vectorized Vehicle._handle_in_roundabout."""
+        radius, angle = self.radius[ids], self.angle[ids]
+        vt, vr = self.tangential_speed[ids], self.radial_speed[ids]
+        width, length = self.width[ids], self.length[ids]
+        entry_angle, exit_angle = self.entry_angle[ids], self.exit_angle[ids]
+
+        proximity_to_inner = (OUTER_RADIUS - radius) / (OUTER_RADIUS - INNER_RADIUS)
+        local_desired_speed = self.desired_speed[ids] + 5 * proximity_to_inner
+        T = TIME_HEADWAY - 0.2 * proximity_to_inner
+        effective_inner, effective_outer = _effective_radius(angle, entry_angle, exit_angle, self.routes)
+        target = self._target_force(ids)
+        boundary = _boundary_force(radius, vt, effective_outer, effective_inner)
+
+        yielding = leader == YIELD
+        following = leader >= 0
+        free = leader == NO_VEHICLE
+        tangential_acc = np.zeros(ids.size)
+        radial_acc = np.zeros(ids.size)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Exit yield
+            if yielding.any():
+                y = yielding
+                gap_to_exit = radius[y] * np.abs(angle_gap(angle[y], (exit_angle[y] + np.pi / 36) % (2 * np.pi)))
+                sy1 = OUTER_RADIUS - radius[y]
+                tangential_acc[y] = idm_exit_approach_batch(vt[y], 0, gap_to_exit, sy1)
+                gap1 = radius[y] * np.abs(angle_gap(angle[y], (exit_angle[y] - np.pi / 36) % (2 * np.pi)))
+                new_radial_speed = vt[y] / gap1 * sy1
+                radial_acc[y] = (new_radial_speed - vr[y]) / DT + target[y] + boundary[y]
+
+            # Free road and following share the free-road/follower terms.
+            tangential_acc[free] = MAX_ACCELERATION * (1 - np.float_power(vt[free] / local_desired_speed[free], 4))
+            if following.any():
+                f = following
+                lead = leader[f]
+                gap = np.minimum(radius[f], self.radius[lead]) * np.abs(angle_gap(angle[f], self.angle[lead])) - length[f]
+                sy = radius[f] - self.radius[lead]
+                tangential_acc[f] = idm_acceleration_batch(vt[f], self.tangential_speed[lead], gap, sy)
+            has_follower = (free | following) & (follower >= 0)
+            if has_follower.any():
+                h = has_follower
+                back = follower[h]
+                gap = np.minimum(radius[h], self.radius[back]) * np.abs(angle_gap(self.angle[back], angle[h])) - length[h]
+                sy = self.radius[back] - radius[h]
+                influence = 0.6 * idm_acceleration_batch(self.tangential_speed[back], vt[h], gap, sy)
+                tangential_acc[h] -= np.maximum(-2, influence)
+
+            gate = tangential_acc >= 0
+            radial_acc[free] = target[free] * gate[free] + boundary[free]
+            if following.any():
+                f = following
+                lead = leader[f]
+                iam = iam_radial_acceleration_batch(tangential_acc[f], 1, 0.6, 0.7, 0.5, length[f], vr[f], radius[f], vt[f],
+                                                    self.radial_speed[lead], self.radius[lead])
+                radial_acc[f] = iam + target[f] * gate[f] + boundary[f]
+
+        # The accelerations acting now are the oldest pending ones (the new ones if there is no lag).
+        pending_t = np.column_stack((self.pending_tangential_acc[ids], tangential_acc))
+        pending_r = np.column_stack((self.pending_radial_acc[ids], radial_acc))
+        state = _kinematics(radius, angle, vt, vr, pending_t[:, 0], pending_r[:, 0], width)
+        radius, angle, vt, vr = state
+        vr = _constrain_movement_angle(angle, vt, vr, exit_angle, self.routes.turn_window)
+
+        # Exit check
+        decide, out = self.decide[ids].copy(), self.out[ids].copy()
+        leaving = (angle_gap(angle, exit_angle) < self.routes.exit_window) & (decide < 0) & (radius > OUTER_RADIUS - 20)
+        angle = np.where(leaving, exit_angle, angle)
+        vr = np.where(leaving, 10.0, vr)
+        radius = np.where(leaving, OUTER_RADIUS + 0.1, radius)
+        vt = np.where(leaving, 0.0, vt)
+        tangential_acc = np.where(leaving, 0.0, tangential_acc)
+        radial_acc = np.where(leaving, 4 / 3, radial_acc)
+        out |= leaving
+        return {'radius': radius, 'angle': angle, 'tangential_speed': vt, 'radial_speed': vr,
+                'tangential_acc': tangential_acc, 'radial_acc': radial_acc, 'T': T, 'out': out,
+                'pending_tangential_acc': pending_t[:, 1:], 'pending_radial_acc': pending_r[:, 1:]}
+
+    def _target_force(self, ids):
+        """Vectorized Vehicle._target_force."""
+        radius, angle = self.radius[ids], self.angle[ids]
+        entry_angle, exit_angle = self.entry_angle[ids], self.exit_angle[ids]
+        length, width, gammar = self.length[ids], self.width[ids], self.gammar[ids]
+        position_x_local = radius * angle_gap(entry_angle, angle)
+        entering = self.decide[ids] > 0
+        route = (self.entry_idx[ids], self.exit_idx[ids])
+
+        target_x_in = np.minimum(INNER_RADIUS + length, radius) * self.routes.d_cita_in[route]
+        target_y = np.where(entering, INNER_RADIUS + length + 3, OUTER_RADIUS - width / 2)
+        target_x = np.where(entering, target_x_in, self.routes.target_x_out[route])
+        gate = np.where(entering, self.routes.gate_in[route], self.routes.gate_out[route])
+        decay = np.where(entering, gammar - 1, gammar)
+        x_weight = np.exp(-decay * (np.abs(position_x_local - target_x) / (target_x + 1e-6)))
+        y_weight = 1 - np.exp(-np.abs(target_y - radius))
+        result = y_weight * np.sign(target_y - radius) * x_weight * gate * 4
+        return np.maximum(-4, np.minimum(4, result))
+
+
+def _select_min(ego, other, key, n):
+    """
+    Per-ego argmin of key over candidate pairs. Ties go to the lowest
+    position, as min() over the active list does. Returns the chosen
+    position (-1 if none) and its key for each of the n egos.
+    """
+    best = np.full(n, -1, dtype=np.int64)
+    best_key = np.full(n, np.inf)
+    if ego.size:
+        order = np.lexsort((other, key, ego))
+        ego, other, key = ego[order], other[order], key[order]
+        first = np.flatnonzero(np.r_[True, ego[1:] != ego[:-1]])
+        best[ego[first]] = other[first]
+        best_key[ego[first]] = key[first]
+    return best, best_key
+
+
+def _effective_radius(angle, entry_angle, exit_angle, routes):
+    """Vectorized Vehicle._calculate_effective_radius."""
+    near_entry = angle_gap(entry_angle, angle) < routes.entry_window
+    near_exit = ~near_entry & (angle_gap(angle, exit_angle) < routes.yield_window)
+    effective_inner = np.where(near_entry, OUTER_RADIUS - 15, np.where(near_exit, OUTER_RADIUS - 10, INNER_RADIUS))
+    effective_outer = np.full(angle.shape, OUTER_RADIUS)
+    return effective_inner, effective_outer
+
+
+def _boundary_force(radius, tangential_speed, width_right, width_left):
+    """Vectorized Vehicle._boundary_force."""
+    sy_right = radius - 5 - (width_right + 3)
+    sy_left = width_left - radius - 5
+    with np.errstate(over='ignore'):
+        alpha_left = np.where(sy_left > 0, np.exp(-sy_left / 0.2), 1 - sy_left / 0.2)
+        alpha_right = np.where(sy_right > 0, np.exp(-sy_right / 0.2), 1 - sy_right / 0.2)
+    acc0 = 6 * (np.minimum(alpha_right, 6) - np.minimum(alpha_left, 6))
+    acc = acc0 * (0.2 + 0.8 * tangential_speed / DESIRED_SPEED)
+    return np.maximum(-6, np.minimum(6, acc))
+
+
+def _kinematics(radius, angle, tangential_speed, radial_speed, tangential_acc, radial_acc, width):
+    """Vectorized Vehicle._update_kinematics, for the accelerations acting after the reaction delay."""
+    _, effective_accel_time = reaction_lag()
+    radial_displacement = radial_speed * DT + 0.5 * radial_acc * (effective_accel_time ** 2)
+    tangential_displacement = tangential_speed * DT + 0.5 * tangential_acc * (effective_accel_time ** 2)
+    next_radius = radius + radial_displacement
+    effective_radius = np.where(next_radius > 0, np.maximum(radius, next_radius), radius)
+    angle = (angle + tangential_displacement / effective_radius) % (2 * np.pi)
+    radius = np.maximum(INNER_RADIUS + width / 2, np.minimum(radius + radial_displacement, OUTER_RADIUS - width / 2))
+    tangential_speed = np.maximum(0, tangential_speed + tangential_acc * effective_accel_time)
+    radial_speed = radial_speed + radial_acc * effective_accel_time
+    return radius, angle, tangential_speed, radial_speed
+
+
+def _constrain_movement_angle(angle, tangential_speed, radial_speed, exit_angle, turn_window):
+    """Vectorized Vehicle._constrain_movement_angle; returns the radial speed."""
+    moving = tangential_speed > 1e-6
+    with np.errstate(divide='ignore', invalid='ignore'):
+        angle_between = np.where(moving, np.arctan(radial_speed / np.where(moving, tangential_speed, 1)),
+                                 np.where(radial_speed > 0, np.pi / 2, -np.pi / 2))
+    max_allowed_angle = np.where(angle_gap(angle, exit_angle) < turn_window, np.deg2rad(75), np.deg2rad(50))
+    clamp = np.abs(angle_between) >= max_allowed_angle
+    return np.where(clamp, np.sign(radial_speed) * (tangential_speed * np.tan(max_allowed_angle)), radial_speed)
\ No newline at end of file
@@ -0,0 +1,172 @@
+# LFR-MPF-Simulation/instrumentation.py
+
+import json
+import sys
+import time
+import tracemalloc
+from .config import *
+from .utils import PolarIndex
+
+# Timer and counter names shared by the sequential and synchronous object
+# loops. The per-phase names are built once here rather than per vehicle.
+PHASES = ('approaching', 'circulating', 'exiting')
+INDEX_TIMER = 'index'
+DECISION_TIMER = 'update_decision'
+MULTIRATE_TIMER = 'multirate'
+NEIGHBOR_TIMERS = {phase: 'neighbors.' + phase for phase in PHASES}
+UPDATE_TIMERS = {phase: 'update.' + phase for phase in PHASES}
+VEHICLE_STEPS = {phase: 'vehicle_steps.' + phase for phase in PHASES}
+YIELD_COUNTER = 'yield_decisions'
+EXIT_COUNTER = 'exits'
+RETIRED_COUNTER = 'retired'
+
+
+class CountingIndex(PolarIndex):
+    """PolarIndex that counts the candidate vehicles its queries hand to the finders."""
+    examined = 0
+
+    def query(self, start_angle, span, min_radius, max_radius):
+        found = super().query(start_angle, span, min_radius, max_radius)
+        self.examined += len(found)
+        return found
+
+    def lane(self, angle):
+        found = super().lane(angle)
+        self.examined += len(found)
+        return found
+
+
+class Progress:
+    """
+    Throttled progress for the simulation loops: the "Simulating time"
+    line is printed for the first step and then at most once every `every`
+    seconds of wall time, instead of once per step. every=None is silent.
+    """
+
+    def __init__(self, every=5.0):
+        self.every = every
+        self._last = None
+
+    def update(self, current_time):
+        if self.every is None:
+            return
+        now = time.perf_counter()
+        if self._last is None or now - self._last >= self.every:
+            self._last = now
+            print(f"Simulating time: {current_time:.1f}s / {TOTAL_TIME}s")
+
+    def finish(self):
+        if self.every is not None:
+            print("Simulation finished.")
+
+
+class Instrumentation:
+    """
+    Opt-in timers and counters for a simulation run.
+
+    Timers accumulate wall time (s) per stage, e.g. 'spawn',
+    'update_decision', 'neighbors.circulating', 'update.approaching' or
+    'recording'; counters accumulate event counts such as
+    'neighbor_candidates', 'yield_decisions', 'exits', 'retired' and
+    'vehicle_steps.<phase>'. With memory=True, tracemalloc tracks the peak
+    allocation of the run. A progress line is written to stream at most
+    every progress_every seconds of wall time (None for no progress).
+    """
+
+    clock = staticmethod(time.perf_counter)
+
+    def __init__(self, progress_every=5.0, memory=False, stream=None):
+        self.progress_every = progress_every
+        self.memory = memory
+        self.stream = stream if stream is not None else sys.stdout
+        self.timers = {}
+        self.counters = {}
+        self.steps = 0
+        self.num_steps = None
+        self.peak_memory = None
+        self.wall_time = None
+        self._started = None
+        self._last_progress = None
+
+    def start(self, num_steps=None):
+        """Marks the start of the run."""
+        self.num_steps = num_steps
+        self._started = self._last_progress = time.perf_counter()
+        if self.memory:
+            tracemalloc.start()
+
+    def add(self, name, seconds):
+        self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def index(self, vehicles):
+        """The spatial index for one step, counting the candidates examined."""
+        return CountingIndex(vehicles)
+
+    def end_step(self, index=None):
+        """Closes one step: collects the index count and writes the progress line when due."""
+        self.steps += 1
+        if index is not None:
+            self.count('neighbor_candidates', index.examined)
+        now = time.perf_counter()
+        if self.progress_every is not None and now - self._last_progress >= self.progress_every:
+            self._last_progress = now
+            self.stream.write(self.progress_line() + '\n')
+            self.stream.flush()
+
+    def progress_line(self):
+        """One-line status: steps done, step rate and the slowest stage so far."""
+        elapsed = time.perf_counter() - self._started
+        total = f"/{self.num_steps}" if self.num_steps else ''
+        rate = self.steps / elapsed if elapsed > 0 else 0.0
+        slowest = max(self.timers, key=self.timers.get) if self.timers else '-'
+        return f"step {self.steps}{total} | {rate:.1f} steps/s | {elapsed:.1f}s elapsed | slowest stage: {slowest}"
+
+    def finish(self):
+        """Marks the end of the run; stops memory tracking."""
+        self.wall_time = time.perf_counter() - self._started
+        if self.memory and tracemalloc.is_tracing():
+            self.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    def summary(self):
+        """The collected numbers as a JSON-serializable dict."""
+        steps = max(self.steps, 1)
+        return {
+            'steps': self.steps,
+            'wall_time': self.wall_time,
+            'timers': dict(sorted(self.timers.items(), key=lambda item: -item[1])),
+            'timers_per_step': {name: seconds / steps for name, seconds in self.timers.items()},
+            'counters': dict(self.counters),
+            'peak_memory_bytes': self.peak_memory,
+        }
+
+    def write_json(self, path):
+        """Writes summary() to path."""
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=1)
+
+
+class NullInstrumentation:
+    """Stand-in for Instrumentation when a run is not instrumented: the plain index and no-op timers and counters."""
+
+    @staticmethod
+    def clock():
+        return 0.0
+
+    def add(self, name, seconds):
+        pass
+
+    def count(self, name, n=1):
+        pass
+
+    def index(self, vehicles):
+        return PolarIndex(vehicles)
+
+    def end_step(self, index=None):
+        pass
+
+
+NO_INSTRUMENTATION = NullInstrumentation()
@@ -1,109 +1,338 @@
-# LFR-MPF-Simulation/main.py
-
-import numpy as np
-import time
-
-# Import from project modules
-from config import *
-from vehicle import Vehicle
-from utils import find_approaching_leader, find_leader_in_roundabout, find_follower_in_roundabout
-from visualization import animate_simulation
-
-def run_simulation():
-    """
-    Initializes and runs the main simulation loop.
-    """
-    # --- Initialization ---
-    vehicles = [
-        Vehicle(
-            idx=i, 
-            entry_angle=0, 
-            exit_angle=0, 
-            entry_idx=-1, 
-            exit_idx=-1
-        ) for i in range(NUM_VEHICLES)
-    ]
-    
-    # Store history for visualization
-    vehicle_positions = {f"Veh[{v.idx}]": {
-        "position_x": v.position_x,
-        "position_y": v.position_y,
-        "tangential_speeds": v.tangential_speeds,
-        "radial_speeds": v.radial_speeds,
-        "exit_idx": [v.exit_idx],
-        "entry_idx": [v.entry_idx],
-    } for v in vehicles}
-
-    num_steps = int(TOTAL_TIME / DT)
-    last_spawn_time = -FLOW_RATE
-    spawned_count = 0
-
-    # --- Main Simulation Loop ---
-    for t_step in range(num_steps):
-        current_time = t_step * DT
-        print(f"Simulating time: {current_time:.1f}s / {TOTAL_TIME}s")
-
-        # --- Spawn New Vehicles ---
-        if current_time - last_spawn_time >= FLOW_RATE and spawned_count < NUM_VEHICLES:
-            paused_vehicles = [v for v in vehicles if v.paused]
-            if paused_vehicles:
-                vehicle_to_spawn = paused_vehicles[0]
-                entry_idx = np.random.randint(0, len(ENTRY_ANGLES))
-                exit_idx = np.random.randint(0, len(EXIT_ANGLES))
-                while entry_idx == exit_idx: # Ensure entry and exit are different
-                    exit_idx = np.random.randint(0, len(EXIT_ANGLES))
-                
-                vehicle_to_spawn.activate(entry_idx, exit_idx)
-                spawned_count += 1
-                last_spawn_time = current_time
-
-        # --- Update Vehicles ---
-        active_vehicles = [v for v in vehicles if not v.paused]
-        
-        for vehicle in active_vehicles:
-            vehicle.update_decision()
-            
-            if vehicle.radius > OUTER_RADIUS:
-                leader = find_approaching_leader(vehicle, active_vehicles)
-                follower = None
-            else:
-                leader = find_leader_in_roundabout(vehicle, active_vehicles)
-                follower = find_follower_in_roundabout(vehicle, active_vehicles)
-            
-            vehicle.update(leader, follower)
-        
-        # --- Update Paused Vehicles (to keep history lists consistent) ---
-        for vehicle in vehicles:
-            if vehicle.paused:
-                if len(vehicle.position_x) < t_step + 2:
-                    vehicle._set_paused()
-
-    print("Simulation finished.")
-
-    # --- Prepare Data for Visualization ---
-    final_vehicle_positions = {}
-    for v in vehicles:
-        final_vehicle_positions[f"Veh[{v.idx}]"] = {
-            "position_x": v.position_x,
-            "position_y": v.position_y,
-            "tangential_speeds": v.tangential_speeds,
-            "radial_speeds": v.radial_speeds,
-            "exit_idx": [v.exit_idx] * len(v.position_x),
-            "entry_idx": [v.entry_idx] * len(v.position_x),
-        }
-
-    return final_vehicle_positions
-
-
-if __name__ == '__main__':
-    # Run the simulation
-    simulation_data = run_simulation()
-    
-    # Animate the results
-    # Note: This requires a graphical backend and is best run in environments like Jupyter
-    try:
-        animate_simulation(simulation_data)
-    except Exception as e:
-        print(f"Could not run animation, likely due to missing graphical backend.")
-        print(f"Error: {e}")
+# LFR-MPF-Simulation/main.py
+
+import copy
+import numpy as np
+import time
+
+# Import from project modules
+from .config import *
+from .vehicle import Vehicle, VehiclePool
+from .fleet import Fleet
+from .checkpoint import Checkpoint, load_checkpoint
+from .instrumentation import (Progress, NO_INSTRUMENTATION, INDEX_TIMER, DECISION_TIMER, MULTIRATE_TIMER,
+                              NEIGHBOR_TIMERS, UPDATE_TIMERS, VEHICLE_STEPS, YIELD_COUNTER, EXIT_COUNTER,
+                              RETIRED_COUNTER)
+from .trajectory import TrajectoryRecorder, TrajectoryWriter, run_header
+from .utils import find_approaching_leader, find_leader_in_roundabout, find_follower_in_roundabout
+
+def _draw_route(rng):
+    """
+    Draws a random (entry_idx, exit_idx) pair: in proportion to
+    ROUTE_WEIGHTS if set, else uniformly with distinct indices.
+    """
+    if ROUTE_WEIGHTS is not None:
+        weights = np.asarray(ROUTE_WEIGHTS, dtype=float)
+        route = rng.choice(weights.size, p=weights.ravel() / weights.sum())
+        return divmod(int(route), weights.shape[1])
+    entry_idx = rng.integers(0, len(ENTRY_ANGLES))
+    exit_idx = rng.integers(0, len(EXIT_ANGLES))
+    while entry_idx == exit_idx: # Ensure entry and exit are different
+        exit_idx = rng.integers(0, len(EXIT_ANGLES))
+    return entry_idx, exit_idx
+
+def _make_recorder(num_steps, seed, out, chunk_steps, quantize=False, record=True):
+    """In-memory recorder, a chunked on-disk writer when out is a directory, or None if not recording."""
+    if not record:
+        return None
+    if out is None:
+        return TrajectoryRecorder(NUM_VEHICLES, num_steps + 1, quantize=quantize)
+    return TrajectoryWriter(out, NUM_VEHICLES, num_steps + 1, chunk_steps, header=run_header(seed), quantize=quantize)
+
+def _step_vehicles(pool, multirate=None, instruments=None):
+    """
+    Updates the active vehicles of a VehiclePool for one step, sequentially
+    in id order. Returns the vehicles still active afterwards.
+    If an instrumentation.Instrumentation is given, every stage is timed and
+    counted with it; otherwise its timers and counters are no-ops.
+    """
+    if instruments is None:
+        instruments = NO_INSTRUMENTATION
+    clock, add, count = instruments.clock, instruments.add, instruments.count
+    active_vehicles = pool.active_vehicles()
+    started = clock()
+    index = instruments.index(active_vehicles)
+    add(INDEX_TIMER, clock() - started)
+
+    for vehicle in active_vehicles:
+        was_out = vehicle.out
+        started = clock()
+        vehicle.update_decision()
+        pool.update_phase(vehicle)
+        add(DECISION_TIMER, clock() - started)
+
+        # Exiting vehicles ignore their neighbours, so they are not searched for.
+        phase = pool.phase(vehicle)
+        count(VEHICLE_STEPS[phase])
+        if multirate is not None:
+            started = clock()
+            coasted = multirate.step(vehicle, phase, index)
+            add(MULTIRATE_TIMER, clock() - started)
+            if coasted:
+                index.relocate(vehicle)
+                pool.update_phase(vehicle)
+                continue
+        started = clock()
+        if phase == 'approaching':
+            leader = find_approaching_leader(vehicle, active_vehicles, index)
+            follower = None
+        elif phase == 'circulating':
+            leader = find_leader_in_roundabout(vehicle, active_vehicles, index)
+            follower = find_follower_in_roundabout(vehicle, active_vehicles, index)
+            if leader == Vehicle.YIELD_FLAG:
+                count(YIELD_COUNTER)
+        else:
+            leader = follower = None
+        searched = clock()
+        add(NEIGHBOR_TIMERS[phase], searched - started)
+
+        vehicle.update(leader, follower)
+        index.relocate(vehicle)
+        pool.update_phase(vehicle)
+        add(UPDATE_TIMERS[phase], clock() - searched)
+        if vehicle.out and not was_out:
+            count(EXIT_COUNTER)
+        if vehicle.paused:
+            count(RETIRED_COUNTER)
+    instruments.end_step(index)
+    return pool.active_vehicles()
+
+def _step_vehicles_synchronous(pool, multirate=None, instruments=None):
+    """
+    Updates the active vehicles of a VehiclePool for one step from a frozen
+    snapshot: every decision, neighbour search and coasting check reads the
+    state of step t, and all vehicles are committed to step t+1 together,
+    as in the Fleet engine, so the result does not depend on the id order.
+    Returns the vehicles still active afterwards. Instrumentation records
+    the same timers and counters as _step_vehicles.
+    """
+    if instruments is None:
+        instruments = NO_INSTRUMENTATION
+    clock, add, count = instruments.clock, instruments.add, instruments.count
+    active_vehicles = pool.active_vehicles()
+    started = clock()
+    for vehicle in active_vehicles:
+        vehicle.update_decision()
+        pool.update_phase(vehicle)
+    decided = clock()
+    add(DECISION_TIMER, decided - started)
+
+    # Read buffer: copies of the decided step-t state. Updates only write to the live vehicles.
+    snapshot = [copy.copy(vehicle) for vehicle in active_vehicles]
+    index = instruments.index(snapshot)
+    add(INDEX_TIMER, clock() - decided)
+
+    plans = []
+    for vehicle, frozen in zip(active_vehicles, snapshot):
+        phase = pool.phase(vehicle)
+        count(VEHICLE_STEPS[phase])
+        if multirate is not None:
+            started = clock()
+            coasted = multirate.step(vehicle, phase, index)
+            add(MULTIRATE_TIMER, clock() - started)
+            if coasted:
+                plans.append((phase, None))
+                continue
+        started = clock()
+        if phase == 'approaching':
+            neighbours = (find_approaching_leader(frozen, snapshot, index), None)
+        elif phase == 'circulating':
+            neighbours = (find_leader_in_roundabout(frozen, snapshot, index),
+                          find_follower_in_roundabout(frozen, snapshot, index))
+            if neighbours[0] == Vehicle.YIELD_FLAG:
+                count(YIELD_COUNTER)
+        else:
+            neighbours = (None, None)
+        add(NEIGHBOR_TIMERS[phase], clock() - started)
+        plans.append((phase, neighbours))
+
+    for vehicle, (phase, neighbours) in zip(active_vehicles, plans):
+        was_out = vehicle.out
+        if neighbours is not None:
+            started = clock()
+            vehicle.update(*neighbours)
+            pool.update_phase(vehicle)
+            add(UPDATE_TIMERS[phase], clock() - started)
+        else:
+            pool.update_phase(vehicle)
+        if vehicle.out and not was_out:
+            count(EXIT_COUNTER)
+        if vehicle.paused:
+            count(RETIRED_COUNTER)
+    instruments.end_step(index)
+    return pool.active_vehicles()
+
+def run_simulation(seed=None, out=None, chunk_steps=256, monitor=None, multirate=None, instruments=None,
+                   checkpoints=None, resume=None, stream=None, quantize=False, synchronous=False,
+                   metrics=None, record=True, progress_every=5.0):
+    """
+    Initializes and runs the main simulation loop.
+    Returns the per-step vehicle states: a TrajectoryRecorder, or, when out
+    names a directory, a StoredTrajectory streamed there in chunks of
+    chunk_steps steps so memory stays bounded on long runs. quantize stores
+    the state as int32 (see TrajectoryRecorder).
+    If a safety.SafetyMonitor is given, every step is screened with it.
+    If a multirate.MultiRateStepper is given, quiescent vehicles coast
+    through macro steps instead of the fine update.
+    If an instrumentation.Instrumentation is given, the stages of every
+    step are timed and counted, and its progress line replaces the
+    "Simulating time" one.
+    checkpoints maps simulation times (s) to paths; a checkpoint.Checkpoint
+    of the full state is saved there when the run reaches each time. resume
+    (a Checkpoint or its path) continues a checkpointed run up to
+    TOTAL_TIME instead of starting empty; row 0 of the trajectory is then
+    the checkpointed state. Config values are not restored with it (see
+    checkpoint.apply_checkpoint_config).
+    If a streaming.StateServer is given, every step is published to its clients.
+    If a metrics.MetricsAccumulator is given, every step is accumulated
+    into it; with record=False no trajectory is kept and None is returned,
+    so memory stays constant however long the run.
+    Vehicles are updated sequentially in id order, each seeing the ones
+    before it already moved; synchronous=True instead updates them all
+    from a snapshot of the step (see _step_vehicles_synchronous).
+    Progress is printed at most every progress_every seconds (None: never).
+    """
+    step_vehicles = _step_vehicles_synchronous if synchronous else _step_vehicles
+    progress = Progress(progress_every if instruments is None else None)
+    total_steps = int(TOTAL_TIME / DT)
+
+    # --- Initialization ---
+    if resume is None:
+        if seed is None:
+            seed = np.random.SeedSequence().entropy
+        rng = np.random.default_rng(seed)
+        pool = VehiclePool(NUM_VEHICLES)
+        start_step = 0
+        last_spawn_time = -FLOW_RATE
+        spawned_count = 0
+    else:
+        if not isinstance(resume, Checkpoint):
+            resume = load_checkpoint(resume)
+        seed, rng, pool = resume.state['seed'], resume.rng(), resume.pool(NUM_VEHICLES)
+        start_step = round(resume.time / DT)
+        last_spawn_time = resume.state['last_spawn_time']
+        spawned_count = resume.state['spawned_count']
+        if multirate is not None:
+            resume.restore_multirate(multirate)
+    checkpoint_steps = {round(time / DT): path for time, path in (checkpoints or {}).items()}
+
+    num_steps = max(total_steps - start_step, 0)
+
+    # Store history for visualization (row 0 is the initial state, empty unless resumed)
+    trajectory = _make_recorder(num_steps, seed, out, chunk_steps, quantize, record)
+    if trajectory is not None:
+        trajectory.record_vehicles(pool.active_vehicles())
+    if instruments is not None:
+        instruments.start(num_steps)
+
+    # --- Main Simulation Loop ---
+    for t_step in range(start_step, total_steps + 1):
+        if t_step in checkpoint_steps:
+            Checkpoint.capture(pool, rng, t_step, last_spawn_time, spawned_count, seed, multirate).save(checkpoint_steps[t_step])
+        if t_step == total_steps:
+            break
+        current_time = t_step * DT
+        progress.update(current_time)
+        if instruments is not None:
+            started = time.perf_counter()
+
+        # --- Spawn New Vehicles ---
+        if current_time - last_spawn_time >= FLOW_RATE and spawned_count < NUM_VEHICLES:
+            if pool.free:
+                entry_idx, exit_idx = _draw_route(rng)
+                pool.spawn(entry_idx, exit_idx)
+                spawned_count += 1
+                last_spawn_time = current_time
+        if instruments is not None:
+            instruments.add('spawn', time.perf_counter() - started)
+
+        # --- Update Vehicles ---
+        moving_vehicles = step_vehicles(pool, multirate, instruments)
+
+        # --- Record State (paused vehicles are masked out) ---
+        if instruments is not None:
+            started = time.perf_counter()
+        if trajectory is not None:
+            trajectory.record_vehicles(moving_vehicles)
+        if instruments is not None:
+            recorded = time.perf_counter()
+            instruments.add('recording', recorded - started)
+            started = recorded
+        if monitor is not None:
+            monitor.observe_vehicles(moving_vehicles)
+            if instruments is not None:
+                instruments.add('safety', time.perf_counter() - started)
+        if metrics is not None:
+            metrics.observe_vehicles(moving_vehicles)
+        if stream is not None:
+            stream.publish_vehicles(moving_vehicles)
+
+    progress.finish()
+    if instruments is not None:
+        instruments.finish()
+
+    return trajectory.close() if trajectory is not None else None
+
+
+def run_fleet_simulation(seed=None, out=None, chunk_steps=256, monitor=None, backend=None, stream=None, quantize=False,
+                         metrics=None, record=True, progress_every=5.0):
+    """
+    Runs the simulation on the structure-of-arrays Fleet engine.
+    Spawning matches run_simulation; all vehicles are advanced together
+    each step and the result is returned as for run_simulation.
+    backend selects the Fleet step implementation (see backend.select_backend).
+    If a streaming.StateServer is given, every step is published to its clients.
+    metrics, record and progress_every are as for run_simulation.
+    """
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    rng = np.random.default_rng(seed)
+    fleet = Fleet(NUM_VEHICLES, backend)
+    num_steps = int(TOTAL_TIME / DT)
+    last_spawn_time = -FLOW_RATE
+    spawned_count = 0
+    progress = Progress(progress_every)
+
+    trajectory = _make_recorder(num_steps, seed, out, chunk_steps, quantize, record)
+    if trajectory is not None:
+        trajectory.record_fleet(fleet)
+    for t_step in range(num_steps):
+        current_time = t_step * DT
+        progress.update(current_time)
+
+        # --- Spawn New Vehicles ---
+        if current_time - last_spawn_time >= FLOW_RATE and spawned_count < NUM_VEHICLES:
+            if fleet.paused.any():
+                entry_idx, exit_idx = _draw_route(rng)
+                fleet.activate(np.argmax(fleet.paused), entry_idx, exit_idx)
+                spawned_count += 1
+                last_spawn_time = current_time
+
+        # --- Update Vehicles ---
+        fleet.step()
+        if trajectory is not None:
+            trajectory.record_fleet(fleet)
+        if monitor is not None:
+            monitor.observe_fleet(fleet)
+        if metrics is not None:
+            metrics.observe_fleet(fleet)
+        if stream is not None:
+            stream.publish_fleet(fleet)
+
+    progress.finish()
+
+    return trajectory.close() if trajectory is not None else None
+
+
+if __name__ == '__main__':
+    # Run the simulation
+    simulation_data = run_simulation()
+    
+    # Animate the results
+    # Note: This requires a graphical backend and is best run in environments like Jupyter
+    try:
+        from .visualization import animate_simulation
+        animate_simulation(simulation_data)
+    except Exception as e:
+        print(f"Could not run animation, likely due to missing graphical backend.")
+        print(f"Error: {e}")
         print("Simulation data generation is complete.")
\ No newline at end of file
@@ -0,0 +1,204 @@
+# LFR-MPF-Simulation/metrics.py
+
+import numpy as np
+from .config import *
+
+INACTIVE, APPROACHING, CIRCULATING, EXITED = 0, 1, 2, 3
+
+
+class MetricsAccumulator:
+    """
+    Macroscopic statistics of a run, fed one step at a time from the
+    simulation loop, so nothing grows with the run length or the number
+    of trips and the trajectory need not be recorded (see record in
+    main.run_simulation).
+
+    Per vehicle slot it keeps only the stage of the current trip, the step
+    it started and its yielding steps. Per route, as (num_entries,
+    num_exits) arrays: completed trips with the count, sum, sum of squares,
+    min and max of their travel time (s, from activation to crossing the
+    exit line)
+    and a histogram of it in travel_time_bin bins up to max_travel_time
+    (longer trips fall in the last bin), and the total time yielded at the
+    exit (s). Per entry: arrivals (activations), entries into the ring and
+    the queue, counted as approaching vehicles slower than queue_speed,
+    summed over steps and at its maximum. Per exit: exits (exit-line
+    crossings).
+    Per angular sector of the ring: vehicle-steps and summed speed, for
+    the mean occupancy and space-mean speed.
+    """
+
+    def __init__(self, num_vehicles=None, sectors=12, travel_time_bin=1.0, max_travel_time=300.0, queue_speed=1.0):
+        num_vehicles = NUM_VEHICLES if num_vehicles is None else num_vehicles
+        routes = (len(ENTRY_ANGLES), len(EXIT_ANGLES))
+        self.sectors = sectors
+        self.travel_time_bin = travel_time_bin
+        self.queue_speed = queue_speed
+        self.num_steps = 0
+
+        self.stage = np.zeros(num_vehicles, dtype=np.int8)
+        self.start_step = np.zeros(num_vehicles, dtype=np.int64)
+        self.yield_steps = np.zeros(num_vehicles, dtype=np.int64)
+        self.entry_idx = np.full(num_vehicles, -1, dtype=np.int64)
+        self.exit_idx = np.full(num_vehicles, -1, dtype=np.int64)
+
+        self.trips = np.zeros(routes, dtype=np.int64)
+        self.travel_time_sum = np.zeros(routes)
+        self.travel_time_sq = np.zeros(routes)
+        self.travel_time_min = np.full(routes, np.inf)
+        self.travel_time_max = np.zeros(routes)
+        self.travel_time_hist = np.zeros(routes + (int(np.ceil(max_travel_time / travel_time_bin)),), dtype=np.int64)
+        self.yield_time = np.zeros(routes)
+
+        self.arrivals = np.zeros(routes[0], dtype=np.int64)
+        self.entries = np.zeros(routes[0], dtype=np.int64)
+        self.queue_sum = np.zeros(routes[0], dtype=np.int64)
+        self.queue_max = np.zeros(routes[0], dtype=np.int64)
+        self.exits = np.zeros(routes[1], dtype=np.int64)
+
+        self.occupancy = np.zeros(sectors, dtype=np.int64)
+        self.speed_sum = np.zeros(sectors)
+
+    def observe(self, ids, radius, angle, tangential_speed, radial_speed, entry_idx, exit_idx, out, yielding):
+        """Accumulates one step of active vehicle states (equal-length arrays, ids the vehicle slots)."""
+        self.num_steps += 1
+        step = self.num_steps
+        ids = np.asarray(ids, dtype=np.int64)
+        radius, out = np.asarray(radius, dtype=float), np.asarray(out, dtype=bool)
+
+        # Slots retired since the last step are free for the next trip.
+        active = np.zeros(self.stage.size, dtype=bool)
+        active[ids] = True
+        self.stage[(self.stage != INACTIVE) & ~active] = INACTIVE
+
+        started = ids[self.stage[ids] == INACTIVE]
+        if started.size:
+            self.stage[started] = APPROACHING
+            self.start_step[started] = step
+            self.yield_steps[started] = 0
+        self.entry_idx[ids] = entry_idx
+        self.exit_idx[ids] = exit_idx
+        np.add.at(self.arrivals, self.entry_idx[started], 1)
+
+        approaching = radius >= OUTER_RADIUS
+        in_ring = ~approaching & ~out
+        entered = ids[in_ring & (self.stage[ids] == APPROACHING)]
+        self.stage[entered] = CIRCULATING
+        np.add.at(self.entries, self.entry_idx[entered], 1)
+        self.yield_steps[ids[np.asarray(yielding, dtype=bool)]] += 1
+
+        # Trips are completed when the vehicle first crosses its exit line (becomes out).
+        exited = ids[out & (self.stage[ids] != EXITED)]
+        if exited.size:
+            route = (self.entry_idx[exited], self.exit_idx[exited])
+            travel_time = (step - self.start_step[exited]) * DT
+            np.add.at(self.trips, route, 1)
+            np.add.at(self.travel_time_sum, route, travel_time)
+            np.add.at(self.travel_time_sq, route, travel_time ** 2)
+            np.minimum.at(self.travel_time_min, route, travel_time)
+            np.maximum.at(self.travel_time_max, route, travel_time)
+            bins = np.minimum((travel_time / self.travel_time_bin).astype(np.int64), self.travel_time_hist.shape[2] - 1)
+            np.add.at(self.travel_time_hist, route + (bins,), 1)
+            np.add.at(self.yield_time, route, self.yield_steps[exited] * DT)
+            np.add.at(self.exits, self.exit_idx[exited], 1)
+            self.stage[exited] = EXITED
+
+        queued = approaching & ~out & (np.abs(radial_speed) < self.queue_speed)
+        queue = np.bincount(self.entry_idx[ids[queued]], minlength=self.queue_sum.size)
+        self.queue_sum += queue
+        np.maximum(self.queue_max, queue, out=self.queue_max)
+
+        sector = (np.asarray(angle)[in_ring] % (2 * np.pi) * (self.sectors / (2 * np.pi))).astype(np.int64)
+        sector = np.minimum(sector, self.sectors - 1)
+        speed = np.hypot(np.asarray(tangential_speed)[in_ring], np.asarray(radial_speed)[in_ring])
+        self.occupancy += np.bincount(sector, minlength=self.sectors)
+        self.speed_sum += np.bincount(sector, weights=speed, minlength=self.sectors)
+
+    def observe_vehicles(self, vehicles):
+        """Accumulates one step from a list of active vehicle.Vehicle objects."""
+        state = np.array([(v.radius, v.angle, v.tangential_speed, v.radial_speed) for v in vehicles], dtype=float).reshape(-1, 4)
+        ints = np.array([(v.idx, v.entry_idx, v.exit_idx, v.out, v.yielding) for v in vehicles], dtype=np.int64).reshape(-1, 5)
+        ids, entry_idx, exit_idx, out, yielding = ints.T
+        self.observe(ids, *state.T, entry_idx, exit_idx, out.astype(bool), yielding.astype(bool))
+
+    def observe_fleet(self, fleet):
+        """Accumulates one step from the active vehicles of a fleet.Fleet."""
+        ids = fleet.active_indices()
+        self.observe(ids, fleet.radius[ids], fleet.angle[ids], fleet.tangential_speed[ids], fleet.radial_speed[ids],
+                     fleet.entry_idx[ids], fleet.exit_idx[ids], fleet.out[ids], fleet.yielding[ids])
+
+    def travel_time_quantile(self, q, entry_idx=None, exit_idx=None):
+        """
+        Quantile q of the travel time (s) from the histogram, over all
+        routes or the given entry and/or exit; resolved to the bin width.
+        """
+        hist = self.travel_time_hist
+        hist = hist if entry_idx is None else hist[entry_idx:entry_idx + 1]
+        hist = hist if exit_idx is None else hist[:, exit_idx:exit_idx + 1]
+        counts = hist.reshape(-1, hist.shape[-1]).sum(axis=0)
+        if counts.sum() == 0:
+            return float('nan')
+        cumulative = np.cumsum(counts)
+        b = int(np.searchsorted(cumulative, q * cumulative[-1]))
+        if counts[b] == 0:
+            # q = 0 with empty leading bins: the lower edge of the first non-empty one.
+            return float(np.argmax(counts > 0) * self.travel_time_bin)
+        before = cumulative[b - 1] if b else 0
+        fraction = (q * cumulative[-1] - before) / counts[b]
+        return float((b + fraction) * self.travel_time_bin)
+
+    def totals(self):
+        """Run-wide aggregates (same names as sweep.summarize where they mean the same)."""
+        trips = int(self.trips.sum())
+        duration = self.num_steps * DT
+        ring_steps = int(self.occupancy.sum())
+        return {
+            'spawned': int(self.arrivals.sum()),
+            'trips': trips,
+            'throughput': trips / duration * 3600 if duration else 0.0,
+            'mean_travel_time': float(self.travel_time_sum.sum() / trips) if trips else float('nan'),
+            'median_travel_time': self.travel_time_quantile(0.5),
+            'p95_travel_time': self.travel_time_quantile(0.95),
+            'mean_yield_time': float(self.yield_time.sum() / trips) if trips else float('nan'),
+            'mean_ring_occupancy': ring_steps / self.num_steps if self.num_steps else 0.0,
+            'space_mean_speed': float(self.speed_sum.sum() / ring_steps) if ring_steps else float('nan'),
+            'mean_queue': float(self.queue_sum.sum() / self.num_steps) if self.num_steps else 0.0,
+            'max_queue': int(self.queue_max.max()),
+        }
+
+    def by_route(self):
+        """Per-route travel-time statistics as a list of dicts, for routes with at least one completed trip."""
+        rows = []
+        for entry_idx, exit_idx in zip(*np.nonzero(self.trips)):
+            n = self.trips[entry_idx, exit_idx]
+            mean = self.travel_time_sum[entry_idx, exit_idx] / n
+            rows.append({
+                'entry_idx': int(entry_idx), 'exit_idx': int(exit_idx), 'trips': int(n),
+                'mean_travel_time': float(mean),
+                'std_travel_time': float(np.sqrt(max(self.travel_time_sq[entry_idx, exit_idx] / n - mean ** 2, 0.0))),
+                'min_travel_time': float(self.travel_time_min[entry_idx, exit_idx]),
+                'max_travel_time': float(self.travel_time_max[entry_idx, exit_idx]),
+                'median_travel_time': self.travel_time_quantile(0.5, entry_idx, exit_idx),
+                'mean_yield_time': float(self.yield_time[entry_idx, exit_idx] / n),
+            })
+        return rows
+
+    def by_entry(self):
+        """Arrivals, ring entries and queue length per entry, as a list of dicts."""
+        steps = max(self.num_steps, 1)
+        return [{'entry_idx': i, 'arrivals': int(self.arrivals[i]), 'entries': int(self.entries[i]),
+                 'mean_queue': float(self.queue_sum[i] / steps), 'max_queue': int(self.queue_max[i])}
+                for i in range(self.arrivals.size)]
+
+    def by_exit(self):
+        """Completed trips per exit, as a list of dicts."""
+        return [{'exit_idx': i, 'exits': int(self.exits[i])} for i in range(self.exits.size)]
+
+    def by_sector(self):
+        """Mean occupancy (vehicles) and space-mean speed (m/s) per angular sector of the ring."""
+        width = 2 * np.pi / self.sectors
+        steps = max(self.num_steps, 1)
+        return [{'sector': s, 'start_angle': s * width,
+                 'mean_occupancy': float(self.occupancy[s] / steps),
+                 'space_mean_speed': float(self.speed_sum[s] / self.occupancy[s]) if self.occupancy[s] else float('nan')}
+                for s in range(self.sectors)]
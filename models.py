@@ -1,55 +1,118 @@
-# LFR-MPF-Simulation/models.py
-
-import numpy as np
-from .config import *
-
-def idm_acceleration(v, v_lead, gap, sy):
-    """IDM calculation for tangential acceleration with lateral influence."""
-    alphalongfun = min(1, np.exp(-(abs(sy) - 4.846) / 0.6))
-    delta_v = v - v_lead
-    s_star = MIN_SAFE_DISTANCE + max(0, TIME_HEADWAY * v + v * delta_v / (2 * np.sqrt(MAX_ACCELERATION * COMFORTABLE_DECELERATION)))
-    interaction_term = -alphalongfun * MAX_ACCELERATION * (s_star / gap) ** 2
-    acc = MAX_ACCELERATION * (1 - (v / DESIRED_SPEED) ** 4) + np.maximum(-12, interaction_term)
-    return acc
-
-def idm_exit_approach(v, v_lead, gap, sy):
-    """Variant of IDM for a vehicle approaching its exit."""
-    alphalongfun = min(1, np.exp(-(abs(sy) - 2) / 0.6))
-    delta_v = v - v_lead
-    s_star = max(0, TIME_HEADWAY * v + v * delta_v / (2 * np.sqrt(MAX_ACCELERATION * COMFORTABLE_DECELERATION)))
-    interaction_term = -alphalongfun * MAX_ACCELERATION * (s_star / gap) ** 2
-    acc = MAX_ACCELERATION * (1 - (v / DESIRED_SPEED) ** 4) + np.maximum(-4, interaction_term)
-    if v < 1:
-        acc = 0.1
-    return acc
-
-def idm_entry_acceleration(v, v_lead, gap):
-    """A simplified IDM for vehicles entering the roundabout."""
-    delta_v = v - v_lead
-    s_star = 1 + max(0, 0.5 * v + v * delta_v / (4 * np.sqrt(3 * COMFORTABLE_DECELERATION)))
-    interaction_term = -3 * (s_star / gap) ** 2
-    acc = 5 * (1 - (v / 15) ** 4) + np.maximum(-18, interaction_term)
-    return acc
-
-def idm_interaction_deceleration(v, v_lead, gap, sy):
-    """Calculates only the deceleration interaction term of the IDM."""
-    alphalongfun = min(1, np.exp(-(abs(sy) - 4.846) / 0.6))
-    delta_v = v - v_lead
-    s_star = MIN_SAFE_DISTANCE + max(0, TIME_HEADWAY * v + v * delta_v / (2 * np.sqrt(MAX_ACCELERATION * COMFORTABLE_DECELERATION)))
-    acc = -(MAX_ACCELERATION * (s_star / gap) ** 2) * alphalongfun
-    return acc
-
-def iam_radial_acceleration(a, A, B, C, D, ego_vehicle, front_vehicle):
-    """IAM calculation for radial acceleration."""
-    Wveh, Wl = ego_vehicle['width'], front_vehicle['width']
-    vy, vy1 = ego_vehicle['speed_y'], front_vehicle['speed_y']
-    dy = front_vehicle['position_y'] - ego_vehicle['position_y']
-    sign_dy = np.sign(dy)
-    Wavg = ego_vehicle['width']
-    overlap = abs(dy) < Wavg
-
-    alpha = sign_dy * (abs(dy) / Wavg if overlap else np.exp(-(abs(dy) - Wavg) / B))
-    v0LatInt = A * alpha * (a - MAX_ACCELERATION * (1 - (ego_vehicle['speed_x'] / DESIRED_SPEED) ** 4))
-    mult_dv_factor = 1 if overlap else max(0.0, 1.0 - C * sign_dy * (vy1 - vy))
-    accLatInt = (v0LatInt) / D * mult_dv_factor
-    return max(-2, min(2, accLatInt - vy / D))
\ No newline at end of file
+# LFR-MPF-Simulation/models.py
+
+import math
+import numpy as np
+from .config import *
+
+
+def reaction_lag():
+    """
+    REACTION_DELAY in time steps, as (steps, seconds): an acceleration
+    computed at step t acts at step t + steps, for the given seconds of
+    that step (the part of it after the delay).
+    """
+    steps = math.floor(REACTION_DELAY / DT + 1e-9)
+    return steps, max(0.0, DT - (REACTION_DELAY - steps * DT))
+
+
+def idm_acceleration(v, v_lead, gap, sy):
+    """IDM calculation for tangential acceleration with lateral influence."""
+    alphalongfun = min(1, np.exp(-(abs(sy) - 4.846) / 0.6))
+    delta_v = v - v_lead
+    s_star = MIN_SAFE_DISTANCE + max(0, TIME_HEADWAY * v + v * delta_v / (2 * np.sqrt(MAX_ACCELERATION * COMFORTABLE_DECELERATION)))
+    interaction_term = -alphalongfun * MAX_ACCELERATION * (s_star / gap) ** 2
+    acc = MAX_ACCELERATION * (1 - (v / DESIRED_SPEED) ** 4) + np.maximum(-12, interaction_term)
+    return acc
+
+def idm_exit_approach(v, v_lead, gap, sy):
+    """Variant of IDM for a vehicle approaching its exit."""
+    alphalongfun = min(1, np.exp(-(abs(sy) - 2) / 0.6))
+    delta_v = v - v_lead
+    s_star = max(0, TIME_HEADWAY * v + v * delta_v / (2 * np.sqrt(MAX_ACCELERATION * COMFORTABLE_DECELERATION)))
+    interaction_term = -alphalongfun * MAX_ACCELERATION * (s_star / gap) ** 2
+    acc = MAX_ACCELERATION * (1 - (v / DESIRED_SPEED) ** 4) + np.maximum(-4, interaction_term)
+    if v < 1:
+        acc = 0.1
+    return acc
+
+def idm_entry_acceleration(v, v_lead, gap):
+    """A simplified IDM for vehicles entering the roundabout."""
+    delta_v = v - v_lead
+    s_star = 1 + max(0, 0.5 * v + v * delta_v / (4 * np.sqrt(3 * COMFORTABLE_DECELERATION)))
+    interaction_term = -3 * (s_star / gap) ** 2
+    acc = 5 * (1 - (v / 15) ** 4) + np.maximum(-18, interaction_term)
+    return acc
+
+def idm_interaction_deceleration(v, v_lead, gap, sy):
+    """Calculates only the deceleration interaction term of the IDM."""
+    alphalongfun = min(1, np.exp(-(abs(sy) - 4.846) / 0.6))
+    delta_v = v - v_lead
+    s_star = MIN_SAFE_DISTANCE + max(0, TIME_HEADWAY * v + v * delta_v / (2 * np.sqrt(MAX_ACCELERATION * COMFORTABLE_DECELERATION)))
+    acc = -(MAX_ACCELERATION * (s_star / gap) ** 2) * alphalongfun
+    return acc
+
+def iam_radial_acceleration(a, A, B, C, D, ego_vehicle, front_vehicle):
+    """IAM calculation for radial acceleration."""
+    Wveh, Wl = ego_vehicle['width'], front_vehicle['width']
+    vy, vy1 = ego_vehicle['speed_y'], front_vehicle['speed_y']
+    dy = front_vehicle['position_y'] - ego_vehicle['position_y']
+    sign_dy = np.sign(dy)
+    Wavg = ego_vehicle['width']
+    overlap = abs(dy) < Wavg
+
+    alpha = sign_dy * (abs(dy) / Wavg if overlap else np.exp(-(abs(dy) - Wavg) / B))
+    v0LatInt = A * alpha * (a - MAX_ACCELERATION * (1 - (ego_vehicle['speed_x'] / DESIRED_SPEED) ** 4))
+    mult_dv_factor = 1 if overlap else max(0.0, 1.0 - C * sign_dy * (vy1 - vy))
+    accLatInt = (v0LatInt) / D * mult_dv_factor
+    return max(-2, min(2, accLatInt - vy / D))
+
+# --- Batched kernels ---
+# Array-in/array-out counterparts of the functions above. Branches become
+# masks, and powers go through np.float_power (libm pow, like Python's **)
+# so the results match the scalar versions bit for bit.
+
+def idm_acceleration_batch(v, v_lead, gap, sy):
+    """Elementwise idm_acceleration."""
+    alphalongfun = np.minimum(1, np.exp(-(np.abs(sy) - 4.846) / 0.6))
+    delta_v = v - v_lead
+    s_star = MIN_SAFE_DISTANCE + np.maximum(0, TIME_HEADWAY * v + v * delta_v / (2 * np.sqrt(MAX_ACCELERATION * COMFORTABLE_DECELERATION)))
+    interaction_term = -alphalongfun * MAX_ACCELERATION * np.float_power(s_star / gap, 2)
+    return MAX_ACCELERATION * (1 - np.float_power(v / DESIRED_SPEED, 4)) + np.maximum(-12, interaction_term)
+
+def idm_exit_approach_batch(v, v_lead, gap, sy):
+    """Elementwise idm_exit_approach."""
+    alphalongfun = np.minimum(1, np.exp(-(np.abs(sy) - 2) / 0.6))
+    delta_v = v - v_lead
+    s_star = np.maximum(0, TIME_HEADWAY * v + v * delta_v / (2 * np.sqrt(MAX_ACCELERATION * COMFORTABLE_DECELERATION)))
+    interaction_term = -alphalongfun * MAX_ACCELERATION * np.float_power(s_star / gap, 2)
+    acc = MAX_ACCELERATION * (1 - np.float_power(v / DESIRED_SPEED, 4)) + np.maximum(-4, interaction_term)
+    return np.where(v < 1, 0.1, acc)
+
+def idm_entry_acceleration_batch(v, v_lead, gap):
+    """Elementwise idm_entry_acceleration."""
+    delta_v = v - v_lead
+    s_star = 1 + np.maximum(0, 0.5 * v + v * delta_v / (4 * np.sqrt(3 * COMFORTABLE_DECELERATION)))
+    interaction_term = -3 * np.float_power(s_star / gap, 2)
+    return 5 * (1 - np.float_power(v / 15, 4)) + np.maximum(-18, interaction_term)
+
+def idm_interaction_deceleration_batch(v, v_lead, gap, sy):
+    """Elementwise idm_interaction_deceleration."""
+    alphalongfun = np.minimum(1, np.exp(-(np.abs(sy) - 4.846) / 0.6))
+    delta_v = v - v_lead
+    s_star = MIN_SAFE_DISTANCE + np.maximum(0, TIME_HEADWAY * v + v * delta_v / (2 * np.sqrt(MAX_ACCELERATION * COMFORTABLE_DECELERATION)))
+    return -(MAX_ACCELERATION * np.float_power(s_star / gap, 2)) * alphalongfun
+
+def iam_radial_acceleration_batch(a, A, B, C, D, ego_width, ego_speed_y, ego_position_y, ego_speed_x, front_speed_y, front_position_y):
+    """
+    Elementwise iam_radial_acceleration. The ego/front dicts of the scalar
+    version are passed as separate arrays (the front width is unused there).
+    """
+    dy = front_position_y - ego_position_y
+    sign_dy = np.sign(dy)
+    overlap = np.abs(dy) < ego_width
+    with np.errstate(over='ignore'):
+        alpha = sign_dy * np.where(overlap, np.abs(dy) / ego_width, np.exp(-(np.abs(dy) - ego_width) / B))
+    v0LatInt = A * alpha * (a - MAX_ACCELERATION * (1 - np.float_power(ego_speed_x / DESIRED_SPEED, 4)))
+    mult_dv_factor = np.where(overlap, 1, np.maximum(0.0, 1.0 - C * sign_dy * (front_speed_y - ego_speed_y)))
+    accLatInt = v0LatInt / D * mult_dv_factor
+    return np.maximum(-2, np.minimum(2, accLatInt - ego_speed_y / D))
\ No newline at end of file
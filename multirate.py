@@ -0,0 +1,100 @@
+# LFR-MPF-Simulation/multirate.py
+
+import numpy as np
+from .config import *
+
+
+class MultiRateStepper:
+    """
+    Multi-rate stepping for run_simulation.
+
+    A vehicle with no interaction partner within `horizon` metres coasts:
+    its simple 1-D motion is advanced to the end of a macro step of
+    macro_steps steps at once and the steps in between are filled in by
+    linear interpolation, without neighbour searches or the per-vehicle
+    update. Two motions coast:
+    - approaching alone on its ramp: the free-road ramp recurrence,
+      stopping short of OUTER_RADIUS;
+    - exiting (Vehicle._handle_exiting): the constant-acceleration
+      recurrence in closed form, while it stays inside OUTER_RADIUS.
+    Coasting ends, and the vehicle rejoins the fine DT update from its
+    interpolated state, as soon as a partner comes within range.
+    """
+
+    def __init__(self, macro_steps=5, horizon=50.0):
+        self.macro_steps = macro_steps
+        self.horizon = horizon
+        self.coasting = {}
+        self.coasted_steps = 0
+
+    def step(self, vehicle, phase, index):
+        """
+        Advances a vehicle by one step if it coasts (phase is its
+        vehicle.VehiclePool phase, index the step's utils.PolarIndex).
+        Returns False when it needs the fine update instead.
+        """
+        plan = self.coasting.get(vehicle.idx)
+        if not self._quiescent(vehicle, phase, index):
+            self.coasting.pop(vehicle.idx, None)
+            return False
+        if plan is None:
+            plan = self._plan(vehicle, phase)
+            if plan is None:
+                return False
+            self.coasting[vehicle.idx] = plan
+
+        plan['step'] += 1
+        fraction = plan['step'] / self.macro_steps
+        (r0, v0), (r1, v1) = plan['start'], plan['end']
+        vehicle.radius = r0 + fraction * (r1 - r0)
+        vehicle.radial_speed = v0 + fraction * (v1 - v0)
+        vehicle.radial_acc = plan['radial_acc']
+        vehicle.yielding = False
+        if phase == 'approaching':
+            vehicle.tangential_speed = 0
+            vehicle.tangential_acc = 0
+        else:
+            vehicle.angle = vehicle.exit_angle
+        if plan['step'] == self.macro_steps:
+            del self.coasting[vehicle.idx]
+        self.coasted_steps += 1
+        return True
+
+    def _quiescent(self, vehicle, phase, index):
+        """True if no other vehicle can interact with this one within the horizon."""
+        if phase == 'approaching':
+            # Only same-lane vehicles see an approaching vehicle, and it sees the entry band ahead.
+            if any(other.idx != vehicle.idx for other in index.lane(vehicle.angle)):
+                return False
+            span = self.horizon / OUTER_RADIUS
+            nearby = index.query(vehicle.angle - span, np.pi / 18 + 2 * span, INNER_RADIUS, OUTER_RADIUS)
+            return not any(other.radius <= OUTER_RADIUS for other in nearby)
+        if phase == 'exiting' and vehicle.out and vehicle.radius < OUTER_RADIUS:
+            inner = max(vehicle.radius - self.horizon, 1.0)
+            span = min(np.pi, self.horizon / inner)
+            nearby = index.query(vehicle.angle - span, 2 * span, vehicle.radius - self.horizon, vehicle.radius + self.horizon)
+            x, y = vehicle.radius * np.cos(vehicle.angle), vehicle.radius * np.sin(vehicle.angle)
+            return not any(other.idx != vehicle.idx and
+                           np.hypot(other.radius * np.cos(other.angle) - x, other.radius * np.sin(other.angle) - y) < self.horizon
+                           for other in nearby)
+        return False
+
+    def _plan(self, vehicle, phase):
+        """Start and end (radius, radial_speed) of a macro step, or None if the vehicle would leave its phase."""
+        k, r0, v0 = self.macro_steps, vehicle.radius, vehicle.radial_speed
+        if phase == 'approaching':
+            # The free-road ramp recurrence has no closed form; run it without the rest of the update.
+            r1, v1 = r0, v0
+            for _ in range(k):
+                radial_acc = -5 * (1 - (abs(v1) / 20) ** 4)
+                v1 = min(0, v1 + radial_acc * DT)
+                r1 += v1 * DT
+            if r1 <= OUTER_RADIUS + vehicle.length:
+                return None
+        else:
+            radial_acc = 4 / 3
+            v1 = v0 + k * radial_acc * DT
+            r1 = r0 + k * DT * v0 + radial_acc * DT ** 2 * k * (k + 1) / 2
+            if r1 >= OUTER_RADIUS:
+                return None
+        return {'start': (r0, v0), 'end': (r1, v1), 'radial_acc': radial_acc, 'step': 0}
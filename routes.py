@@ -0,0 +1,67 @@
+# LFR-MPF-Simulation/routes.py
+
+import math
+from collections import namedtuple
+import numpy as np
+from .config import *
+
+# Per-route constants for one (entry_idx, exit_idx) pair, as plain floats.
+Route = namedtuple('Route', [
+    'entry_angle', 'exit_angle', 'gap_to_exit', 'split_angle', 'entry_range_end', 'd_cita_in',
+    'target_x_out', 'gate_in', 'gate_out', 'entry_window', 'yield_window', 'turn_window', 'exit_window',
+])
+
+
+class RouteTable:
+    """
+    Geometry and route constants of one roundabout, built once from the
+    entry/exit angles and radii.
+
+    Route-dependent values are (num_entries, num_exits) arrays indexed by
+    [entry_idx, exit_idx]:
+    gap_to_exit (angle from entry to exit), split_angle (end of the entry
+    phase, relative to the entry), entry_range_end (its absolute angle),
+    d_cita_in (entry-phase target angle), target_x_out (exit-phase target
+    arc length) and gate_in/gate_out (the target-force half-turn gates).
+    The angular windows used by the decision logic are scalars:
+    entry_window (near the entry), yield_window (yield/exit-lane zone),
+    turn_window (sharper turns allowed) and exit_window (exit point).
+    """
+
+    def __init__(self, entry_angles, exit_angles, outer_radius, inner_radius):
+        self.outer_radius = outer_radius
+        self.inner_radius = inner_radius
+        self.entry_angles = np.array(entry_angles, dtype=float)
+        self.exit_angles = np.array(exit_angles, dtype=float)
+        entry, exit_ = self.entry_angles[:, None], self.exit_angles[None, :]
+        self.gap_to_exit = (exit_ - entry + 2 * np.pi) % (2 * np.pi)
+        self.split_angle = np.where(self.gap_to_exit > np.pi / 2, self.gap_to_exit / 2, np.pi / 2)
+        self.entry_range_end = (entry + self.split_angle) % (2 * np.pi)
+        self.d_cita_in = (self.entry_range_end - entry + 2 * np.pi) % (2 * np.pi)
+        self.target_x_out = outer_radius * self.gap_to_exit
+        self.gate_in = np.where(self.d_cita_in <= np.pi, 1, 0)
+        self.gate_out = np.where(self.gap_to_exit <= np.pi, 1, 0)
+        self.entry_window = math.asin(10 / outer_radius)
+        self.yield_window = math.asin(30 / outer_radius)
+        self.turn_window = math.asin(20 / outer_radius)
+        self.exit_window = math.asin(5 / outer_radius)
+
+    def route(self, entry_idx, exit_idx):
+        """The constants of one route as a Route of plain floats."""
+        k = (entry_idx, exit_idx)
+        return Route(
+            float(self.entry_angles[entry_idx]), float(self.exit_angles[exit_idx]),
+            float(self.gap_to_exit[k]), float(self.split_angle[k]), float(self.entry_range_end[k]),
+            float(self.d_cita_in[k]), float(self.target_x_out[k]), int(self.gate_in[k]), int(self.gate_out[k]),
+            self.entry_window, self.yield_window, self.turn_window, self.exit_window,
+        )
+
+
+_tables = {}
+
+def route_table():
+    """The RouteTable of the current configuration, built on first use."""
+    key = (tuple(ENTRY_ANGLES), tuple(EXIT_ANGLES), OUTER_RADIUS, INNER_RADIUS)
+    if key not in _tables:
+        _tables[key] = RouteTable(ENTRY_ANGLES, EXIT_ANGLES, OUTER_RADIUS, INNER_RADIUS)
+    return _tables[key]
@@ -0,0 +1,141 @@
+# LFR-MPF-Simulation/safety.py
+
+import numpy as np
+from .config import *
+from .ACT import TTC_np, CurrentD_np
+from .trajectory import polar_to_cartesian
+from .utils import angular_window_pairs
+
+
+class SafetyMonitor:
+    """
+    Online safety screening, fed one step at a time from the simulation loop.
+
+    Each step only vehicles that are close in (angle, radius) are paired up,
+    and a pair is kept if the gap between their bounding circles could close
+    within `horizon` seconds at their current relative speed, and is at most
+    max_range metres. The surviving pairs go through ACT.TTC_np and
+    ACT.CurrentD_np in one batch. With the default 40 m, a pair further
+    apart would have to close at over 26 m/s to reach a TTC below the
+    default ttc_threshold of 1.5 s.
+
+    Aggregates are kept per route, as (num_entries, num_exits) arrays, and a
+    pair counts towards the routes of both of its vehicles:
+    min_ttc (s, pairs that are not overlapping), ttc_events (pair-steps with
+    0 <= TTC < ttc_threshold), overlap_events (pair-steps with overlapping
+    bounding boxes) and pairs_checked (pair-steps evaluated by ACT).
+    """
+
+    def __init__(self, ttc_threshold=1.5, horizon=5.0, max_range=40.0):
+        self.ttc_threshold = ttc_threshold
+        self.horizon = horizon
+        self.max_range = max_range
+        shape = (len(ENTRY_ANGLES), len(EXIT_ANGLES))
+        self.min_ttc = np.full(shape, np.inf)
+        self.ttc_events = np.zeros(shape, dtype=np.int64)
+        self.overlap_events = np.zeros(shape, dtype=np.int64)
+        self.pairs_checked = np.zeros(shape, dtype=np.int64)
+        self.num_steps = 0
+
+    def window_pairs(self, radius, angle, tangential_speed, radial_speed, circle):
+        """
+        Positions (a, b), a < b, of the pairs close enough in (angle, radius)
+        that their bounding circles (radii circle) could be candidates.
+        """
+        # No pair closes faster than its two fastest vehicles together.
+        closing = 2 * np.hypot(tangential_speed, radial_speed).max() * self.horizon
+        reach = 2 * circle.max() + min(closing, self.max_range)
+        # Any point theta <= pi/2 round from one at radius r is at least r sin(theta)
+        # from it, and one further round at least r, so partners are within asin(reach / r).
+        with np.errstate(divide='ignore'):
+            span = np.where(reach < radius, np.arcsin(np.minimum(reach / radius, 1.0)), 2 * np.pi)
+        a, b = angular_window_pairs(angle, radius, span, reach)
+        a, b = np.minimum(a, b), np.maximum(a, b)
+        keep = a != b
+        return np.unique(np.stack((a[keep], b[keep])), axis=1)
+
+    def candidate_pairs(self, radius, angle, tangential_speed, radial_speed, length, width):
+        """
+        Broad phase: positions (a, b), a < b, of the pairs whose bounding
+        circles are within max_range and could close within the horizon.
+        """
+        circle = np.hypot(length, width) / 2
+        a, b = self.window_pairs(radius, angle, tangential_speed, radial_speed, circle)
+        x, y, vx, vy, _, _ = polar_to_cartesian(radius, angle, tangential_speed, radial_speed)
+        gap = np.hypot(x[a] - x[b], y[a] - y[b]) - circle[a] - circle[b]
+        closing = np.hypot(vx[a] - vx[b], vy[a] - vy[b]) * self.horizon
+        near = gap <= np.minimum(closing, self.max_range)
+        return a[near], b[near]
+
+    def observe(self, radius, angle, tangential_speed, radial_speed, entry_idx, exit_idx,
+                length=None, width=None):
+        """
+        Screens one step of active vehicle states (equal-length arrays).
+        length and width default to the current VEHICLE_LENGTH and VEHICLE_WIDTH.
+        """
+        self.num_steps += 1
+        n = len(radius)
+        if n < 2:
+            return
+        length = VEHICLE_LENGTH if length is None else length
+        width = VEHICLE_WIDTH if width is None else width
+        length = np.broadcast_to(np.asarray(length, dtype=float), (n,))
+        width = np.broadcast_to(np.asarray(width, dtype=float), (n,))
+        a, b = self.candidate_pairs(radius, angle, tangential_speed, radial_speed, length, width)
+        if a.size == 0:
+            return
+
+        x, y, vx, vy, hx, hy = polar_to_cartesian(radius, angle, tangential_speed, radial_speed)
+        samples = {}
+        for suffix, ids in (('_i', a), ('_j', b)):
+            for name, values in zip(('x', 'y', 'vx', 'vy', 'hx', 'hy', 'length', 'width'),
+                                    (x, y, vx, vy, hx, hy, length, width)):
+                samples[name + suffix] = values[ids]
+        with np.errstate(all='ignore'):
+            ttc = TTC_np(samples)
+            overlap = (CurrentD_np(samples) <= 0) | (ttc < 0)
+        alert = (ttc >= 0) & (ttc < self.ttc_threshold) & ~overlap
+        clear_ttc = np.where(overlap | np.isnan(ttc), np.inf, ttc)
+
+        for ids in (a, b):
+            route = (np.asarray(entry_idx)[ids], np.asarray(exit_idx)[ids])
+            np.minimum.at(self.min_ttc, route, clear_ttc)
+            np.add.at(self.ttc_events, route, alert)
+            np.add.at(self.overlap_events, route, overlap)
+            np.add.at(self.pairs_checked, route, 1)
+
+    def observe_vehicles(self, vehicles):
+        """Screens one step from a list of active vehicle.Vehicle objects."""
+        state = np.array([(v.radius, v.angle, v.tangential_speed, v.radial_speed, v.length, v.width)
+                          for v in vehicles], dtype=float).reshape(-1, 6)
+        routes = np.array([(v.entry_idx, v.exit_idx) for v in vehicles], dtype=np.int64).reshape(-1, 2)
+        radius, angle, vt, vr, length, width = state.T
+        self.observe(radius, angle, vt, vr, *routes.T, length=length, width=width)
+
+    def observe_fleet(self, fleet):
+        """Screens one step from the active vehicles of a fleet.Fleet."""
+        ids = fleet.active_indices()
+        self.observe(fleet.radius[ids], fleet.angle[ids], fleet.tangential_speed[ids], fleet.radial_speed[ids],
+                     fleet.entry_idx[ids], fleet.exit_idx[ids], length=fleet.length[ids], width=fleet.width[ids])
+
+    def totals(self):
+        """Run-wide aggregates; each pair is counted once, not once per route."""
+        return {
+            'monitor_min_ttc': float(self.min_ttc.min()),
+            'ttc_events': int(self.ttc_events.sum() // 2),
+            'overlap_events': int(self.overlap_events.sum() // 2),
+            'pairs_checked': int(self.pairs_checked.sum() // 2),
+        }
+
+    def by_route(self):
+        """Per-route aggregates as a list of dicts, for routes with at least one checked pair."""
+        rows = []
+        for entry_idx, exit_idx in zip(*np.nonzero(self.pairs_checked)):
+            rows.append({
+                'entry_idx': int(entry_idx), 'exit_idx': int(exit_idx),
+                'min_ttc': float(self.min_ttc[entry_idx, exit_idx]),
+                'ttc_events': int(self.ttc_events[entry_idx, exit_idx]),
+                'overlap_events': int(self.overlap_events[entry_idx, exit_idx]),
+                'pairs_checked': int(self.pairs_checked[entry_idx, exit_idx]),
+            })
+        return rows
@@ -0,0 +1,331 @@
+# LFR-MPF-Simulation/streaming.py
+
+import asyncio
+import base64
+import hashlib
+import socket
+import struct
+import threading
+import numpy as np
+from .config import *
+from .trajectory import polar_to_cartesian
+
+# Raw TCP clients open with this magic; connections starting with "GET " are WebSocket upgrades.
+MAGIC = b'LFRS'
+KEY_FRAME, DELTA_FRAME = 0, 1
+# kind, step, simulation time, record count, removed count
+FRAME_HEADER = struct.Struct('<BIdII')
+_WEBSOCKET_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+_BINARY, _CLOSE, _PING, _PONG = 0x2, 0x8, 0x9, 0xA
+# Clients only send control frames (at most 125 bytes); anything much larger is not ours.
+_MAX_CLIENT_PAYLOAD = 1 << 16
+
+
+def vehicle_state(ids, radius, angle, tangential_speed, radial_speed):
+    """Sorted uint32 ids and an (n, 4) float32 array of x, y, heading (rad) and speed per vehicle."""
+    x, y, vx, vy, hx, hy = polar_to_cartesian(radius, angle, tangential_speed, radial_speed)
+    values = np.column_stack([x, y, np.arctan2(hy, hx), np.hypot(vx, vy)]).astype(np.float32)
+    order = np.argsort(ids, kind='stable')
+    return np.asarray(ids, dtype=np.uint32)[order], values[order]
+
+
+def encode_key_frame(step, time, ids, values):
+    """Key frame: header, ids (uint32), then x, y, heading and speed columns (float32)."""
+    return b''.join([FRAME_HEADER.pack(KEY_FRAME, step, time, ids.size, 0), ids.tobytes(), values.T.tobytes()])
+
+
+def encode_delta_frame(step, time, ids, values, last_ids, last_values):
+    """
+    Delta frame against the state (last_ids, last_values) the receiver
+    holds: removed ids, then the ids whose values changed or are new with
+    the float32 difference to add (new vehicles count from zero). Returns
+    the frame and the receiver's state after applying it, computed with
+    the same float32 arithmetic so sender and receiver never drift apart.
+    """
+    removed = np.setdiff1d(last_ids, ids, assume_unique=True)
+    base = np.zeros_like(values)
+    position = np.searchsorted(last_ids, ids)
+    known = position < last_ids.size
+    known[known] = last_ids[position[known]] == ids[known]
+    base[known] = last_values[position[known]]
+    delta = values - base
+    changed = (delta != 0).any(axis=1) | ~known
+    frame = b''.join([FRAME_HEADER.pack(DELTA_FRAME, step, time, int(changed.sum()), removed.size),
+                      removed.tobytes(), ids[changed].tobytes(), delta[changed].T.tobytes()])
+    return frame, (ids, base + delta)
+
+
+class FrameDecoder:
+    """Client side: applies key and delta frames to the current state."""
+
+    def __init__(self):
+        self.step, self.time = None, None
+        self.ids = np.zeros(0, dtype=np.uint32)
+        self.values = np.zeros((0, 4), dtype=np.float32)
+
+    def apply(self, payload):
+        """Applies one frame; returns (step, time, ids, values) of the new state."""
+        kind, step, time, n, n_removed = FRAME_HEADER.unpack_from(payload)
+        data = memoryview(payload)[FRAME_HEADER.size:]
+        removed = np.frombuffer(data, np.uint32, n_removed)
+        ids = np.frombuffer(data, np.uint32, n, 4 * n_removed)
+        columns = np.frombuffer(data, np.float32, 4 * n, 4 * (n_removed + n)).reshape(4, n).T
+        if kind == KEY_FRAME:
+            self.ids, self.values = ids.copy(), columns.copy()
+        else:
+            keep = ~np.isin(self.ids, removed)
+            current_ids, current = self.ids[keep], self.values[keep]
+            new = ~np.isin(ids, current_ids)
+            all_ids = np.concatenate([current_ids, ids[new]])
+            values = np.concatenate([current, np.zeros((new.sum(), 4), dtype=np.float32)])
+            order = np.argsort(all_ids, kind='stable')
+            all_ids, values = all_ids[order], values[order]
+            values[np.searchsorted(all_ids, ids)] += columns
+            self.ids, self.values = all_ids, values
+        self.step, self.time = step, time
+        return step, time, self.ids, self.values
+
+
+class _Client:
+    """One connection: the latest unsent state, and the state the receiver holds."""
+
+    def __init__(self, writer, websocket):
+        self.writer = writer
+        self.websocket = websocket
+        self.tasks = ()
+        self.pending = None
+        self.ready = asyncio.Event()
+        self.last = None
+        self.since_key = 0
+        self.sent = 0
+        self.dropped = 0
+
+
+class StateServer:
+    """
+    Streams the per-step vehicle state of a run to TCP and WebSocket clients
+    as binary frames: a key frame with id, x, y, heading and speed (float32)
+    per vehicle, then delta frames against what the client last received,
+    with a key frame every keyframe_every frames.
+
+    The server runs its own asyncio loop in a background thread; publishing
+    from the simulation only hands over the latest state. Each client holds
+    at most one unsent state, so a slow client skips frames (counted in
+    stats()) instead of buffering them or blocking the simulation.
+
+    Raw TCP clients send MAGIC first and receive frames prefixed with their
+    uint32 length; WebSocket clients receive one binary message per frame,
+    get a pong for each ping and a close reply to their close.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, keyframe_every=100, write_buffer=1 << 16):
+        self.host, self.port = host, port
+        self.keyframe_every = keyframe_every
+        self.write_buffer = write_buffer
+        self.step = 0
+        self._clients = set()
+        self._loop = None
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """Starts serving; returns the (host, port) it listens on."""
+        started = threading.Event()
+
+        def serve():
+            self._loop = asyncio.new_event_loop()
+            self._server = self._loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+            self.port = self._server.sockets[0].getsockname()[1]
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=serve, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.host, self.port
+
+    def close(self):
+        """Disconnects every client and stops the server thread."""
+        if self._loop is None:
+            return
+
+        async def shutdown():
+            self._server.close()
+            clients = list(self._clients)
+            for client in clients:
+                # abort() rather than close(): a stalled client would never take the buffered frames.
+                client.writer.transport.abort()
+            await asyncio.gather(*(task for client in clients for task in client.tasks), return_exceptions=True)
+            await self._server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def stats(self):
+        """Frames sent and dropped per connected client."""
+        return [{'peer': client.writer.get_extra_info('peername'), 'sent': client.sent, 'dropped': client.dropped}
+                for client in list(self._clients)]
+
+    def publish(self, ids, radius, angle, tangential_speed, radial_speed):
+        """Publishes the state after the next simulation step."""
+        self.step += 1
+        if not self._clients:
+            return
+        ids, values = vehicle_state(ids, radius, angle, tangential_speed, radial_speed)
+        self._loop.call_soon_threadsafe(self._offer, (self.step, self.step * DT, ids, values))
+
+    def publish_vehicles(self, vehicles):
+        """publish() from a list of active vehicle.Vehicle objects."""
+        state = np.array([(v.idx, v.radius, v.angle, v.tangential_speed, v.radial_speed) for v in vehicles], dtype=float).reshape(-1, 5)
+        self.publish(state[:, 0].astype(np.int64), *state[:, 1:].T)
+
+    def publish_fleet(self, fleet):
+        """publish() from the active vehicles of a fleet.Fleet."""
+        ids = fleet.active_indices()
+        self.publish(ids, fleet.radius[ids], fleet.angle[ids], fleet.tangential_speed[ids], fleet.radial_speed[ids])
+
+    def _offer(self, state):
+        for client in self._clients:
+            if client.pending is not None:
+                client.dropped += 1
+            client.pending = state
+            client.ready.set()
+
+    def _encode(self, client, state):
+        step, time, ids, values = state
+        if client.last is None or client.since_key >= self.keyframe_every:
+            client.since_key = 0
+            client.last = (ids, values)
+            return encode_key_frame(step, time, ids, values)
+        client.since_key += 1
+        frame, client.last = encode_delta_frame(step, time, ids, values, *client.last)
+        return frame
+
+    async def _handle(self, reader, writer):
+        try:
+            opening = await reader.readexactly(4)
+            if opening == b'GET ':
+                request = await reader.readuntil(b'\r\n\r\n')
+                websocket = True
+                writer.write(_websocket_handshake(request))
+            elif opening == MAGIC:
+                websocket = False
+            else:
+                writer.close()
+                return
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            writer.close()
+            return
+        writer.transport.set_write_buffer_limits(high=self.write_buffer)
+        client = _Client(writer, websocket)
+        self._clients.add(client)
+        sender = asyncio.ensure_future(self._send(client))
+        client.tasks = (asyncio.current_task(), sender)
+        try:
+            if websocket:
+                await self._receive_websocket(client, reader, sender)
+            else:
+                # Raw TCP clients send nothing more; reading only detects the disconnect.
+                while await reader.read(4096):
+                    pass
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._clients.discard(client)
+            sender.cancel()
+            writer.close()
+
+    async def _receive_websocket(self, client, reader, sender):
+        """Answers pings with pongs and a close with a close, until the client closes or disconnects."""
+        while True:
+            opcode, payload = await _read_websocket_frame(reader)
+            if opcode == _PING:
+                client.writer.write(_websocket_frame(payload, _PONG))
+            elif opcode == _CLOSE:
+                # No data frame may follow the close reply: stop the sender first.
+                self._clients.discard(client)
+                sender.cancel()
+                client.writer.write(_websocket_frame(payload[:2], _CLOSE))
+                await client.writer.drain()
+                return
+
+    async def _send(self, client):
+        try:
+            while True:
+                await client.ready.wait()
+                client.ready.clear()
+                state, client.pending = client.pending, None
+                frame = self._encode(client, state)
+                client.writer.write(_websocket_frame(frame) if client.websocket else struct.pack('<I', len(frame)) + frame)
+                await client.writer.drain()
+                client.sent += 1
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+
+def _websocket_handshake(request):
+    for line in request.decode('latin-1').split('\r\n'):
+        name, _, value = line.partition(':')
+        if name.strip().lower() == 'sec-websocket-key':
+            accept = base64.b64encode(hashlib.sha1(value.strip().encode() + _WEBSOCKET_GUID).digest())
+            return (b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                    b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n')
+    raise ValueError("missing Sec-WebSocket-Key")
+
+
+def _websocket_frame(payload, opcode=_BINARY):
+    """An unmasked, final WebSocket frame (server to client), binary unless opcode says otherwise."""
+    n = len(payload)
+    if n < 126:
+        header = struct.pack('!BB', 0x80 | opcode, n)
+    elif n < 1 << 16:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, n)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, n)
+    return header + payload
+
+
+async def _read_websocket_frame(reader):
+    """Reads one client frame; returns its opcode and unmasked payload (fragments are not reassembled)."""
+    first, second = await reader.readexactly(2)
+    n = second & 0x7F
+    if n == 126:
+        n, = struct.unpack('!H', await reader.readexactly(2))
+    elif n == 127:
+        n, = struct.unpack('!Q', await reader.readexactly(8))
+    if n > _MAX_CLIENT_PAYLOAD:
+        raise ValueError(f"client frame of {n} bytes")
+    mask = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(n)
+    if mask is not None:
+        payload = (np.frombuffer(payload, np.uint8) ^ np.resize(np.frombuffer(mask, np.uint8), n)).tobytes()
+    return first & 0x0F, payload
+
+
+def read_frames(host='127.0.0.1', port=None, max_frames=None, timeout=10.0):
+    """
+    Test client: connects over raw TCP and yields (step, time, ids, values)
+    for every frame received, with the deltas applied.
+    """
+    decoder = FrameDecoder()
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.sendall(MAGIC)
+        stream = sock.makefile('rb')
+        received = 0
+        while max_frames is None or received < max_frames:
+            prefix = stream.read(4)
+            if len(prefix) < 4:
+                return
+            payload = stream.read(struct.unpack('<I', prefix)[0])
+            received += 1
+            yield decoder.apply(payload)
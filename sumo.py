@@ -0,0 +1,241 @@
+# LFR-MPF-Simulation/sumo.py
+
+import hashlib
+import os
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+import numpy as np
+
+# Bump when the parsed geometry changes, so stale cache files are not reused.
+CACHE_VERSION = 1
+DEFAULT_LANE_WIDTH = 3.2  # SUMO's default lane width (m)
+
+# Roundabout geometry derived from a SUMO network. Angles are radians in
+# [0, 2*pi), counterclockwise around the centre and sorted, with the edge
+# ids in the same order; feeds maps every non-ring edge id that leads into
+# (out of) the ring along an unbranched chain to its entry (exit) index.
+Network = namedtuple('Network', [
+    'center', 'inner_radius', 'outer_radius', 'entry_angles', 'exit_angles',
+    'entry_edges', 'exit_edges', 'ring_edges', 'entry_feeds', 'exit_feeds',
+])
+
+# Demand from SUMO <flow> elements: od[entry_idx, exit_idx] in veh/h, and
+# the ids of flows whose edges do not lead into or out of the roundabout.
+Demand = namedtuple('Demand', ['od', 'unmatched'])
+
+
+def _points(shape):
+    return np.array([[float(c) for c in point.split(',')[:2]] for point in shape.split()])
+
+
+def _parse_network_file(path):
+    """Stream-parses the junctions, non-internal edges and roundabouts of a .net.xml."""
+    junctions, edges, roundabouts = {}, {}, []
+    for _, elem in ET.iterparse(path, events=('end',)):
+        if elem.tag == 'junction':
+            if elem.get('type') != 'internal':
+                junctions[elem.get('id')] = (float(elem.get('x')), float(elem.get('y')))
+            elem.clear()
+        elif elem.tag == 'edge':
+            if elem.get('function') is None:
+                lanes = elem.findall('lane')
+                shape = elem.get('shape') or (lanes[len(lanes) // 2].get('shape') if lanes else None)
+                edges[elem.get('id')] = {
+                    'from': elem.get('from'), 'to': elem.get('to'), 'shape': shape,
+                    'width': sum(float(lane.get('width', DEFAULT_LANE_WIDTH)) for lane in lanes),
+                }
+            elem.clear()
+        elif elem.tag == 'roundabout':
+            roundabouts.append((elem.get('nodes').split(), elem.get('edges').split()))
+    return junctions, edges, roundabouts
+
+
+def _edge_points(edge, junctions):
+    if edge['shape']:
+        return _points(edge['shape'])
+    return np.array([junctions[edge['from']], junctions[edge['to']]])
+
+
+def _fit_circle(points):
+    """Least-squares circle through points: (centre, radius)."""
+    x, y = points[:, 0], points[:, 1]
+    A = np.column_stack([2 * x, 2 * y, np.ones_like(x)])
+    (cx, cy, c), *_ = np.linalg.lstsq(A, x ** 2 + y ** 2, rcond=None)
+    return np.array([cx, cy]), float(np.sqrt(c + cx ** 2 + cy ** 2))
+
+
+def _feeds(start_edges, edges, ring_nodes, forward):
+    """
+    For every non-ring edge, the start edge its unbranched chain reaches
+    (following traffic if forward, against it otherwise), or None.
+    """
+    step_key, end_key = ('to', 'from') if forward else ('from', 'to')
+    by_end = {}
+    for edge_id, edge in edges.items():
+        by_end.setdefault(edge[end_key], []).append(edge_id)
+    feeds = {}
+    for edge_id in edges:
+        seen, current = set(), edge_id
+        while current not in start_edges and current not in seen:
+            seen.add(current)
+            node = edges[current][step_key]
+            nxt = [other for other in by_end.get(node, ()) if other not in seen]
+            if node in ring_nodes or len(nxt) != 1:
+                current = None
+                break
+            current = nxt[0]
+        if current in start_edges:
+            feeds[edge_id] = current
+    return feeds
+
+
+def parse_network(path, roundabout=0):
+    """
+    Derives the geometry of one roundabout of a SUMO .net.xml (the
+    roundabout-th <roundabout> element): centre and radii from a circle fit
+    to the ring edges, widened by the ring's lane widths, and the angles
+    where the approach (departure) edges meet the ring.
+    """
+    junctions, edges, roundabouts = _parse_network_file(path)
+    if len(roundabouts) <= roundabout:
+        raise ValueError(f"{path}: no <roundabout> element #{roundabout} (found {len(roundabouts)})")
+    ring_nodes, ring_edges = set(roundabouts[roundabout][0]), roundabouts[roundabout][1]
+    ring_points = np.concatenate([_edge_points(edges[e], junctions) for e in ring_edges])
+    center, radius = _fit_circle(ring_points)
+    width = max(edges[e]['width'] for e in ring_edges)
+
+    # SUMO rings run counterclockwise in right-hand networks; mirror clockwise ones.
+    turn = 0.0
+    for e in ring_edges:
+        a, b = _edge_points(edges[e], junctions)[[0, -1]] - center
+        turn += a[0] * b[1] - a[1] * b[0]
+    mirror = -1 if turn < 0 else 1
+
+    def angle(point):
+        dx, dy = point - center
+        return float(np.arctan2(mirror * dy, dx) % (2 * np.pi))
+
+    ring = set(ring_edges)
+    entries = sorted((angle(_edge_points(edge, junctions)[-1]), edge_id) for edge_id, edge in edges.items()
+                     if edge_id not in ring and edge['to'] in ring_nodes)
+    exits = sorted((angle(_edge_points(edge, junctions)[0]), edge_id) for edge_id, edge in edges.items()
+                   if edge_id not in ring and edge['from'] in ring_nodes)
+    outside = {edge_id: edge for edge_id, edge in edges.items() if edge_id not in ring}
+    entry_index = {edge_id: i for i, (_, edge_id) in enumerate(entries)}
+    exit_index = {edge_id: i for i, (_, edge_id) in enumerate(exits)}
+    return Network(
+        center=center, inner_radius=radius - width / 2, outer_radius=radius + width / 2,
+        entry_angles=[a for a, _ in entries], exit_angles=[a for a, _ in exits],
+        entry_edges=[e for _, e in entries], exit_edges=[e for _, e in exits], ring_edges=list(ring_edges),
+        entry_feeds={e: entry_index[s] for e, s in _feeds(entry_index, outside, ring_nodes, True).items()},
+        exit_feeds={e: exit_index[s] for e, s in _feeds(exit_index, outside, ring_nodes, False).items()},
+    )
+
+
+def file_hash(path, block_size=1 << 20):
+    """SHA-256 of a file's contents, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _save_network(path, network):
+    arrays = {name: np.asarray(value) for name, value in network._asdict().items() if name not in ('entry_feeds', 'exit_feeds')}
+    for name in ('entry_feeds', 'exit_feeds'):
+        feeds = getattr(network, name)
+        arrays[name + '_ids'] = np.array(list(feeds), dtype=str)
+        arrays[name + '_idx'] = np.array(list(feeds.values()), dtype=np.int64)
+    np.savez_compressed(path, **arrays)
+
+
+def _load_network(path):
+    with np.load(path) as data:
+        values = {name: data[name] for name in data.files}
+    fields = {}
+    for name in Network._fields:
+        if name in ('entry_feeds', 'exit_feeds'):
+            fields[name] = dict(zip(values[name + '_ids'].tolist(), values[name + '_idx'].tolist()))
+        elif name == 'center':
+            fields[name] = values[name]
+        else:
+            fields[name] = values[name].tolist()
+    return Network(**fields)
+
+
+def load_network(path, roundabout=0, cache_dir=None):
+    """
+    parse_network with a cache: the result is stored as a compressed .npz
+    named after the SHA-256 of the network file, in cache_dir (default: a
+    .lfr_cache directory next to the file), and reused while the file is
+    unchanged. cache_dir=False disables the cache.
+    """
+    if cache_dir is False:
+        return parse_network(path, roundabout)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), '.lfr_cache')
+    cached = os.path.join(cache_dir, f"{file_hash(path)}-{roundabout}-v{CACHE_VERSION}.npz")
+    if os.path.exists(cached):
+        return _load_network(cached)
+    network = parse_network(path, roundabout)
+    os.makedirs(cache_dir, exist_ok=True)
+    # Write under a temporary name first so concurrent sweep workers never read a partial file.
+    partial = f"{cached}.{os.getpid()}.npz"
+    _save_network(partial, network)
+    os.replace(partial, cached)
+    return network
+
+
+def _flow_rate(flow):
+    """Vehicles per hour of a SUMO <flow>, from whichever rate attribute it uses."""
+    if flow.get('vehsPerHour') is not None:
+        return float(flow.get('vehsPerHour'))
+    if flow.get('period') is not None:
+        return 3600 / float(flow.get('period'))
+    if flow.get('probability') is not None:
+        return 3600 * float(flow.get('probability'))
+    if flow.get('number') is not None:
+        duration = float(flow.get('end', 3600)) - float(flow.get('begin', 0))
+        return float(flow.get('number')) * 3600 / duration
+    return 0.0
+
+
+def load_demand(path, network):
+    """
+    Stream-parses the <flow> elements of a SUMO route file and sums their
+    rates into an entry x exit origin-destination matrix (veh/h), following
+    each flow's from/to edge to the entry/exit it feeds. scenario_overrides
+    turns it into the spawn interval and route weights of a run.
+    """
+    od = np.zeros((len(network.entry_angles), len(network.exit_angles)))
+    unmatched = []
+    for _, elem in ET.iterparse(path, events=('end',)):
+        if elem.tag != 'flow':
+            continue
+        entry = network.entry_feeds.get(elem.get('from'))
+        exit_ = network.exit_feeds.get(elem.get('to'))
+        if entry is None or exit_ is None:
+            unmatched.append(elem.get('id'))
+        else:
+            od[entry, exit_] += _flow_rate(elem)
+        elem.clear()
+    return Demand(od, unmatched)
+
+
+def scenario_overrides(network, demand=None):
+    """
+    Config overrides (see sweep.apply_overrides) for a network's geometry
+    and, if given, the demand: the total as the mean spawn interval
+    FLOW_RATE and the OD matrix as ROUTE_WEIGHTS, so each spawn draws its
+    route in proportion to the matrix and every entry (route) gets its
+    share of the total rate.
+    """
+    params = {
+        'INNER_RADIUS': network.inner_radius, 'OUTER_RADIUS': network.outer_radius,
+        'ENTRY_ANGLES': list(network.entry_angles), 'EXIT_ANGLES': list(network.exit_angles),
+    }
+    if demand is not None and demand.od.sum() > 0:
+        params['FLOW_RATE'] = 3600 / demand.od.sum()
+        params['ROUTE_WEIGHTS'] = demand.od.tolist()
+    return params
@@ -0,0 +1,164 @@
+# LFR-MPF-Simulation/sweep.py
+
+import contextlib
+import itertools
+import os
+import sys
+
+import numpy as np
+from . import config
+from .config import *
+
+# Pristine config values; every run starts from these before its overrides.
+_DEFAULTS = {name: getattr(config, name) for name in dir(config) if name.isupper()}
+
+
+def apply_overrides(**params):
+    """
+    Resets the config values to their defaults, then applies params
+    (config names, e.g. FLOW_RATE=1.2). Modules copy config values with
+    `from .config import *`, so the values are written into every loaded
+    project module, and the entry/exit angles are re-derived from
+    OUTER_RADIUS.
+    """
+    unknown = set(params) - set(_DEFAULTS)
+    if unknown:
+        raise KeyError(f"unknown config parameters: {sorted(unknown)}")
+    values = dict(_DEFAULTS, **params)
+    if 'ENTRY_ANGLES' not in params and 'EXIT_ANGLES' not in params:
+        values['ENTRY_ANGLES'], values['EXIT_ANGLES'] = roundabout_angles(values['OUTER_RADIUS'])
+    prefix = __name__.rpartition('.')[0] + '.'
+    for module_name, module in list(sys.modules.items()):
+        if module is None or not (module_name.startswith(prefix) or module is config):
+            continue
+        for name, value in values.items():
+            if name in vars(module):
+                setattr(module, name, value)
+
+
+def parameter_grid(**axes):
+    """Every combination of the given parameter values, as a list of dicts."""
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
+
+
+def summarize(trajectory, ttc_every=10, ttc_range=20.0):
+    """
+    Compact summary of one run: completed trips, throughput (veh/h), mean
+    travel time of completed trips (s) and the minimum two-dimensional TTC
+    (s) over pairs closer than ttc_range, sampled every ttc_every steps.
+    A trip is completed when the vehicle crosses its exit line.
+    """
+    from .ACT import TTC_np
+    from .trajectory import pair_samples, TRIP_START, TRIP_END
+
+    active = np.asarray(trajectory.active)
+    num_rows = active.shape[0]
+    trips = trajectory.trips
+    # Only trips that started in the run count; row 0 holds vehicles already under way.
+    completed = trips[(trips[:, TRIP_START] > 0) & (trips[:, TRIP_END] >= 0)]
+    travel_times = (completed[:, TRIP_END] - completed[:, TRIP_START]) * DT
+
+    steps, first, second = [], [], []
+    for t in range(1, num_rows, ttc_every):
+        ids = np.flatnonzero(active[t])
+        if ids.size < 2:
+            continue
+        x = np.asarray(trajectory.radius[t, ids]) * np.cos(trajectory.angle[t, ids])
+        y = np.asarray(trajectory.radius[t, ids]) * np.sin(trajectory.angle[t, ids])
+        a, b = np.triu_indices(ids.size, 1)
+        close = np.hypot(x[a] - x[b], y[a] - y[b]) < ttc_range
+        steps.append(np.full(close.sum(), t))
+        first.append(ids[a[close]])
+        second.append(ids[b[close]])
+    min_ttc = np.inf
+    if steps and sum(s.size for s in steps):
+        ttc = TTC_np(pair_samples(trajectory, np.concatenate(steps), np.concatenate(first), np.concatenate(second)))
+        ttc = ttc[ttc >= 0]
+        if ttc.size:
+            min_ttc = float(ttc.min())
+
+    duration = (num_rows - 1) * DT
+    return {
+        'spawned': len(trips),
+        'trips': len(travel_times),
+        'throughput': len(travel_times) / duration * 3600 if duration else 0.0,
+        'mean_travel_time': float(np.mean(travel_times)) if len(travel_times) else float('nan'),
+        'min_ttc': min_ttc,
+    }
+
+
+def _run_point(task):
+    """Worker: the simulations of one point, each reduced to a summary row."""
+    params, seeds, engine, safety, metrics, summary_options = task
+    from .main import run_simulation, run_fleet_simulation
+    from .ensemble import run_ensemble
+    from .metrics import MetricsAccumulator
+    from .safety import SafetyMonitor
+    apply_overrides(**params)
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            if engine == 'ensemble':
+                runs = [(seed, trajectory, None, None) for seed, trajectory in zip(seeds, run_ensemble(seeds))]
+            else:
+                run = run_fleet_simulation if engine == 'fleet' else run_simulation
+                runs = []
+                for seed in seeds:
+                    monitor = SafetyMonitor(**safety) if safety is not None else None
+                    accumulator = MetricsAccumulator(**metrics) if metrics is not None else None
+                    trajectory = run(seed=seed, monitor=monitor, metrics=accumulator, record=metrics is None)
+                    runs.append((seed, trajectory, monitor, accumulator))
+        rows = []
+        for seed, trajectory, monitor, accumulator in runs:
+            row = dict(params, seed=seed)
+            if accumulator is not None:
+                row.update(accumulator.totals())
+            else:
+                row.update(summarize(trajectory, **summary_options))
+            if monitor is not None:
+                row.update(monitor.totals())
+            rows.append(row)
+    finally:
+        apply_overrides()
+    return rows
+
+
+def run_sweep(points, replications=1, base_seed=0, processes=None, engine='fleet', safety=None, metrics=None,
+              **summary_options):
+    """
+    Runs every parameter point `replications` times across a process pool.
+
+    points is a list of config overrides (see parameter_grid); each run gets
+    an independent seed spawned from base_seed with numpy's SeedSequence.
+    Returns a pandas DataFrame with one summary row per run. If safety is a
+    dict of safety.SafetyMonitor options ({} for the defaults), every run is
+    screened in-loop and the monitor totals are added to its row.
+    If metrics is a dict of metrics.MetricsAccumulator options, trajectories
+    are not recorded and each row holds the accumulator totals instead of
+    summarize(), so every run takes constant memory.
+    engine='ensemble' runs the replications of each point together in one
+    process (see ensemble.run_ensemble), with the same seeds and results
+    as engine='fleet' on the numpy backend; it does not support safety or
+    metrics.
+    """
+    import pandas as pd
+    from concurrent.futures import ProcessPoolExecutor
+
+    if engine == 'ensemble' and safety is not None:
+        raise ValueError("safety screening is not available with engine='ensemble'")
+    if engine == 'ensemble' and metrics is not None:
+        raise ValueError("metrics are not available with engine='ensemble'")
+    children = np.random.SeedSequence(base_seed).spawn(len(points) * replications)
+    seeds = [int(child.generate_state(1, np.uint64)[0]) for child in children]
+    if engine == 'ensemble':
+        tasks = [(dict(params), seeds[i * replications:(i + 1) * replications], engine, safety, metrics, summary_options)
+                 for i, params in enumerate(points)]
+    else:
+        tasks = [(dict(params), [seed], engine, safety, metrics, summary_options)
+                 for params, seed in zip((p for p in points for _ in range(replications)), seeds)]
+    if processes == 1:
+        rows = [_run_point(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            rows = list(pool.map(_run_point, tasks))
+    return pd.DataFrame([row for point_rows in rows for row in point_rows])
@@ -0,0 +1,377 @@
+# LFR-MPF-Simulation/trajectory.py
+
+import json
+import os
+import numpy as np
+from .config import *
+
+
+class LazyArray:
+    """
+    Read-only array computed from source arrays on access: indexing
+    applies function to the same slice of every source, so only the
+    requested rows are computed; np.asarray() computes it whole.
+    """
+
+    def __init__(self, function, *sources):
+        self.function = function
+        self.sources = sources
+
+    @property
+    def shape(self):
+        return self.sources[0].shape
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        return self.function(*(source[key] for source in self.sources))
+
+    def __array__(self, dtype=None):
+        values = self.function(*(np.asarray(source) for source in self.sources))
+        return values if dtype is None else values.astype(dtype)
+
+
+def _dequantize(quantum):
+    return lambda raw: raw * quantum
+
+
+def _position_x(radius, angle):
+    return radius * np.cos(angle)
+
+
+def _position_y(radius, angle):
+    return radius * np.sin(angle)
+
+
+# Columns of a trip table: one row per activation of a vehicle slot.
+TRIP_VEHICLE, TRIP_START, TRIP_ENTRY, TRIP_EXIT, TRIP_END = range(5)
+TRIP_COLUMNS = 5
+ROUTE_COLUMNS = {'entry_idx': TRIP_ENTRY, 'exit_idx': TRIP_EXIT}
+
+
+def _trip_route(trips, column):
+    """
+    (rows, vehicles, active) -> the given route column of the trip each
+    active (row, vehicle) entry belongs to, and -1 where inactive.
+    """
+    if not len(trips):
+        return lambda rows, vehicles, active: np.full(np.shape(active), -1, dtype=np.int16)
+    # A slot's trips do not overlap, so its trip at a row is the last one started by then.
+    span = int(trips[:, TRIP_START].max()) + 1
+    order = np.lexsort((trips[:, TRIP_START], trips[:, TRIP_VEHICLE]))
+    keys = trips[order, TRIP_VEHICLE] * span + trips[order, TRIP_START]
+    values = trips[order, column]
+
+    def lookup(rows, vehicles, active):
+        position = np.searchsorted(keys, vehicles * span + np.minimum(rows, span - 1), 'right') - 1
+        return np.where(active, values[np.maximum(position, 0)], -1).astype(np.int16)
+    return lookup
+
+
+class _PolarFields:
+    """
+    Field access shared by the trajectory classes: stored fields, quantized
+    fields scaled back to float64, position_x/position_y derived from
+    radius and angle, and entry_idx/exit_idx looked up in the trip table,
+    all only when they are read.
+    """
+    CARTESIAN = {'position_x': _position_x, 'position_y': _position_y}
+
+    def _field(self, name):
+        raise AttributeError(name)
+
+    def _trips(self):
+        return None
+
+    @property
+    def trips(self):
+        """
+        The trip table: an int64 array with a row of (vehicle, first row,
+        entry_idx, exit_idx, exit row) for every activation of a vehicle
+        slot (the TRIP_* columns), in the order the trips started. The exit
+        row is the first row the vehicle had crossed its exit line, -1 if it
+        had not by the end of the recording. None if routes are stored per
+        step.
+        """
+        return self._trips()
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name in self.CARTESIAN:
+            return LazyArray(self.CARTESIAN[name], self.radius, self.angle)
+        trips = self._trips() if name in ROUTE_COLUMNS else None
+        if trips is not None:
+            active = self.active
+            rows = np.broadcast_to(np.arange(active.shape[0])[:, None], active.shape)
+            vehicles = np.broadcast_to(np.arange(active.shape[1]), active.shape)
+            return LazyArray(_trip_route(trips, ROUTE_COLUMNS[name]), rows, vehicles, active)
+        array = self._field(name)
+        quantum = self.__dict__.get('quanta', {}).get(name)
+        return array if quantum is None else LazyArray(_dequantize(quantum), array)
+
+
+class TrajectoryRecorder(_PolarFields):
+    """
+    Preallocated per-step trajectory arrays of shape (num_steps, num_vehicles).
+
+    Row 0 is the initial state and row t+1 the state after simulation step t.
+    Each call to record() writes one row as a slice. Slots of paused vehicles
+    are not written; the boolean `active` array marks which entries are valid.
+    If num_steps is not known up front, storage grows in chunks of chunk_steps.
+
+    Only the polar state is stored; position_x/position_y are computed from
+    it when read. With quantize=True the FIELDS are stored as int32 in
+    steps of QUANTA (1 cm, 1 urad, 1 mm/s) and read back as float64.
+    Routes are kept once per trip in `trips` rather than per step, and
+    entry_idx/exit_idx are looked up from it when read. That makes 33
+    bytes per vehicle-step, 17 quantized (benchmarks.bench_recording).
+    """
+    FIELDS = ('radius', 'angle', 'tangential_speed', 'radial_speed')
+    QUANTA = {'radius': 1e-2, 'angle': 1e-6, 'tangential_speed': 1e-3, 'radial_speed': 1e-3}
+
+    def __init__(self, num_vehicles, num_steps=None, chunk_steps=1000, quantize=False):
+        self.num_vehicles = num_vehicles
+        self.chunk_steps = chunk_steps
+        self.quanta = dict(self.QUANTA) if quantize else {}
+        self.num_recorded = 0
+        self._capacity = 0
+        self._buffers = {}
+        self._allocate(num_steps if num_steps else chunk_steps)
+        # Row number of buffer row 0 (non-zero once a TrajectoryWriter has flushed).
+        self._first_row = 0
+        self._was_active = np.zeros(num_vehicles, dtype=bool)
+        self._trip_of = np.zeros(num_vehicles, dtype=np.int64)
+        self._trip_table = np.zeros((num_vehicles, TRIP_COLUMNS), dtype=np.int64)
+        self.num_trips = 0
+
+    def _allocate(self, capacity):
+        shape = (capacity, self.num_vehicles)
+        buffers = {name: np.zeros(shape, dtype=np.int32 if name in self.quanta else float) for name in self.FIELDS}
+        buffers['active'] = np.zeros(shape, dtype=bool)
+        for name, old in self._buffers.items():
+            buffers[name][:self.num_recorded] = old[:self.num_recorded]
+        self._buffers = buffers
+        self._capacity = capacity
+
+    def _field(self, name):
+        buffers = self.__dict__.get('_buffers', {})
+        if name in buffers:
+            return buffers[name][:self.num_recorded]
+        raise AttributeError(name)
+
+    def _trips(self):
+        return self._trip_table[:self.num_trips]
+
+    def record(self, ids, radius, angle, tangential_speed, radial_speed, entry_idx, exit_idx, out):
+        """
+        Writes the state of the vehicles in ids as the next row; all other
+        slots are paused. out flags the vehicles past their exit line.
+        """
+        if self.num_recorded == self._capacity:
+            self._allocate(self._capacity + self.chunk_steps)
+        row = self.num_recorded
+        b = self._buffers
+        b['active'][row, ids] = True
+        for name, values in zip(self.FIELDS, (radius, angle, tangential_speed, radial_speed)):
+            quantum = self.quanta.get(name)
+            b[name][row, ids] = values if quantum is None else np.rint(np.asarray(values) / quantum)
+        ids = np.asarray(ids, dtype=np.int64)
+        row += self._first_row
+        started = ~self._was_active[ids]
+        if started.any():
+            count = int(started.sum())
+            if self.num_trips + count > len(self._trip_table):
+                grown = np.zeros((2 * (self.num_trips + count), TRIP_COLUMNS), dtype=np.int64)
+                grown[:self.num_trips] = self._trip_table[:self.num_trips]
+                self._trip_table = grown
+            new = slice(self.num_trips, self.num_trips + count)
+            self._trip_table[new] = np.column_stack((ids[started], np.full(count, row), np.asarray(entry_idx)[started],
+                                                     np.asarray(exit_idx)[started], np.full(count, -1)))
+            self._trip_of[ids[started]] = np.arange(new.start, new.stop)
+            self.num_trips += count
+        trips = self._trip_of[ids[np.asarray(out, dtype=bool)]]
+        trips = trips[self._trip_table[trips, TRIP_END] < 0]
+        self._trip_table[trips, TRIP_END] = row
+        self._was_active[:] = False
+        self._was_active[ids] = True
+        self.num_recorded += 1
+
+    def record_vehicles(self, vehicles):
+        """Records one row from a list of active vehicle.Vehicle objects."""
+        state = np.array([(v.radius, v.angle, v.tangential_speed, v.radial_speed) for v in vehicles], dtype=float).reshape(-1, 4)
+        routes = np.array([(v.entry_idx, v.exit_idx, v.out) for v in vehicles], dtype=np.int64).reshape(-1, 3)
+        ids = np.array([v.idx for v in vehicles], dtype=np.int64)
+        self.record(ids, *state.T, *routes.T)
+
+    def record_fleet(self, fleet):
+        """Records one row from the active vehicles of a fleet.Fleet."""
+        ids = fleet.active_indices()
+        self.record(ids, fleet.radius[ids], fleet.angle[ids], fleet.tangential_speed[ids],
+                    fleet.radial_speed[ids], fleet.entry_idx[ids], fleet.exit_idx[ids], fleet.out[ids])
+
+    def nbytes(self):
+        """Memory held by the preallocated buffers and the trip table."""
+        return sum(buffer.nbytes for buffer in self._buffers.values()) + self.trips.nbytes
+
+    def close(self):
+        """Finishes recording; returns the trajectory to read from."""
+        return self
+
+
+class TrajectoryWriter(TrajectoryRecorder):
+    """
+    Streams a trajectory to disk in chunks of chunk_steps rows.
+
+    The output directory holds one .npy file per field of shape
+    (num_steps, num_vehicles), written through a memory map, and a
+    header.json with the run header and the number of rows flushed so
+    far, and trips.npy with the trip table. Only one chunk is held in
+    memory, and everything up to the last flush survives if the process
+    dies. Read it back with open_trajectory.
+    """
+
+    def __init__(self, path, num_vehicles, num_steps, chunk_steps=256, header=None, quantize=False):
+        super().__init__(num_vehicles, chunk_steps, chunk_steps, quantize)
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.num_steps = num_steps
+        self.num_flushed = 0
+        self.header = dict(header or {}, num_steps=num_steps, num_vehicles=num_vehicles, quanta=self.quanta)
+        self._files = {
+            name: np.lib.format.open_memmap(os.path.join(path, name + '.npy'), mode='w+',
+                                            dtype=buffer.dtype, shape=(num_steps, num_vehicles))
+            for name, buffer in self._buffers.items()
+        }
+        self._write_header()
+
+    def _write_header(self):
+        with open(os.path.join(self.path, 'header.json'), 'w') as f:
+            json.dump(dict(self.header, num_recorded=self.num_flushed), f, indent=1)
+
+    def record(self, *args):
+        if self.num_recorded == self._capacity:
+            self.flush()
+        if self.num_flushed + self.num_recorded == self.num_steps:
+            raise ValueError(f"trajectory file holds only {self.num_steps} steps")
+        super().record(*args)
+
+    def flush(self):
+        """Writes the buffered rows to disk and empties the buffer."""
+        rows = self.num_recorded
+        start = self.num_flushed
+        for name, out in self._files.items():
+            out[start:start + rows] = self._buffers[name][:rows]
+            out.flush()
+        partial = os.path.join(self.path, 'trips.partial.npy')
+        np.save(partial, self.trips)
+        os.replace(partial, os.path.join(self.path, 'trips.npy'))
+        for buffer in self._buffers.values():
+            buffer[:rows] = 0
+        self.num_flushed += rows
+        self._first_row = self.num_flushed
+        self.num_recorded = 0
+        self._write_header()
+
+    def close(self):
+        """Flushes the remaining rows and returns the trajectory memory-mapped from disk."""
+        self.flush()
+        self._files = {}
+        return open_trajectory(self.path)
+
+
+class StoredTrajectory(_PolarFields):
+    """
+    A trajectory written by TrajectoryWriter, memory-mapped from disk.
+    Fields are read-only arrays with the same names and layout as
+    TrajectoryRecorder, so rows are only loaded when they are accessed.
+    """
+
+    def __init__(self, path, mmap_mode='r'):
+        with open(os.path.join(path, 'header.json')) as f:
+            self.header = json.load(f)
+        self.path = path
+        self.num_vehicles = self.header['num_vehicles']
+        self.num_recorded = self.header['num_recorded']
+        self.quanta = self.header.get('quanta', {})
+        self._arrays = {}
+        trips = os.path.join(path, 'trips.npy')
+        self._trip_table = np.load(trips) if os.path.exists(trips) else None
+        # Directories without trips.npy store the routes per step.
+        routes = ROUTE_COLUMNS if self._trip_table is None else ()
+        for name in TrajectoryRecorder.FIELDS + tuple(routes) + ('active',):
+            array = np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode)
+            self._arrays[name] = array[:self.num_recorded]
+
+    def _field(self, name):
+        arrays = self.__dict__.get('_arrays', {})
+        if name in arrays:
+            return arrays[name]
+        raise AttributeError(name)
+
+    def _trips(self):
+        return self.__dict__.get('_trip_table')
+
+    def nbytes(self):
+        """Size of the stored fields and trip table."""
+        return sum(array.nbytes for array in self._arrays.values()) + (0 if self.trips is None else self.trips.nbytes)
+
+
+def open_trajectory(path, mmap_mode='r'):
+    """Opens a trajectory directory written by TrajectoryWriter."""
+    return StoredTrajectory(path, mmap_mode)
+
+
+def run_header(seed, **extra):
+    """Run header for trajectory files: seed plus every config value (geometry included)."""
+    from . import config
+    header = {'seed': seed}
+    for name in dir(config):
+        value = getattr(config, name)
+        if name.isupper() and isinstance(value, (int, float, list)):
+            header[name] = np.asarray(value, dtype=float).tolist() if isinstance(value, list) else value
+    header.update(extra)
+    return header
+
+
+def polar_to_cartesian(radius, angle, tangential_speed, radial_speed):
+    """
+    Position, velocity and heading vectors from polar vehicle state.
+    The heading follows the velocity and falls back to the direction of
+    travel around the ring for vehicles at rest.
+    """
+    cos, sin = np.cos(angle), np.sin(angle)
+    vx = radial_speed * cos - tangential_speed * sin
+    vy = radial_speed * sin + tangential_speed * cos
+    speed = np.hypot(vx, vy)
+    moving = speed > 1e-6
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hx = np.where(moving, vx / speed, -sin)
+        hy = np.where(moving, vy / speed, cos)
+    return radius * cos, radius * sin, vx, vy, hx, hy
+
+
+def pair_samples(trajectory, steps, i, j, length=None, width=None):
+    """
+    Vehicle-pair samples in the column layout of ACT.TTC / ACT.CurrentD for
+    vehicles i and j at the given steps (equal-length index arrays). Only
+    the requested entries are read, so this works on memory-mapped
+    trajectories. Pass the result to ACT.TTC_np directly, or wrap it in a
+    pandas DataFrame for ACT.TTC. length and width default to the current
+    VEHICLE_LENGTH and VEHICLE_WIDTH.
+    """
+    length = VEHICLE_LENGTH if length is None else length
+    width = VEHICLE_WIDTH if width is None else width
+    samples = {}
+    for suffix, ids in (('_i', i), ('_j', j)):
+        state = [getattr(trajectory, name)[steps, ids] for name in ('radius', 'angle', 'tangential_speed', 'radial_speed')]
+        for name, values in zip(('x', 'y', 'vx', 'vy', 'hx', 'hy'), polar_to_cartesian(*state)):
+            samples[name + suffix] = values
+        samples['length' + suffix] = np.full(len(samples['x' + suffix]), float(length))
+        samples['width' + suffix] = np.full(len(samples['x' + suffix]), float(width))
+    return samples
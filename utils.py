@@ -1,71 +1,199 @@
-# LFR-MPF-Simulation/utils.py
-
-import numpy as np
-from .config import *
-from .models import idm_interaction_deceleration, idm_acceleration
-# Forward declaration to avoid circular import
-class Vehicle: pass
-
-
-def calculate_angle_gap(start_angle, end_angle):
-    """Calculates the shortest positive angle from start_angle to end_angle."""
-    return (end_angle - start_angle + 2 * np.pi) % (2 * np.pi)
-
-def find_approaching_leader(vehicle, vehicles):
-    """Finds the closest vehicle directly ahead when entering the roundabout."""
-    front_vehicles = []
-    for other in vehicles:
-        if other.idx != vehicle.idx and other.radius < vehicle.radius:
-            is_in_lane = (vehicle.angle == other.angle and other.radius > OUTER_RADIUS)
-            is_at_entry = (calculate_angle_gap(vehicle.angle, other.angle) < np.pi/18 and
-                           OUTER_RADIUS - 5 < other.radius < OUTER_RADIUS)
-            if is_in_lane or is_at_entry:
-                front_vehicles.append(other)
-    return min(front_vehicles, key=lambda v: vehicle.radius - v.radius) if front_vehicles else None
-
-def find_leader_in_roundabout(vehicle, vehicles):
-    """Finds the leading vehicle inside the roundabout."""
-    front_vehicles = []
-    angle_to_exit = calculate_angle_gap(vehicle.angle, vehicle.exit_angle)
-    for other in vehicles:
-        if other.idx == vehicle.idx or other.radius > OUTER_RADIUS:
-            continue
-        angle_diff = calculate_angle_gap(vehicle.angle, other.angle)
-        arc_length = min(vehicle.radius, other.radius) * angle_diff
-        radius_diff = abs(vehicle.radius - other.radius)
-        if 0 < angle_diff < angle_to_exit and 0 < arc_length <= 100 and radius_diff < 5:
-            front_vehicles.append(other)
-    if not front_vehicles:
-        return None
-    best_vehicle = min(front_vehicles, key=lambda v:
-        idm_interaction_deceleration(vehicle.tangential_speed, v.tangential_speed,
-                                     min(vehicle.radius, v.radius) * calculate_angle_gap(vehicle.angle, v.angle) - vehicle.length,
-                                     vehicle.radius - v.radius)
-    )
-    min_decel = idm_interaction_deceleration(vehicle.tangential_speed, best_vehicle.tangential_speed,
-                                            min(vehicle.radius, best_vehicle.radius) * calculate_angle_gap(vehicle.angle, best_vehicle.angle) - vehicle.length,
-                                            vehicle.radius - best_vehicle.radius)
-    if min_decel > -2 and angle_to_exit < np.math.asin(30 / OUTER_RADIUS):
-        return Vehicle.YIELD_FLAG
-    return best_vehicle
-
-def find_follower_in_roundabout(vehicle, vehicles):
-    """Finds the following vehicle inside the roundabout."""
-    followers = []
-    for other in vehicles:
-        if other.idx == vehicle.idx:
-            continue
-        angle_diff = calculate_angle_gap(other.angle, vehicle.angle)
-        if not (0 < angle_diff < np.pi):
-            continue
-        arc_length = min(vehicle.radius, other.radius) * angle_diff
-        radius_diff = abs(vehicle.radius - other.radius)
-        if 0 < arc_length <= 100 and radius_diff < vehicle.length:
-            followers.append(other)
-    if not followers:
-        return None
-    return min(followers, key=lambda v:
-        idm_interaction_deceleration(v.tangential_speed, vehicle.tangential_speed,
-                                     min(vehicle.radius, v.radius) * calculate_angle_gap(v.angle, vehicle.angle) - vehicle.length,
-                                     v.radius - vehicle.radius)
+# LFR-MPF-Simulation/utils.py
+
+import numpy as np
+from .config import *
+from .models import idm_interaction_deceleration, idm_acceleration
+# Forward declaration to avoid circular import
+class Vehicle:
+    YIELD_FLAG = 1
+
+
+def calculate_angle_gap(start_angle, end_angle):
+    """Calculates the shortest positive angle from start_angle to end_angle."""
+    return (end_angle - start_angle + 2 * np.pi) % (2 * np.pi)
+
+class PolarIndex:
+    """
+    Per-step spatial index of the active vehicles for the neighbour finders.
+
+    Vehicles are bucketed by angle sector and radial band, and vehicles
+    outside the roundabout are also keyed by their exact angle (their
+    approach lane). Queries return a superset of the vehicles a finder
+    accepts, in the order of the list the index was built from, so the
+    finders select exactly the same vehicle as a full scan.
+    Call relocate() after a vehicle moves to keep the index current.
+    """
+
+    def __init__(self, vehicles, num_sectors=72, band_width=5.0):
+        self.num_sectors = num_sectors
+        self.sector_width = 2 * np.pi / num_sectors
+        self.band_width = band_width
+        self.cells = {}
+        self.lanes = {}
+        self._order = {}
+        self._keys = {}
+        for pos, vehicle in enumerate(vehicles):
+            self._order[vehicle.idx] = pos
+            self._insert(vehicle)
+
+    def _insert(self, vehicle):
+        cell = (int((vehicle.angle % (2 * np.pi)) // self.sector_width) % self.num_sectors,
+                int(vehicle.radius // self.band_width))
+        self.cells.setdefault(cell, []).append(vehicle)
+        lane = vehicle.angle if vehicle.radius > OUTER_RADIUS else None
+        if lane is not None:
+            self.lanes.setdefault(lane, []).append(vehicle)
+        self._keys[vehicle.idx] = (cell, lane)
+
+    def relocate(self, vehicle):
+        """Moves a vehicle to the buckets matching its current position."""
+        cell, lane = self._keys[vehicle.idx]
+        self.cells[cell].remove(vehicle)
+        if lane is not None:
+            self.lanes[lane].remove(vehicle)
+        self._insert(vehicle)
+
+    def query(self, start_angle, span, min_radius, max_radius):
+        """Vehicles in the sectors covering [start_angle, start_angle + span] and the bands covering [min_radius, max_radius]."""
+        # One extra sector on each side absorbs rounding at sector edges.
+        first_sector = int((start_angle % (2 * np.pi)) // self.sector_width) - 1
+        num_sectors = min(int(span // self.sector_width) + 3, self.num_sectors)
+        first_band = int(min_radius // self.band_width)
+        last_band = int(max_radius // self.band_width)
+        found = []
+        for k in range(num_sectors):
+            sector = (first_sector + k) % self.num_sectors
+            for band in range(first_band, last_band + 1):
+                found.extend(self.cells.get((sector, band), ()))
+        return self._in_order(found)
+
+    def lane(self, angle):
+        """Vehicles outside the roundabout on the approach lane at exactly this angle."""
+        return self.lanes.get(angle, [])
+
+    def _in_order(self, found):
+        return sorted(found, key=lambda v: self._order[v.idx])
+
+
+def arc_window(radius, radial_window):
+    """Angular span covering 100 m of arc for partners within radial_window (scalar or array)."""
+    inner = np.maximum(radius - radial_window, 0)
+    with np.errstate(divide='ignore'):
+        return np.minimum(2 * np.pi, 100 / inner * (1 + 1e-9))
+
+# Key distance between radial bands in window_keys, larger than any angular window.
+WINDOW_STRIDE = 4 * 2 * np.pi
+
+def window_keys(angle, band):
+    """
+    Sorted band * WINDOW_STRIDE + angle keys (angle in [0, 2*pi)) and the
+    vehicle position of each key. Every vehicle appears at angle and at
+    angle + 2*pi, so windows can wrap.
+    """
+    n = angle.size
+    keys = np.concatenate((band * WINDOW_STRIDE + angle, band * WINDOW_STRIDE + angle + 2 * np.pi))
+    order = np.argsort(keys, kind='stable')
+    return keys[order], order % n if n else order
+
+def angular_window_pairs(angle, radius, span, radial_window, band_width=5.0, backward=False, group=None):
+    """
+    Candidate (ego, other) position pairs for array-based neighbour search.
+
+    Vehicles are bucketed into radial bands and sorted by angle within each
+    band; each ego is paired with the vehicles in the bands within its
+    radial_window and in the arc span ahead of it (behind it if backward).
+    The pairs are a superset of those within the arc and radial windows,
+    so callers apply the exact selection predicate to them. If group is
+    given (one integer per vehicle), only vehicles of the same group pair.
+    """
+    n = angle.size
+    two_pi = 2 * np.pi
+    angle = angle % two_pi
+    span = np.minimum(np.broadcast_to(span, (n,)), two_pi) + 1e-9
+    radial_window = np.broadcast_to(radial_window, (n,))
+    start = ((angle - span) % two_pi if backward else angle) - 1e-9
+    band = np.floor(radius / band_width).astype(np.int64)
+    # Reaching beyond the occupied bands adds nothing.
+    reach = int(min(np.ceil(radial_window.max() / band_width), band.max() - band.min())) if n else 0
+    if group is not None and n:
+        # Bands of different groups lie further apart than any ego reaches.
+        band = band + np.asarray(group, dtype=np.int64) * (band.max() + 2 * reach + 1)
+
+    keys, members = window_keys(angle, band)
+    ego = np.repeat(np.arange(n), 2 * reach + 1)
+    target = band[ego] + np.tile(np.arange(-reach, reach + 1), n)
+    low = target * WINDOW_STRIDE + start[ego]
+    left = np.searchsorted(keys, low, 'left')
+    right = np.searchsorted(keys, low + span[ego] + 2e-9, 'right')
+    counts = right - left
+    total = counts.sum()
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(ego, counts), members[np.repeat(left, counts) + offsets]
+
+def find_approaching_leader(vehicle, vehicles, index=None):
+    """Finds the closest vehicle directly ahead when entering the roundabout."""
+    if index is not None:
+        vehicles = index._in_order(index.lane(vehicle.angle) +
+                                   index.query(vehicle.angle, np.pi/18, OUTER_RADIUS - 5, OUTER_RADIUS))
+    front_vehicles = []
+    for other in vehicles:
+        if other.idx != vehicle.idx and other.radius < vehicle.radius:
+            is_in_lane = (vehicle.angle == other.angle and other.radius > OUTER_RADIUS)
+            is_at_entry = (calculate_angle_gap(vehicle.angle, other.angle) < np.pi/18 and
+                           OUTER_RADIUS - 5 < other.radius < OUTER_RADIUS)
+            if is_in_lane or is_at_entry:
+                front_vehicles.append(other)
+    return min(front_vehicles, key=lambda v: vehicle.radius - v.radius) if front_vehicles else None
+
+def find_leader_in_roundabout(vehicle, vehicles, index=None):
+    """Finds the leading vehicle inside the roundabout."""
+    front_vehicles = []
+    angle_to_exit = calculate_angle_gap(vehicle.angle, vehicle.exit_angle)
+    if index is not None:
+        vehicles = index.query(vehicle.angle, min(angle_to_exit, arc_window(vehicle.radius, 5)),
+                               vehicle.radius - 5, min(vehicle.radius + 5, OUTER_RADIUS))
+    for other in vehicles:
+        if other.idx == vehicle.idx or other.radius > OUTER_RADIUS:
+            continue
+        angle_diff = calculate_angle_gap(vehicle.angle, other.angle)
+        arc_length = min(vehicle.radius, other.radius) * angle_diff
+        radius_diff = abs(vehicle.radius - other.radius)
+        if 0 < angle_diff < angle_to_exit and 0 < arc_length <= 100 and radius_diff < 5:
+            front_vehicles.append(other)
+    if not front_vehicles:
+        return None
+    best_vehicle, min_decel = None, None
+    for v in front_vehicles:
+        decel = idm_interaction_deceleration(vehicle.tangential_speed, v.tangential_speed,
+                                             min(vehicle.radius, v.radius) * calculate_angle_gap(vehicle.angle, v.angle) - vehicle.length,
+                                             vehicle.radius - v.radius)
+        if best_vehicle is None or decel < min_decel:
+            best_vehicle, min_decel = v, decel
+    if min_decel > -2 and angle_to_exit < vehicle.route.yield_window:
+        return Vehicle.YIELD_FLAG
+    return best_vehicle
+
+def find_follower_in_roundabout(vehicle, vehicles, index=None):
+    """Finds the following vehicle inside the roundabout."""
+    followers = []
+    if index is not None:
+        span = min(np.pi, arc_window(vehicle.radius, vehicle.length))
+        vehicles = index.query(vehicle.angle - span, span,
+                               vehicle.radius - vehicle.length, vehicle.radius + vehicle.length)
+    for other in vehicles:
+        if other.idx == vehicle.idx:
+            continue
+        angle_diff = calculate_angle_gap(other.angle, vehicle.angle)
+        if not (0 < angle_diff < np.pi):
+            continue
+        arc_length = min(vehicle.radius, other.radius) * angle_diff
+        radius_diff = abs(vehicle.radius - other.radius)
+        if 0 < arc_length <= 100 and radius_diff < vehicle.length:
+            followers.append(other)
+    if not followers:
+        return None
+    return min(followers, key=lambda v:
+        idm_interaction_deceleration(v.tangential_speed, vehicle.tangential_speed,
+                                     min(vehicle.radius, v.radius) * calculate_angle_gap(v.angle, vehicle.angle) - vehicle.length,
+                                     v.radius - vehicle.radius)
     )
\ No newline at end of file
@@ -1,133 +1,352 @@
-# LFR-MPF-Simulation/visualization.py
-
-import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.patches import Rectangle, Wedge
-from matplotlib.transforms import Affine2D
-from matplotlib.colors import Normalize
-from matplotlib.cm import ScalarMappable
-from IPython.display import display, clear_output
-import math
-
-from .config import *
-
-def _get_plot_position(angle, radius):
-    return radius * np.cos(angle), radius * np.sin(angle)
-
-def _visualize_lanes(ax):
-    """Draws the roundabout boundaries and entry/exit lanes."""
-    roundabout_region = Wedge((0, 0), OUTER_RADIUS + 2, 0, 360,
-                              width=OUTER_RADIUS - INNER_RADIUS + 4, color='lightgray', alpha=0.5)
-    ax.add_patch(roundabout_region)
-    inner_circle = plt.Circle((0, 0), INNER_RADIUS, fill=False, color='black', ls='--', lw=2)
-    outer_circle = plt.Circle((0, 0), OUTER_RADIUS, fill=False, color='black', ls='--', lw=2)
-    ax.add_artist(inner_circle)
-    ax.add_artist(outer_circle)
-    for i in range(len(ENTRY_ANGLES)):
-        ex, ey = _get_plot_position(ENTRY_ANGLES[i], OUTER_RADIUS)
-        ax.plot([ex, ex + 30 * np.cos(ENTRY_ANGLES[i])],
-                [ey, ey + 30 * np.sin(ENTRY_ANGLES[i])], 'g--', lw=1.5)
-        ax.plot(ex, ey, 'gs', markersize=8, label=f"Entry" if i == 0 else "")
-    for i in range(len(EXIT_ANGLES)):
-        ex, ey = _get_plot_position(EXIT_ANGLES[i], OUTER_RADIUS)
-        ax.plot([ex, ex + 30 * np.cos(EXIT_ANGLES[i])],
-                [ey, ey + 30 * np.sin(EXIT_ANGLES[i])], 'r--', lw=1.5)
-        ax.plot(ex, ey, 'rs', markersize=8, label=f"Exit" if i == 0 else "")
-    ax.legend()
-
-
-def animate_simulation(vehicle_positions):
-    """
-    Animates the simulation results.
-    Note: This function is designed to be run in a Jupyter environment
-    due to its use of IPython.display.
-    """
-    fig, ax = plt.subplots(figsize=(12, 12))
-    plt.rcParams.update({'font.size': 14, 'font.family': 'serif', 'font.serif': 'Times New Roman'})
-
-    norm = Normalize(vmin=0, vmax=DESIRED_SPEED + 5)
-    cmap = plt.get_cmap('viridis')
-    sm = ScalarMappable(cmap=cmap, norm=norm)
-    
-    # 1. Find the maximum length among all vehicle records
-    max_len = 0
-    for i in range(NUM_VEHICLES):
-        length = len(vehicle_positions[f"Veh[{i}]"]["position_x"])
-        if length > max_len:
-            max_len = length
-
-    # 2. Pad shorter records with a sentinel value
-    for i in range(NUM_VEHICLES):
-        data = vehicle_positions[f"Veh[{i}]"]
-        current_len = len(data["position_x"])
-        
-        if current_len < max_len:
-            padding_size = max_len - current_len
-            data["position_x"].extend([999] * padding_size)
-            data["position_y"].extend([999] * padding_size)
-            data["tangential_speeds"].extend([0] * padding_size)
-            data["radial_speeds"].extend([0] * padding_size)
-            
-            last_entry_idx = data["entry_idx"][-1] if data["entry_idx"] else -1
-            last_exit_idx = data["exit_idx"][-1] if data["exit_idx"] else -1
-            data["entry_idx"].extend([last_entry_idx] * padding_size)
-            data["exit_idx"].extend([last_exit_idx] * padding_size)
-
-    print(f"Data padded. All vehicle records now have a consistent length of {max_len} steps.")
-
-    num_recorded_steps = max_len 
-    FRAME_SKIP = 2
-    
-    for t in range(0, num_recorded_steps, FRAME_SKIP):
-        ax.clear()
-        ax.set_xlim(-OUTER_RADIUS - 40, OUTER_RADIUS + 40)
-        ax.set_ylim(-OUTER_RADIUS - 40, OUTER_RADIUS + 40)
-        ax.set_aspect('equal')
-        ax.set_xlabel("X (m)")
-        ax.set_ylabel("Y (m)")
-        ax.set_title(f'Roundabout Simulation: Time = {t * DT:.1f}s')
-        _visualize_lanes(ax)
-        
-        for i in range(NUM_VEHICLES):
-            vehicle_data = vehicle_positions[f"Veh[{i}]"]
-            x = vehicle_data["position_x"][t]
-            y = vehicle_data["position_y"][t]
-            
-            if x > 900: # Sentinel value check
-                continue
-                
-            vx = vehicle_data["tangential_speeds"][t]
-            vy = vehicle_data["radial_speeds"][t]
-            speed = math.sqrt(vx**2 + vy**2)
-            color = sm.to_rgba(speed)
-            pos_angle = np.arctan2(y, x)
-            dist_from_center = np.sqrt(x**2 + y**2)
-
-            if dist_from_center > OUTER_RADIUS:
-                 orientation_angle = pos_angle
-            else:
-                if vx <= 1e-6:
-                    orientation_angle = pos_angle + np.pi / 2
-                else:
-                    movement_angle = np.arctan(vy / (vx + 1e-6))
-                    orientation_angle = pos_angle + movement_angle
-            
-            rect = Rectangle(
-                (x - VEHICLE_LENGTH / 2, y - VEHICLE_WIDTH / 2),
-                VEHICLE_LENGTH, VEHICLE_WIDTH,
-                color=color, alpha=0.9
-            )
-            transform = Affine2D().rotate_around(x, y, orientation_angle)
-            rect.set_transform(transform + ax.transData)
-            ax.add_patch(rect)
-            
-            entry_idx = vehicle_data["entry_idx"][t]
-            exit_idx = vehicle_data["exit_idx"][t]
-            ax.text(x, y, f"{entry_idx+1},{exit_idx+1}", color='white',
-                    ha='center', va='center', fontsize=8, weight='bold')
-
-        display(fig)
-        plt.pause(1e-4)
-        clear_output(wait=True)
-    
-    plt.show()
\ No newline at end of file
+# LFR-MPF-Simulation/visualization.py
+
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.patches import Rectangle, Wedge
+from matplotlib.transforms import Affine2D
+from matplotlib.colors import Normalize
+from matplotlib.cm import ScalarMappable
+from matplotlib.collections import PolyCollection
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib import animation
+from PIL import Image
+import math
+import subprocess
+
+from .config import *
+
+def _get_plot_position(angle, radius):
+    return radius * np.cos(angle), radius * np.sin(angle)
+
+def _visualize_lanes(ax):
+    """Draws the roundabout boundaries and entry/exit lanes."""
+    roundabout_region = Wedge((0, 0), OUTER_RADIUS + 2, 0, 360,
+                              width=OUTER_RADIUS - INNER_RADIUS + 4, color='lightgray', alpha=0.5)
+    ax.add_patch(roundabout_region)
+    inner_circle = plt.Circle((0, 0), INNER_RADIUS, fill=False, color='black', ls='--', lw=2)
+    outer_circle = plt.Circle((0, 0), OUTER_RADIUS, fill=False, color='black', ls='--', lw=2)
+    ax.add_artist(inner_circle)
+    ax.add_artist(outer_circle)
+    for i in range(len(ENTRY_ANGLES)):
+        ex, ey = _get_plot_position(ENTRY_ANGLES[i], OUTER_RADIUS)
+        ax.plot([ex, ex + 30 * np.cos(ENTRY_ANGLES[i])],
+                [ey, ey + 30 * np.sin(ENTRY_ANGLES[i])], 'g--', lw=1.5)
+        ax.plot(ex, ey, 'gs', markersize=8, label=f"Entry" if i == 0 else "")
+    for i in range(len(EXIT_ANGLES)):
+        ex, ey = _get_plot_position(EXIT_ANGLES[i], OUTER_RADIUS)
+        ax.plot([ex, ex + 30 * np.cos(EXIT_ANGLES[i])],
+                [ey, ey + 30 * np.sin(EXIT_ANGLES[i])], 'r--', lw=1.5)
+        ax.plot(ex, ey, 'rs', markersize=8, label=f"Exit" if i == 0 else "")
+    ax.legend()
+
+
+def animate_simulation(trajectory):
+    """
+    Animates the simulation results from a trajectory.TrajectoryRecorder.
+    Note: This function is designed to be run in a Jupyter environment
+    due to its use of IPython.display. Use render_video for headless output.
+    """
+    from IPython.display import display, clear_output
+
+    fig, ax = plt.subplots(figsize=(12, 12))
+    plt.rcParams.update({'font.size': 14, 'font.family': 'serif', 'font.serif': 'Times New Roman'})
+
+    norm = Normalize(vmin=0, vmax=DESIRED_SPEED + 5)
+    cmap = plt.get_cmap('viridis')
+    sm = ScalarMappable(cmap=cmap, norm=norm)
+
+    num_recorded_steps = trajectory.num_recorded
+    FRAME_SKIP = 2
+    
+    for t in range(0, num_recorded_steps, FRAME_SKIP):
+        ax.clear()
+        ax.set_xlim(-OUTER_RADIUS - 40, OUTER_RADIUS + 40)
+        ax.set_ylim(-OUTER_RADIUS - 40, OUTER_RADIUS + 40)
+        ax.set_aspect('equal')
+        ax.set_xlabel("X (m)")
+        ax.set_ylabel("Y (m)")
+        ax.set_title(f'Roundabout Simulation: Time = {t * DT:.1f}s')
+        _visualize_lanes(ax)
+        
+        # Positions are derived from the polar state, one row per frame.
+        position_x, position_y = trajectory.position_x[t], trajectory.position_y[t]
+        for i in np.flatnonzero(trajectory.active[t]):
+            x = position_x[i]
+            y = position_y[i]
+            vx = trajectory.tangential_speed[t, i]
+            vy = trajectory.radial_speed[t, i]
+            speed = math.sqrt(vx**2 + vy**2)
+            color = sm.to_rgba(speed)
+            pos_angle = np.arctan2(y, x)
+            dist_from_center = np.sqrt(x**2 + y**2)
+
+            if dist_from_center > OUTER_RADIUS:
+                 orientation_angle = pos_angle
+            else:
+                if vx <= 1e-6:
+                    orientation_angle = pos_angle + np.pi / 2
+                else:
+                    movement_angle = np.arctan(vy / (vx + 1e-6))
+                    orientation_angle = pos_angle + movement_angle
+            
+            rect = Rectangle(
+                (x - VEHICLE_LENGTH / 2, y - VEHICLE_WIDTH / 2),
+                VEHICLE_LENGTH, VEHICLE_WIDTH,
+                color=color, alpha=0.9
+            )
+            transform = Affine2D().rotate_around(x, y, orientation_angle)
+            rect.set_transform(transform + ax.transData)
+            ax.add_patch(rect)
+            
+            entry_idx = trajectory.entry_idx[t, i]
+            exit_idx = trajectory.exit_idx[t, i]
+            ax.text(x, y, f"{entry_idx+1},{exit_idx+1}", color='white',
+                    ha='center', va='center', fontsize=8, weight='bold')
+
+        display(fig)
+        plt.pause(1e-4)
+        clear_output(wait=True)
+    
+    plt.show()
+
+
+def _vehicle_polygons(radius, angle, tangential_speed, radial_speed):
+    """Corner vertices (n, 4, 2) of the vehicle rectangles, oriented as in animate_simulation."""
+    x, y = radius * np.cos(angle), radius * np.sin(angle)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        movement_angle = np.where(tangential_speed <= 1e-6, np.pi / 2,
+                                  np.arctan(radial_speed / (tangential_speed + 1e-6)))
+    orientation = angle + np.where(radius > OUTER_RADIUS, 0, movement_angle)
+    local = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]]) * [VEHICLE_LENGTH / 2, VEHICLE_WIDTH / 2]
+    cos, sin = np.cos(orientation)[:, None], np.sin(orientation)[:, None]
+    vx = x[:, None] + local[:, 0] * cos - local[:, 1] * sin
+    vy = y[:, None] + local[:, 0] * sin + local[:, 1] * cos
+    return np.stack((vx, vy), axis=-1)
+
+
+class _GifFrames:
+    """Collects RGBA frames and writes them as a looping GIF on close(), as PillowWriter does."""
+
+    def __init__(self, path, size, fps):
+        self.path, self.size, self.fps = path, size, fps
+        self.frames = []
+
+    def write(self, rgba):
+        # The canvas is opaque; RGB frames quantize to the GIF palette better than RGBA.
+        self.frames.append(Image.frombytes('RGBA', self.size, bytes(rgba)).convert('RGB'))
+
+    def close(self):
+        if self.frames:
+            self.frames[0].save(self.path, save_all=True, append_images=self.frames[1:],
+                                duration=int(1000 / self.fps), loop=0)
+
+
+class _FFMpegFrames:
+    """Pipes raw RGBA frames to ffmpeg (the one matplotlib is configured to use), encoding h264."""
+
+    def __init__(self, path, size, fps):
+        command = [animation.FFMpegWriter.bin_path(), '-y', '-loglevel', 'error',
+                   '-f', 'rawvideo', '-pix_fmt', 'rgba', '-s', '%dx%d' % size, '-framerate', str(fps), '-i', 'pipe:',
+                   '-vcodec', 'libx264', '-pix_fmt', 'yuv420p', str(path)]
+        self._process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, rgba):
+        self._process.stdin.write(rgba)
+
+    def close(self):
+        _, error = self._process.communicate()
+        if self._process.returncode:
+            raise RuntimeError(f"ffmpeg failed: {error.decode(errors='replace').strip()}")
+
+
+def render_video(trajectory, path, frame_skip=2, fps=20, dpi=100, size_inches=8, start=0, stop=None):
+    """
+    Renders a trajectory to an MP4 or GIF file without a display.
+
+    The roundabout, lanes and legend are drawn once and kept as the blit
+    background. Every frame restores that background and draws all
+    vehicles through a single PolyCollection whose vertices and colours are
+    computed in bulk from the trajectory arrays. Every frame_skip-th row
+    between start and stop is rendered, at size_inches * dpi pixels square.
+    Each blitted canvas buffer is written as it is: a .gif is assembled
+    with Pillow, anything else is piped to ffmpeg as h264.
+    """
+    # Keep the pixel size even, as h264 requires.
+    pixels = 2 * int(round(size_inches * dpi / 2))
+    fig = Figure(figsize=(pixels / dpi, pixels / dpi), dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.set_xlim(-OUTER_RADIUS - 40, OUTER_RADIUS + 40)
+    ax.set_ylim(-OUTER_RADIUS - 40, OUTER_RADIUS + 40)
+    ax.set_aspect('equal')
+    ax.set_xlabel("X (m)")
+    ax.set_ylabel("Y (m)")
+    _visualize_lanes(ax)
+
+    norm = Normalize(vmin=0, vmax=DESIRED_SPEED + 5)
+    cmap = plt.get_cmap('viridis')
+    fig.colorbar(ScalarMappable(cmap=cmap, norm=norm), ax=ax, label="Speed (m/s)", shrink=0.8)
+    vehicles = PolyCollection([], alpha=0.9, animated=True)
+    ax.add_collection(vehicles)
+    title = ax.set_title("", animated=True)
+
+    canvas.draw()
+    background = canvas.copy_from_bbox(fig.bbox)
+
+    frames = (_GifFrames if str(path).lower().endswith('.gif') else _FFMpegFrames)(path, canvas.get_width_height(), fps)
+    stop = trajectory.num_recorded if stop is None else min(stop, trajectory.num_recorded)
+    try:
+        for t in range(start, stop, frame_skip):
+            active = np.asarray(trajectory.active[t])
+            radius = np.asarray(trajectory.radius[t])[active]
+            angle = np.asarray(trajectory.angle[t])[active]
+            vt = np.asarray(trajectory.tangential_speed[t])[active]
+            vr = np.asarray(trajectory.radial_speed[t])[active]
+            vehicles.set_verts(_vehicle_polygons(radius, angle, vt, vr))
+            vehicles.set_facecolor(cmap(norm(np.hypot(vt, vr))))
+            title.set_text(f'Roundabout Simulation: Time = {t * DT:.1f}s')
+
+            canvas.restore_region(background)
+            ax.draw_artist(vehicles)
+            ax.draw_artist(title)
+            frames.write(canvas.buffer_rgba())
+    finally:
+        frames.close()
+    return path
+
+def _ring_samples(trajectory, chunk_steps):
+    """
+    Yields (rows, radius, angle, speed) of the vehicles inside the ring
+    (active, radius below OUTER_RADIUS), reading chunk_steps trajectory rows
+    at a time so memory-mapped trajectories are never loaded whole.
+    """
+    for start in range(0, trajectory.num_recorded, chunk_steps):
+        stop = min(start + chunk_steps, trajectory.num_recorded)
+        radius = np.asarray(trajectory.radius[start:stop])
+        ring = np.asarray(trajectory.active[start:stop]) & (radius < OUTER_RADIUS)
+        rows = np.nonzero(ring)[0] + start
+        angle = np.asarray(trajectory.angle[start:stop])[ring] % (2 * np.pi)
+        speed = np.hypot(np.asarray(trajectory.tangential_speed[start:stop])[ring],
+                         np.asarray(trajectory.radial_speed[start:stop])[ring])
+        yield rows, radius[ring], angle, speed
+
+
+def space_time_bins(trajectory, angle_bins=72, time_bin=1.0, chunk_steps=1000):
+    """
+    Ring density (veh/km along the mid-ring circle) and mean speed (m/s,
+    nan where empty) in (time, angle) bins of time_bin seconds and
+    2*pi/angle_bins radians. Returns a dict with both (num_time_bins,
+    angle_bins) arrays and the bin edges.
+    """
+    steps_per_bin = max(1, int(round(time_bin / DT)))
+    time_bins = -(-trajectory.num_recorded // steps_per_bin)
+    counts = np.zeros(time_bins * angle_bins)
+    speed_sum = np.zeros(time_bins * angle_bins)
+    for rows, _, angle, speed in _ring_samples(trajectory, chunk_steps):
+        column = np.minimum((angle * (angle_bins / (2 * np.pi))).astype(np.int64), angle_bins - 1)
+        cell = rows // steps_per_bin * angle_bins + column
+        counts += np.bincount(cell, minlength=counts.size)
+        speed_sum += np.bincount(cell, weights=speed, minlength=counts.size)
+    counts, speed_sum = counts.reshape(time_bins, angle_bins), speed_sum.reshape(time_bins, angle_bins)
+    rows_per_bin = np.minimum(steps_per_bin, trajectory.num_recorded - np.arange(time_bins) * steps_per_bin)
+    cell_length = 2 * np.pi * (INNER_RADIUS + OUTER_RADIUS) / 2 / angle_bins / 1000
+    with np.errstate(invalid='ignore', divide='ignore'):
+        speed = speed_sum / counts
+    return {
+        'density': counts / rows_per_bin[:, None] / cell_length,
+        'speed': speed,
+        'time_edges': np.arange(time_bins + 1) * steps_per_bin * DT,
+        'angle_edges': np.linspace(0, 2 * np.pi, angle_bins + 1),
+    }
+
+
+def radial_profile(trajectory, radial_bins=40, chunk_steps=1000):
+    """
+    Mean number of vehicles and mean speed (m/s) in radial_bins rings
+    between INNER_RADIUS and OUTER_RADIUS, over the whole trajectory.
+    """
+    edges = np.linspace(INNER_RADIUS, OUTER_RADIUS, radial_bins + 1)
+    counts = np.zeros(radial_bins)
+    speed_sum = np.zeros(radial_bins)
+    for _, radius, _, speed in _ring_samples(trajectory, chunk_steps):
+        counts += np.histogram(radius, edges)[0]
+        speed_sum += np.histogram(radius, edges, weights=speed)[0]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        speed = speed_sum / counts
+    return {'occupancy': counts / max(trajectory.num_recorded, 1), 'speed': speed, 'radius_edges': edges}
+
+
+def sector_flow_density(trajectory, sectors=12, interval=30.0, chunk_steps=1000):
+    """
+    Edie's flow (veh/h) and density (veh/km) per angular sector of the ring
+    over consecutive intervals of `interval` seconds: the time vehicles
+    spent in the sector and the distance they travelled there, over the
+    sector length (along the mid-ring circle) times the interval. Returns
+    (num_intervals, sectors) arrays.
+    """
+    bins = space_time_bins(trajectory, sectors, interval, chunk_steps)
+    density = bins['density']
+    flow = density * np.nan_to_num(bins['speed']) * 3.6
+    return {'flow': flow, 'density': density, 'time_edges': bins['time_edges']}
+
+
+def _aggregate_figure(ncols, width=6, height=4.5):
+    fig = Figure(figsize=(width * ncols, height))
+    FigureCanvasAgg(fig)
+    return fig, [fig.add_subplot(1, ncols, i + 1) for i in range(ncols)]
+
+
+def _finish(fig, path):
+    fig.tight_layout()
+    if path is not None:
+        fig.savefig(path)
+    return fig
+
+
+def plot_space_time(trajectory, angle_bins=72, time_bin=1.0, chunk_steps=1000, path=None):
+    """
+    Density and mean-speed heatmaps of the ring over (time, angle), from
+    space_time_bins. Returns the Figure and saves it to path if given.
+    """
+    bins = space_time_bins(trajectory, angle_bins, time_bin, chunk_steps)
+    fig, (ax_density, ax_speed) = _aggregate_figure(2)
+    extent = (bins['time_edges'][0], bins['time_edges'][-1], 0, 360)
+    for ax, values, label, cmap, vmax in ((ax_density, bins['density'], "Density (veh/km)", 'magma', None),
+                                          (ax_speed, bins['speed'], "Mean speed (m/s)", 'viridis', DESIRED_SPEED + 5)):
+        image = ax.imshow(values.T, origin='lower', aspect='auto', extent=extent, cmap=cmap,
+                          vmin=0, vmax=vmax, interpolation='nearest')
+        fig.colorbar(image, ax=ax, label=label)
+        ax.set_xlabel("Time (s)")
+        ax.set_ylabel("Angle (deg)")
+        ax.set_title(label.split(' (')[0])
+    return _finish(fig, path)
+
+
+def plot_radial_profile(trajectory, radial_bins=40, chunk_steps=1000, path=None):
+    """Mean occupancy and speed across the ring width, from radial_profile."""
+    profile = radial_profile(trajectory, radial_bins, chunk_steps)
+    centers = (profile['radius_edges'][:-1] + profile['radius_edges'][1:]) / 2
+    fig, (ax_occupancy, ax_speed) = _aggregate_figure(2)
+    ax_occupancy.bar(centers, profile['occupancy'], width=np.diff(profile['radius_edges']), color='tab:blue')
+    ax_occupancy.set_ylabel("Mean vehicles")
+    ax_speed.plot(centers, profile['speed'], 'o-', color='tab:green')
+    ax_speed.set_ylabel("Mean speed (m/s)")
+    for ax in (ax_occupancy, ax_speed):
+        ax.set_xlabel("Radius (m)")
+        ax.set_xlim(INNER_RADIUS, OUTER_RADIUS)
+    return _finish(fig, path)
+
+
+def plot_fundamental_diagram(trajectory, sectors=12, interval=30.0, chunk_steps=1000, path=None):
+    """Flow-density scatter with one point per sector and interval, coloured by sector, from sector_flow_density."""
+    fd = sector_flow_density(trajectory, sectors, interval, chunk_steps)
+    fig, (ax,) = _aggregate_figure(1, width=7, height=5.5)
+    sector = np.broadcast_to(np.arange(sectors), fd['density'].shape)
+    points = ax.scatter(fd['density'].ravel(), fd['flow'].ravel(), c=sector.ravel(), cmap='twilight', s=12,
+                        vmin=0, vmax=sectors)
+    fig.colorbar(points, ax=ax, label="Sector")
+    ax.set_xlabel("Density (veh/km)")
+    ax.set_ylabel("Flow (veh/h)")
+    ax.set_title(f"Fundamental diagram ({interval:g} s intervals)")
+    return _finish(fig, path)
\ No newline at end of file